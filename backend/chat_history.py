@@ -0,0 +1,126 @@
+import os
+import json
+import asyncio
+import logging
+import weakref
+
+from backend.context_packer import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+CHAT_HISTORY_RECENT_TURNS = int(os.getenv("CHAT_HISTORY_RECENT_TURNS", "6"))
+CHAT_SUMMARY_TOKEN_BUDGET = int(os.getenv("CHAT_SUMMARY_TOKEN_BUDGET", "400"))
+CHAT_HISTORY_TTL = int(os.getenv("CHAT_HISTORY_TTL", str(24 * 3600)))
+# Overflow turns folded per summary update: one LLM call every couple of exchanges, not every turn
+SUMMARY_FOLD_BATCH = 4
+
+
+def truncate_to_budget(text, token_budget):
+    """Keeps the tail of `text` (the most recent material) within the token estimate."""
+    if estimate_tokens(text) <= token_budget:
+        return text
+    return "..." + text[-token_budget * 4:]
+
+
+def format_history(summary, turns):
+    """Prompt block: the rolling summary of older turns, then the recent turns verbatim."""
+    parts = []
+    if summary:
+        parts.append(f"Summary of the earlier conversation: {summary}")
+    parts.extend(turns)
+    return "\n".join(parts) if parts else "(no previous messages)"
+
+
+class ChatHistoryStore:
+    """
+    Server-side conversation state per session: the last CHAT_HISTORY_RECENT_TURNS messages kept
+    verbatim plus a summary of everything older, held under CHAT_SUMMARY_TOKEN_BUDGET. Overflowing
+    turns are folded into the summary in batches by a caller-supplied `summarize(summary, turns,
+    token_budget)`. One JSON document per session lives in Redis; without Redis a dict is used.
+    New turns are saved before the (slow) summary call; the fold is applied afterwards only if
+    the folded turns are still at the head of the stored history, so concurrent appends are kept.
+    """
+
+    def __init__(self, redis_client=None, recent_turns=CHAT_HISTORY_RECENT_TURNS,
+                 summary_token_budget=CHAT_SUMMARY_TOKEN_BUDGET, ttl=CHAT_HISTORY_TTL):
+        self.redis = redis_client
+        self.recent_turns = recent_turns
+        self.summary_token_budget = summary_token_budget
+        self.ttl = ttl
+        self._local = {}
+        self._locks = weakref.WeakValueDictionary()
+        self._folding = set()
+
+    def _key(self, session_id):
+        return f"aegis_chat:{session_id}"
+
+    async def load(self, session_id):
+        """Returns {"summary": str, "turns": [str]} (empty for an unknown session)."""
+        state = None
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self._key(session_id))
+                state = json.loads(raw) if raw else None
+            except Exception as e:
+                logger.error(f"Redis read error on chat history: {e}")
+        else:
+            state = self._local.get(session_id)
+        if not state:
+            return {"summary": "", "turns": []}
+        # Callers edit the result; never hand out the stored dict itself
+        return {"summary": state["summary"], "turns": list(state["turns"])}
+
+    def _lock(self, session_id):
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def _save(self, session_id, state):
+        if self.redis is None:
+            self._local[session_id] = state
+            return
+        try:
+            await self.redis.setex(self._key(session_id), self.ttl, json.dumps(state))
+        except Exception as e:
+            logger.error(f"Redis write error on chat history: {e}")
+
+    async def append(self, session_id, user_query, answer, summarize):
+        """Records one exchange and, once enough turns overflow, folds them into the summary."""
+        async with self._lock(session_id):
+            state = await self.load(session_id)
+            state["turns"].extend([f"user: {user_query}", f"assistant: {answer}"])
+            await self._save(session_id, state)
+        overflow = len(state["turns"]) - self.recent_turns
+        if overflow < SUMMARY_FOLD_BATCH or session_id in self._folding:
+            return
+        self._folding.add(session_id)
+        try:
+            await self._fold(session_id, state["summary"], state["turns"][:overflow], summarize)
+        finally:
+            self._folding.discard(session_id)
+
+    async def _fold(self, session_id, previous, folded, summarize):
+        try:
+            summary = await summarize(previous, folded, self.summary_token_budget)
+        except Exception as e:
+            # Quota or network trouble: keep the older material extractively rather than lose it
+            logger.warning(f"⚠️ History summarisation failed for {session_id}, truncating instead: {e}")
+            summary = "\n".join(filter(None, [previous, *folded]))
+        async with self._lock(session_id):
+            # Re-read: turns appended (or a clear) while the summary was being written must survive
+            state = await self.load(session_id)
+            if state["summary"] != previous or state["turns"][:len(folded)] != folded:
+                logger.info(f"Chat history for {session_id} changed during summarisation; fold skipped")
+                return
+            state["summary"] = truncate_to_budget(summary, self.summary_token_budget)
+            state["turns"] = state["turns"][len(folded):]
+            await self._save(session_id, state)
+
+    async def clear(self, session_id):
+        self._local.pop(session_id, None)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._key(session_id))
+            except Exception as e:
+                logger.error(f"Redis delete error on chat history: {e}")
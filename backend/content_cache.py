@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import array
+import sqlite3
+import hashlib
+import threading
+from collections import Counter
+
+CONTENT_CACHE_PATH = os.getenv(
+    "CONTENT_CACHE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".content_cache.sqlite3"))
+)
+CONTENT_CACHE_MAX_ENTRIES = int(os.getenv("CONTENT_CACHE_MAX_ENTRIES", "200000"))
+CONTENT_CACHE_TTL = int(os.getenv("CONTENT_CACHE_TTL", str(30 * 86400)))
+
+# SQLite IN (...) lists are capped at 999 parameters on older builds
+_SQL_BATCH = 500
+
+
+class ContentCache:
+    """
+    Content-addressed local cache (SQLite, shared by every worker on the host) with TTL expiry
+    and LRU eviction. Keys are prefixed by kind ("parse", "embed") and hit/miss counters are
+    tracked per kind so avoided parse and embedding spend is visible.
+    """
+
+    def __init__(self, path=CONTENT_CACHE_PATH, max_entries=CONTENT_CACHE_MAX_ENTRIES, ttl=CONTENT_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, created REAL, accessed REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        return self._conn
+
+    def get_many(self, kind, keys):
+        """Returns {key: value} for live entries and refreshes their LRU position."""
+        found, now = {}, time.time()
+        with self._lock:
+            db = self._db()
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = [f"{kind}:{key}" for key in keys[i:i + _SQL_BATCH]]
+                rows = db.execute(
+                    f"SELECT key, value, created FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                live = [(full_key, value) for full_key, value, created in rows if now - created <= self.ttl]
+                for full_key, value in live:
+                    found[full_key[len(kind) + 1:]] = value
+                db.executemany("UPDATE entries SET accessed = ? WHERE key = ?", [(now, k) for k, _ in live])
+                expired = [(full_key,) for full_key, _, created in rows if now - created > self.ttl]
+                db.executemany("DELETE FROM entries WHERE key = ?", expired)
+            db.commit()
+            self.hits[kind] += len(found)
+            self.misses[kind] += len(keys) - len(found)
+        return found
+
+    def get(self, kind, key):
+        return self.get_many(kind, [key]).get(key)
+
+    def put_many(self, kind, items):
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                [(f"{kind}:{key}", value, now, now) for key, value in items.items()]
+            )
+            overflow = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                db.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed ASC LIMIT ?)",
+                    (overflow,)
+                )
+            db.commit()
+
+    def put(self, kind, key, value):
+        self.put_many(kind, {key: value})
+
+    def stats(self):
+        kinds = set(self.hits) | set(self.misses)
+        return {
+            kind: {
+                "hits": self.hits[kind],
+                "misses": self.misses[kind],
+                "hit_rate": round(self.hits[kind] / ((self.hits[kind] + self.misses[kind]) or 1), 4)
+            }
+            for kind in sorted(kinds)
+        }
+
+
+class CachedEmbeddings:
+    """
+    Wraps an embeddings client so document embeddings are looked up by chunk-text hash first;
+    only the misses of each batch go to the embedding API, in a single call.
+    """
+
+    def __init__(self, embeddings, cache, model_name):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def _key(self, text):
+        return f"{self.model_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        cached = self.cache.get_many("embed", keys)
+
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        fresh = self.embeddings.embed_documents([texts[i] for i in missing]) if missing else []
+        if fresh:
+            self.cache.put_many("embed", {keys[i]: array.array("f", vector).tobytes() for i, vector in zip(missing, fresh)})
+
+        vectors, fresh_by_index = [], dict(zip(missing, fresh))
+        for i, key in enumerate(keys):
+            if i in fresh_by_index:
+                vectors.append(list(fresh_by_index[i]))
+            else:
+                vectors.append(array.array("f", cached[key]).tolist())
+        return vectors
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+def load_parsed_pages(cache, file_hash, parser_name):
+    raw = cache.get("parse", f"{parser_name}:{file_hash}")
+    return json.loads(raw) if raw is not None else None
+
+
+def store_parsed_pages(cache, file_hash, parser_name, pages):
+    cache.put("parse", f"{parser_name}:{file_hash}", json.dumps(pages))
+
+
+content_cache = ContentCache()
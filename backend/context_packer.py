@@ -0,0 +1,100 @@
+import os
+import re
+
+from langchain_core.documents import Document
+
+AUDIT_CONTEXT_TOKEN_BUDGET = int(os.getenv("AUDIT_CONTEXT_TOKEN_BUDGET", "3000"))
+SINGLE_CALL_CONTEXT_TOKEN_BUDGET = int(os.getenv("SINGLE_CALL_CONTEXT_TOKEN_BUDGET", "12000"))
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "2500"))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+# Overlap between neighbouring chunks is ~chunk_overlap (100) chars; require a little less to merge
+MIN_MERGE_OVERLAP = 40
+_OVERLAP_SEARCH_WINDOW = 400
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 chars/token for English legal text); no tokenizer round trip."""
+    return max(1, len(text) // 4)
+
+
+def _shingles(text, size=5):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _merge_overlap(first, second):
+    """Returns first+second joined on their shared span if `second` continues `first`, else None."""
+    probe = second[:MIN_MERGE_OVERLAP]
+    if len(probe) < MIN_MERGE_OVERLAP:
+        return None
+    start = first.rfind(probe, max(0, len(first) - _OVERLAP_SEARCH_WINDOW))
+    if start < 0 or not second.startswith(first[start:]):
+        return None
+    return first + second[len(first) - start:]
+
+
+def pack_context(docs, token_budget):
+    """
+    Collapses retrieved chunks into a bounded, duplicate-free context. `docs` must be in fused-score
+    order (best first), as returned by hybrid retrieval. Exact and contained duplicates are dropped,
+    chunks that continue each other across the splitter overlap are stitched into one span,
+    near-duplicates (word 5-gram Jaccard >= NEAR_DUPLICATE_THRESHOLD) are dropped, and the
+    survivors fill `token_budget` in score order.
+    """
+    spans = []  # [text, metadata, shingles], best-ranked first
+    for doc in docs:
+        text = doc.page_content.strip()
+        if not text:
+            continue
+        source = doc.metadata.get("source")
+
+        absorbed = False
+        for span in spans:
+            if text in span[0]:
+                absorbed = True
+            elif span[0] in text:
+                span[0], span[2] = text, _shingles(text)
+                absorbed = True
+            elif span[1].get("source") == source:
+                merged = _merge_overlap(span[0], text) or _merge_overlap(text, span[0])
+                if merged:
+                    span[0], span[2] = merged, _shingles(merged)
+                    absorbed = True
+            if absorbed:
+                break
+        if absorbed:
+            continue
+
+        shingles = _shingles(text)
+        if any(
+            shingles and span[2] and len(shingles & span[2]) / len(shingles | span[2]) >= NEAR_DUPLICATE_THRESHOLD
+            for span in spans
+        ):
+            continue
+        spans.append([text, doc.metadata, shingles])
+
+    packed, used = [], 0
+    for text, metadata, _ in spans:
+        cost = estimate_tokens(text)
+        if used + cost > token_budget:
+            continue
+        packed.append(Document(page_content=text, metadata=metadata))
+        used += cost
+    return packed
+
+
+def interleave(ranked_lists):
+    """Round-robin merge of several ranked lists so each contributes its best items first."""
+    merged = []
+    for position in range(max((len(docs) for docs in ranked_lists), default=0)):
+        merged.extend(docs[position] for docs in ranked_lists if position < len(docs))
+    return merged
+
+
+def format_context(docs):
+    return "\n".join(f"[{doc.metadata.get('source', 'Document')}]: {doc.page_content}" for doc in docs)
@@ -1,19 +1,65 @@
 import json
 import os
+import hashlib
+import time
+import asyncio
 import datetime
+import threading
 import concurrent.futures
 import google.generativeai as genai
 from pydantic import BaseModel, Field
 
-from langchain_pinecone import PineconeVectorStore
-from langchain_community.retrievers import BM25Retriever
 from langchain_classic.retrievers import EnsembleRetriever
 
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from dotenv import load_dotenv
 from langsmith import traceable
 
+from backend.context_packer import (
+    AUDIT_CONTEXT_TOKEN_BUDGET, CHAT_CONTEXT_TOKEN_BUDGET, SINGLE_CALL_CONTEXT_TOKEN_BUDGET,
+    format_context, interleave, pack_context
+)
+from backend.llm_client import CircuitBreaker, ResilientModel
+from backend.llm_scheduler import llm_scheduler
+from backend.sparse_index import SparseIndexRetriever, sparse_index_store
+from backend.telemetry import timed
+from backend.trace_sink import trace_sink
+from backend.vector_store import create_vector_backend
+
 MAX_KEYWORD_COUNT = int(os.getenv("MAX_KEYWORD_COUNT", "50"))
+AUDIT_PILLAR_CONCURRENCY = int(os.getenv("AUDIT_PILLAR_CONCURRENCY", "8"))
+CHAT_RETRIEVAL_WORKERS = int(os.getenv("CHAT_RETRIEVAL_WORKERS", "16"))
+
+# "fanout": one LLM call per pillar. "single": one structured call for every pillar.
+AUDIT_MODES = ("fanout", "single")
+DEFAULT_AUDIT_MODE = os.getenv("DEFAULT_AUDIT_MODE", "fanout")
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash")
+
+# Bump whenever _build_pillar_prompt or retrieval changes so cached findings are not reused
+PILLAR_PROMPT_VERSION = "v2"
+
+AUDIT_PILLARS = ["Capacity", "Consent", "Consideration", "Legality", "Documentation", "Breach", "Termination", "Jurisdiction"]
+EMBEDDING_MODEL_NAME = "models/gemini-embedding-2"
+
+# Query vectors for the static pillar list, memoized for the process lifetime
+_PILLAR_VECTOR_CACHE = {}
+_PILLAR_VECTOR_LOCK = threading.Lock()
+
+# Shared by every chat request: query embedding, sparse and dense legs for LAW and POLICY run side by side
+_CHAT_RETRIEVAL_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=CHAT_RETRIEVAL_WORKERS, thread_name_prefix="chat-retrieval"
+)
+
+
+def _weighted_rrf(doc_lists, weights, c=60):
+    """Weighted Reciprocal Rank Fusion, deduplicated on page content (same scheme as EnsembleRetriever)."""
+    scores, docs = {}, {}
+    for doc_list, weight in zip(doc_lists, weights):
+        for rank, doc in enumerate(doc_list, start=1):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + weight / (rank + c)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
 
 class AuditFinding(BaseModel):
     pillar: str = Field(description="The name of the legal pillar being analyzed.")
@@ -22,44 +68,67 @@ class AuditFinding(BaseModel):
     remediation: str = Field(description="Actionable steps to resolve the conflict.")
     citation: str = Field(description="The exact document filename and clause referenced.")
 
+class AuditReport(BaseModel):
+    findings: list[AuditFinding] = Field(description="Exactly one finding per requested legal pillar.")
+
+VALID_RATINGS = {"Low", "Medium", "High", "Critical"}
+
 class AegisEngine:
-    def __init__(self, api_key):
+    def __init__(self, api_key, embeddings=None, vector_backend=None, scheduler=llm_scheduler):
+        """
+        `embeddings` and `vector_backend` let a process-wide ResourcePool inject shared
+        clients; when omitted the engine builds its own (standalone scripts, evaluation).
+        """
         load_dotenv() 
         secure_key = api_key or os.getenv("GEMINI_API_KEY")
         if not secure_key:
             raise ValueError("CRITICAL: API Key is missing! Check your .env file spelling.")
             
         genai.configure(api_key=secure_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        self.chat_model = genai.GenerativeModel('gemini-2.5-flash')
+        self.model_name = GEMINI_MODEL_NAME
+        # Both models draw on the same Gemini quota, so they share one circuit breaker
+        self.llm_breaker = CircuitBreaker()
+        # ...and are admitted through the process-wide scheduler, chat ahead of audit pillars
+        self.scheduler = scheduler
+        self.model = ResilientModel(
+            genai.GenerativeModel(self.model_name), name="audit", breaker=self.llm_breaker,
+            scheduler=scheduler, priority="audit"
+        )
+        self.chat_model = ResilientModel(
+            genai.GenerativeModel(self.model_name), name="chat", breaker=self.llm_breaker, hedge=False,
+            scheduler=scheduler, priority="chat"
+        )
         
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/gemini-embedding-2", 
+        self.embeddings = embeddings or GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL_NAME, 
             google_api_key=secure_key
         )
+        self.vector_backend = vector_backend or create_vector_backend(self.embeddings)
+
+    def _vector_store(self, namespace):
+        return self.vector_backend.store(namespace)
 
     def _log_eval_trace(self, pillar, context, generated_finding):
-        """Silently logs the execution trace for RAGAS evaluation."""
-        try:
-            log_entry = {
-                "timestamp": datetime.datetime.now().isoformat(),
-                "question": f"Perform a gap analysis between the internal policy and target law for the legal pillar: {pillar}",
-                "contexts": [context], 
-                "answer": generated_finding.get("finding", "ERROR"),
-                "remediation": generated_finding.get("remediation", "ERROR"),
-                "risk_rating": generated_finding.get("rating", "ERROR")
-            }
-            
-            root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-            file_path = os.path.join(root_dir, "ragas_eval_dataset.jsonl")
-            
-            with open(file_path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry) + "\n")
-                
-            print(f"✅ RAGAS Trace Logged -> {file_path}")
-            
-        except Exception as e:
-            print(f"⚠️ Failed to log evaluation trace: {e}")
+        """Queues the execution trace for RAGAS evaluation; the trace sink writes it off the request path."""
+        trace_sink.emit({
+            "timestamp": datetime.datetime.now().isoformat(),
+            "question": f"Perform a gap analysis between the internal policy and target law for the legal pillar: {pillar}",
+            "contexts": [context], 
+            "answer": generated_finding.get("finding", "ERROR"),
+            "remediation": generated_finding.get("remediation", "ERROR"),
+            "risk_rating": generated_finding.get("rating", "ERROR")
+        })
+
+    def llm_stats(self):
+        stats = {"audit": self.model.stats(), "chat": self.chat_model.stats()}
+        if self.scheduler is not None:
+            stats["scheduler"] = self.scheduler.stats()
+        return stats
+
+    @staticmethod
+    def _mark_error(timings):
+        if timings is not None:
+            timings["error"] = True
 
     def _format_error_msg(self, e):
         """Translates ugly cloud errors into clean UI messages."""
@@ -71,32 +140,33 @@ class AegisEngine:
     def _get_hybrid_docs(self, query, session_id, doc_type, k_val=5):
         """
         Industry-Standard Hybrid Retriever:
-        Combines Dense Semantic Vector Search (Pinecone) with Sparse Keyword Matching (BM25).
+        Combines Dense Semantic Vector Search (Pinecone or the local NumPy backend) with Sparse Keyword Matching (BM25).
+        The BM25 index is built at ingest time and served from the local sparse index store.
         """
+        with timed("hybrid_retrieval", doc_type=doc_type):
+            return self._hybrid_docs(query, session_id, doc_type, k_val)
+
+    def _hybrid_docs(self, query, session_id, doc_type, k_val):
+        namespace = f"{session_id}_{doc_type}"
         try:
             # 1. Access the dense vector store namespace
-            vector_store = PineconeVectorStore(
-                index_name="aegis-audit-index", 
-                embedding=self.embeddings, 
-                namespace=f"{session_id}_{doc_type}" 
-            )
+            vector_store = self._vector_store(namespace)
             
-            # 2. Fetch all local session documents to construct the corpus for BM25
-            all_session_docs = vector_store.similarity_search("", k=100)
+            # 2. Load the persisted keyword index covering every chunk of the namespace
+            sparse_index = sparse_index_store.load(namespace)
             
-            if not all_session_docs:
+            if not sparse_index:
                 return vector_store.similarity_search(query, k=k_val)
 
-            # 3. Instantiate local in-memory BM25 Retriever
-            bm25_retriever = BM25Retriever.from_documents(all_session_docs)
-            bm25_retriever.k = k_val
+            # 3. Wrap the local BM25 index (no network call on the keyword leg)
+            bm25_retriever = SparseIndexRetriever(index=sparse_index, k=k_val)
 
-            # 4. Instantiate semantic Pinecone Retriever
-            pinecone_retriever = vector_store.as_retriever(search_kwargs={"k": k_val})
+            # 4. Instantiate semantic vector-store Retriever
+            dense_retriever = vector_store.as_retriever(search_kwargs={"k": k_val})
 
             # 5. Build Ensemble Hybrid Framework
             ensemble_retriever = EnsembleRetriever(
-                retrievers=[bm25_retriever, pinecone_retriever],
+                retrievers=[bm25_retriever, dense_retriever],
                 weights=[0.3, 0.7]
             )
             
@@ -104,21 +174,148 @@ class AegisEngine:
             
         except Exception as e:
             print(f"⚠️ Hybrid retrieval bottleneck hit, falling back to pure vector search: {e}")
-            vector_store = PineconeVectorStore(
-                index_name="aegis-audit-index", 
-                embedding=self.embeddings, 
-                namespace=f"{session_id}_{doc_type}" 
+            vector_store = self._vector_store(namespace)
+            return vector_store.similarity_search(query, k=k_val)
+
+    async def _aget_hybrid_docs(self, query, session_id, doc_type, k_val=5):
+        """Async counterpart of _get_hybrid_docs built on the retrievers' native ainvoke paths."""
+        with timed("hybrid_retrieval", doc_type=doc_type):
+            return await self._ahybrid_docs(query, session_id, doc_type, k_val)
+
+    async def _ahybrid_docs(self, query, session_id, doc_type, k_val):
+        namespace = f"{session_id}_{doc_type}"
+        vector_store = self._vector_store(namespace)
+        try:
+            sparse_index = await asyncio.to_thread(sparse_index_store.load, namespace)
+            
+            if not sparse_index:
+                return await vector_store.asimilarity_search(query, k=k_val)
+
+            ensemble_retriever = EnsembleRetriever(
+                retrievers=[
+                    SparseIndexRetriever(index=sparse_index, k=k_val),
+                    vector_store.as_retriever(search_kwargs={"k": k_val})
+                ],
+                weights=[0.3, 0.7]
             )
+            
+            return await ensemble_retriever.ainvoke(query)
+            
+        except Exception as e:
+            print(f"⚠️ Hybrid retrieval bottleneck hit, falling back to pure vector search: {e}")
+            return await vector_store.asimilarity_search(query, k=k_val)
+
+    def _embed_queries(self, queries):
+        """Embeds many queries in a single batch request."""
+        with timed("query_embed"):
+            try:
+                return self.embeddings.embed_documents(list(queries), task_type="RETRIEVAL_QUERY")
+            except TypeError:
+                # Embedding backends without task types
+                return self.embeddings.embed_documents(list(queries))
+
+    def embed_query(self, query):
+        """Single chat query vector; pass it back to run_query so retrieval does not re-embed."""
+        return self._embed_queries([query])[0]
+
+    def embed_pillar_queries(self, pillars=AUDIT_PILLARS):
+        """Returns {pillar: query vector}, embedding the whole pillar list at most once per process."""
+        cache_key = (EMBEDDING_MODEL_NAME, tuple(pillars))
+        with _PILLAR_VECTOR_LOCK:
+            cached = _PILLAR_VECTOR_CACHE.get(cache_key)
+        if cached is None:
+            cached = dict(zip(pillars, self._embed_queries(pillars)))
+            with _PILLAR_VECTOR_LOCK:
+                _PILLAR_VECTOR_CACHE[cache_key] = cached
+        return cached
+
+    def _get_hybrid_docs_by_vector(self, query, query_vector, session_id, doc_type, k_val=5):
+        """Hybrid retrieval with a precomputed query vector, so the dense leg skips the embedding call."""
+        namespace = f"{session_id}_{doc_type}"
+        vector_store = self._vector_store(namespace)
+        try:
+            with timed("dense_search", doc_type=doc_type):
+                dense_docs = vector_store.similarity_search_by_vector(query_vector, k=k_val)
+            sparse_index = sparse_index_store.load(namespace)
+            if not sparse_index:
+                return dense_docs
+            return _weighted_rrf([sparse_index.search(query, k=k_val), dense_docs], [0.3, 0.7])
+        except Exception as e:
+            print(f"⚠️ Hybrid retrieval bottleneck hit, falling back to pure vector search: {e}")
             return vector_store.similarity_search(query, k=k_val)
 
-    @traceable(run_type="chain", name="Pillar_Analysis")
-    def run_pillar_analysis(self, pillar, session_id):
-        law_docs = self._get_hybrid_docs(pillar, session_id, "LAW", k_val=5)
-        pol_docs = self._get_hybrid_docs(pillar, session_id, "POLICY", k_val=5)
-        
-        context = f"LAW: {[d.page_content for d in law_docs]}\nPOLICY: {[d.page_content for d in pol_docs]}"
-        
-        prompt = f"""
+    def _sparse_search(self, query, namespace, k_val):
+        """BM25 leg on its own; returns None when the namespace has no keyword index."""
+        sparse_index = sparse_index_store.load(namespace)
+        return sparse_index.search(query, k=k_val) if sparse_index else None
+
+    def _dense_search_by_vector(self, query_vector, namespace, doc_type, k_val):
+        with timed("dense_search", doc_type=doc_type):
+            return self._vector_store(namespace).similarity_search_by_vector(query_vector, k=k_val)
+
+    def _parallel_hybrid_docs(self, query, session_id, doc_types=("LAW", "POLICY"), k_val=4, query_vector=None):
+        """
+        Chat retrieval without serial round trips: the query is embedded once (unless the caller
+        already has its vector) while the BM25 lookups for every namespace run, then the dense
+        searches for every namespace run concurrently with that single vector.
+        Returns {doc_type: fused docs}.
+        """
+        namespaces = {doc_type: f"{session_id}_{doc_type}" for doc_type in doc_types}
+        with timed("hybrid_retrieval", doc_type="chat"):
+            embed_future = None if query_vector is not None else _CHAT_RETRIEVAL_POOL.submit(self._embed_queries, [query])
+            sparse_futures = {
+                doc_type: _CHAT_RETRIEVAL_POOL.submit(self._sparse_search, query, namespace, k_val)
+                for doc_type, namespace in namespaces.items()
+            }
+            try:
+                if embed_future is not None:
+                    query_vector = embed_future.result()[0]
+                dense_futures = {
+                    doc_type: _CHAT_RETRIEVAL_POOL.submit(self._dense_search_by_vector, query_vector, namespace, doc_type, k_val)
+                    for doc_type, namespace in namespaces.items()
+                }
+            except Exception as e:
+                print(f"⚠️ Query embedding failed, falling back to per-namespace hybrid retrieval: {e}")
+                return {doc_type: self._get_hybrid_docs(query, session_id, doc_type, k_val) for doc_type in doc_types}
+
+            results = {}
+            for doc_type in doc_types:
+                try:
+                    dense_docs = dense_futures[doc_type].result()
+                except Exception as e:
+                    print(f"⚠️ Dense search failed for {doc_type}, retrying through hybrid retrieval: {e}")
+                    results[doc_type] = self._get_hybrid_docs(query, session_id, doc_type, k_val)
+                    continue
+                try:
+                    sparse_docs = sparse_futures[doc_type].result()
+                except Exception as e:
+                    print(f"⚠️ Keyword leg failed for {doc_type}, using dense results only: {e}")
+                    sparse_docs = None
+                results[doc_type] = _weighted_rrf([sparse_docs, dense_docs], [0.3, 0.7]) if sparse_docs is not None else dense_docs
+            return results
+
+    async def abatch_hybrid_docs(self, queries, session_id, doc_types=("LAW", "POLICY"), k_val=5):
+        """
+        Batched retrieval: embeds every query in one request (pillar queries come from the
+        process-wide memo) and fans the per-namespace searches out in parallel.
+        Returns {(query, doc_type): docs}.
+        """
+        queries = list(queries)
+        if set(queries) <= set(AUDIT_PILLARS):
+            pillar_vectors = await asyncio.to_thread(self.embed_pillar_queries)
+            vectors = [pillar_vectors[q] for q in queries]
+        else:
+            vectors = await asyncio.to_thread(self._embed_queries, queries)
+
+        pairs = [(query, vector, doc_type) for query, vector in zip(queries, vectors) for doc_type in doc_types]
+        results = await asyncio.gather(*(
+            asyncio.to_thread(self._get_hybrid_docs_by_vector, query, vector, session_id, doc_type, k_val)
+            for query, vector, doc_type in pairs
+        ))
+        return {(query, doc_type): docs for (query, _, doc_type), docs in zip(pairs, results)}
+
+    def _build_pillar_prompt(self, pillar, context):
+        return f"""
         You are a highly literal, strict Legal Compliance Auditor. 
         PILLAR TO ANALYZE: "{pillar}"
         
@@ -138,47 +335,189 @@ class AegisEngine:
         4. Write an actionable 'remediation' plan.
         5. Extract specific section numbers for the 'citation'.
         """
+
+    def _pack_audit_context(self, law_docs, pol_docs, token_budget=AUDIT_CONTEXT_TOKEN_BUDGET):
+        """Deduplicated LAW/POLICY context, each side capped at half of the token budget."""
+        law_context = format_context(pack_context(law_docs, token_budget // 2))
+        pol_context = format_context(pack_context(pol_docs, token_budget // 2))
+        return f"LAW:\n{law_context}\nPOLICY:\n{pol_context}"
+
+    async def apillar_context_fingerprints(self, session_id, pillars=AUDIT_PILLARS):
+        """
+        Retrieves every pillar's context once and returns (retrieved, {pillar: fingerprint}).
+        The fingerprint hashes the packed LAW/POLICY chunks a pillar prompt would receive, so two
+        audits with equal fingerprints send that pillar the same evidence. Pass `retrieved` on to
+        astream_compliance_audit to audit without retrieving again.
+        """
+        retrieved = await self.abatch_hybrid_docs(pillars, session_id, k_val=5)
+        fingerprints = {}
+        for pillar in pillars:
+            # Order-insensitive: a fused-rank reshuffle of the same chunks is the same evidence
+            spans = sorted(
+                f"{doc_type}:{doc.page_content}"
+                for doc_type in ("LAW", "POLICY")
+                for doc in pack_context(retrieved.get((pillar, doc_type), []), AUDIT_CONTEXT_TOKEN_BUDGET // 2)
+            )
+            fingerprints[pillar] = hashlib.sha256("\n".join(spans).encode("utf-8")).hexdigest()
+        return retrieved, fingerprints
+
+    def _build_combined_prompt(self, pillars, context):
+        pillar_list = ", ".join(f'"{pillar}"' for pillar in pillars)
+        return f"""
+        You are a highly literal, strict Legal Compliance Auditor. 
+        PILLARS TO ANALYZE: {pillar_list}
+        
+        CONTEXT PROVIDED:
+        {context}
+        
+        STRICT GROUNDING INSTRUCTIONS:
+        1. You must base your findings ONLY and EXACTLY on the text provided in the CONTEXT above.
+        2. ZERO EXTERNAL KNOWLEDGE: Do not introduce external legal principles, standard industry practices, or common sense assumptions. 
+        3. NO INFERENCE: If the context does not explicitly mention concepts related to a pillar (e.g., if the text says "Background Checks" but never mentions the word "Consent"), do NOT assume consent is implied. 
+        4. If the provided POLICY context is completely silent on the LAW's requirements for a pillar, that pillar's 'finding' must explicitly state: "The policy lacks explicit provisions for..." and base the Risk Rating on that exact omission.
         
+        OUTPUT REQUIREMENTS:
+        Return exactly one finding per pillar listed above, using the pillar name verbatim in 'pillar'. For each pillar:
+        1. Compare the POLICY against the LAW focusing on that pillar.
+        2. Assess Risk Rating (Critical, High, Medium, Low).
+        3. Write a professional 'finding' explaining the gap (strictly based on text).
+        4. Write an actionable 'remediation' plan.
+        5. Extract specific section numbers for the 'citation'.
+        """
+
+    def _is_valid_finding(self, finding):
+        return (
+            isinstance(finding, dict)
+            and finding.get("rating") in VALID_RATINGS
+            and all(isinstance(finding.get(field), str) and finding[field].strip() for field in ("finding", "remediation", "citation"))
+        )
+
+    @traceable(run_type="chain", name="Single_Call_Audit")
+    async def _arun_single_call_audit(self, pillars, retrieved, session_id=None):
+        """
+        One structured Gemini call for every pillar over the deduplicated union of their contexts.
+        Returns {pillar: finding} for the pillars that came back well-formed; the caller falls back
+        to per-pillar calls for the rest.
+        """
+        context = self._pack_audit_context(
+            interleave([retrieved.get((p, "LAW"), []) for p in pillars]),
+            interleave([retrieved.get((p, "POLICY"), []) for p in pillars]),
+            token_budget=SINGLE_CALL_CONTEXT_TOKEN_BUDGET
+        )
+        prompt = self._build_combined_prompt(pillars, context)
+
         try:
-            import time
             start = time.time()
-
-            res = self.model.generate_content(
-                prompt, 
+            res = await self.model.generate_content_async(
+                prompt,
+                session_id=session_id,
                 generation_config=genai.GenerationConfig(
                     response_mime_type="application/json",
-                    response_schema=AuditFinding
+                    response_schema=AuditReport
                 )
             )
+            prompt_tokens = getattr(getattr(res, "usage_metadata", None), "prompt_token_count", "?")
+            print(f"⏱️ [single-call x{len(pillars)}] Reasoning time: {time.time() - start:.2f} seconds | prompt tokens: {prompt_tokens}")
+            raw_findings = json.loads(res.text).get("findings", [])
+        except Exception as e:
+            print(f"⚠️ Single-call audit failed, falling back to per-pillar calls: {e}")
+            return {}
+
+        by_name = {pillar.lower(): pillar for pillar in pillars}
+        findings = {}
+        for finding in raw_findings:
+            pillar = by_name.get(str(finding.get("pillar", "")).strip().lower()) if isinstance(finding, dict) else None
+            if pillar and pillar not in findings and self._is_valid_finding(finding):
+                finding["pillar"] = pillar
+                findings[pillar] = finding
+
+        for pillar, finding in findings.items():
+            self._log_eval_trace(pillar, context, finding)
+        return findings
+
+    def _finding_config(self):
+        return genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=AuditFinding
+        )
+
+    def _error_finding(self, pillar, message):
+        return {
+            "pillar": pillar, 
+            "rating": "ERROR", 
+            "finding": message, 
+            "remediation": "N/A", 
+            "citation": "System Error"
+        }
+
+    @traceable(run_type="chain", name="Pillar_Analysis")
+    def run_pillar_analysis(self, pillar, session_id):
+        law_docs = self._get_hybrid_docs(pillar, session_id, "LAW", k_val=5)
+        pol_docs = self._get_hybrid_docs(pillar, session_id, "POLICY", k_val=5)
+        
+        context = self._pack_audit_context(law_docs, pol_docs)
+        prompt = self._build_pillar_prompt(pillar, context)
+        
+        try:
+            start = time.time()
+
+            res = self.model.generate_content(prompt, session_id=session_id, generation_config=self._finding_config())
             
             print(f"⏱️ [{pillar}] Reasoning time: {time.time() - start:.2f} seconds")
 
             finding = json.loads(res.text)
+            finding["pillar"] = pillar
             self._log_eval_trace(pillar, context, finding)
             return finding
             
         except Exception as e:
-            clean_error = self._format_error_msg(e)
             print(f"Error in {pillar}: {str(e)}") 
-            return {
-                "pillar": pillar, 
-                "rating": "ERROR", 
-                "finding": clean_error, 
-                "remediation": "N/A", 
-                "citation": "System Error"
-            }
+            return self._error_finding(pillar, self._format_error_msg(e))
+
+    @traceable(run_type="chain", name="Pillar_Analysis_Async")
+    async def arun_pillar_analysis(self, pillar, session_id, law_docs=None, pol_docs=None):
+        """
+        Async counterpart of run_pillar_analysis; never blocks the event loop.
+        Pre-retrieved docs (see abatch_hybrid_docs) skip the per-pillar retrieval round trips.
+        """
+        if law_docs is None or pol_docs is None:
+            law_docs, pol_docs = await asyncio.gather(
+                self._aget_hybrid_docs(pillar, session_id, "LAW", k_val=5),
+                self._aget_hybrid_docs(pillar, session_id, "POLICY", k_val=5),
+            )
+        
+        context = self._pack_audit_context(law_docs, pol_docs)
+        prompt = self._build_pillar_prompt(pillar, context)
+        
+        try:
+            start = time.time()
+
+            res = await self.model.generate_content_async(
+                prompt, session_id=session_id, generation_config=self._finding_config()
+            )
+            
+            prompt_tokens = getattr(getattr(res, "usage_metadata", None), "prompt_token_count", "?")
+            print(f"⏱️ [{pillar}] Reasoning time: {time.time() - start:.2f} seconds | prompt tokens: {prompt_tokens}")
+
+            finding = json.loads(res.text)
+            finding["pillar"] = pillar
+            self._log_eval_trace(pillar, context, finding)
+            return finding
+            
+        except Exception as e:
+            print(f"Error in {pillar}: {str(e)}") 
+            return self._error_finding(pillar, self._format_error_msg(e))
 
     @traceable(run_type="chain", name="Full_Compliance_Audit")
     def run_compliance_audit(self, session_id):
-        pillars = ["Capacity", "Consent", "Consideration", "Legality", "Documentation", "Breach", "Termination", "Jurisdiction"]
         final_report = []
 
         print("🚀 Launching Parallel Audit Threads...")
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(AUDIT_PILLARS)) as executor:
             future_to_pillar = {
                 executor.submit(self.run_pillar_analysis, pillar, session_id): pillar 
-                for pillar in pillars
+                for pillar in AUDIT_PILLARS
             }
             
             for future in concurrent.futures.as_completed(future_to_pillar):
@@ -188,43 +527,120 @@ class AegisEngine:
                     final_report.append(finding)
                 except Exception as e:
                     print(f"❌ Thread crash on {pillar}: {e}")
-                    final_report.append({
-                        "pillar": pillar, 
-                        "rating": "ERROR", 
-                        "finding": "Thread Execution Failed", 
-                        "remediation": "N/A", 
-                        "citation": "System Error"
-                    })
+                    final_report.append(self._error_finding(pillar, "Thread Execution Failed"))
                     
         print("✅ All threads completed successfully!")
         return final_report
 
-    def run_query(self, user_query, session_id, history):
-        """Unified State-Aware Chat Router (Streaming Enabled)."""
+    @traceable(run_type="chain", name="Streaming_Compliance_Audit")
+    async def astream_compliance_audit(self, session_id, pillars=None, mode=DEFAULT_AUDIT_MODE, retrieved=None):
+        """
+        Yields each pillar finding the moment its task completes, in completion order.
+        Pass `pillars` to run only a subset (e.g. those missing from the finding cache), and
+        `retrieved` (from apillar_context_fingerprints) to skip the batched retrieval.
+        mode="single" asks for every pillar in one structured call and fans out only
+        for pillars that come back missing or malformed.
+        """
+        if mode not in AUDIT_MODES:
+            raise ValueError(f"Unknown audit mode '{mode}'. Expected one of {AUDIT_MODES}.")
+        pillars = AUDIT_PILLARS if pillars is None else pillars
+        semaphore = asyncio.Semaphore(AUDIT_PILLAR_CONCURRENCY)
+
+        if retrieved is None:
+            try:
+                retrieved = await self.abatch_hybrid_docs(pillars, session_id, k_val=5)
+            except Exception as e:
+                print(f"⚠️ Batched retrieval failed, falling back to per-pillar retrieval: {e}")
+                retrieved = {}
+
+        async def guarded(pillar):
+            async with semaphore:
+                try:
+                    return await self.arun_pillar_analysis(
+                        pillar, session_id,
+                        law_docs=retrieved.get((pillar, "LAW")),
+                        pol_docs=retrieved.get((pillar, "POLICY"))
+                    )
+                except Exception as e:
+                    print(f"❌ Task crash on {pillar}: {e}")
+                    return self._error_finding(pillar, "Task Execution Failed")
+
+        if mode == "single" and retrieved:
+            single_findings = await self._arun_single_call_audit(pillars, retrieved, session_id)
+            for pillar in pillars:
+                if pillar in single_findings:
+                    yield single_findings[pillar]
+            pillars = [pillar for pillar in pillars if pillar not in single_findings]
+            if pillars:
+                print(f"↩️ Falling back to per-pillar calls for: {', '.join(pillars)}")
+
+        print("🚀 Launching Async Audit Tasks...")
+        tasks = [asyncio.create_task(guarded(pillar)) for pillar in pillars]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+            print("✅ All pillar tasks completed successfully!")
+        finally:
+            # Client went away mid-stream: don't keep burning quota on abandoned pillars
+            for task in tasks:
+                task.cancel()
+
+    @traceable(run_type="chain", name="Full_Compliance_Audit_Async")
+    async def arun_compliance_audit(self, session_id, pillars=None, mode=DEFAULT_AUDIT_MODE):
+        """Runs all pillars as coroutines, capped by AUDIT_PILLAR_CONCURRENCY in-flight LLM calls."""
+        return [finding async for finding in self.astream_compliance_audit(session_id, pillars, mode)]
+
+    async def summarize_history(self, summary, turns, token_budget, session_id=None):
+        """Folds older chat turns into the running summary (audit priority: it never blocks a live chat)."""
+        prompt = f"""
+        Update the running summary of a compliance consultation with the new messages below.
+        Keep every fact, clause reference, figure and open question the user may refer back to; drop pleasantries.
+        Reply with the updated summary only, in at most {token_budget * 3 // 4} words.
+
+        CURRENT SUMMARY:
+        {summary or "(empty)"}
+
+        NEW MESSAGES:
+        {chr(10).join(turns)}
+        """
+        res = await self.model.generate_content_async(prompt, session_id=session_id)
+        return res.text.strip()
+
+    def run_query(self, user_query, session_id, history, timings=None, query_vector=None):
+        """
+        Unified State-Aware Chat Router (Streaming Enabled).
+        `history` is the prompt-ready block from chat_history.format_history.
+        Pass a dict as `timings` to receive the retrieval time (ms) for Server-Timing headers;
+        timings["error"] is set when the answer is an error or fallback message (not cacheable).
+        """
         
         if session_id == "general_chat":
             prompt = f"You are Buddy, a helpful AI. Answer conversationally.\nHistory: {history}\nUser: {user_query}"
             try:
-                response = self.chat_model.generate_content(prompt, stream=True)
+                response = self.chat_model.generate_content(prompt, stream=True, session_id=session_id)
                 for chunk in response:
                     # 🛡️ SAFETY FIX 1: Check for valid parts before yielding text
                     if chunk.candidates and chunk.candidates[0].content.parts:
                         yield chunk.text
                     else:
+                        self._mark_error(timings)
                         yield "I'm not quite sure how to respond to that."
                 return
             except Exception as e:
+                self._mark_error(timings)
                 yield self._format_error_msg(e)
                 return
 
-        # Chat now benefits from hybrid search capabilities
-        law_docs = self._get_hybrid_docs(user_query, session_id, "LAW", k_val=4)
-        pol_docs = self._get_hybrid_docs(user_query, session_id, "POLICY", k_val=4)
+        # Chat now benefits from hybrid search capabilities; LAW and POLICY are retrieved concurrently
+        retrieval_start = time.perf_counter()
+        retrieved = self._parallel_hybrid_docs(user_query, session_id, k_val=4, query_vector=query_vector)
+        law_docs, pol_docs = retrieved["LAW"], retrieved["POLICY"]
+        if timings is not None:
+            timings["retrieval_ms"] = (time.perf_counter() - retrieval_start) * 1000
         
-        context = ""
-        for d in law_docs + pol_docs:
-            src = d.metadata.get('source', 'Document')
-            context += f"[{src}]: {d.page_content}\n"
+        context = format_context(
+            pack_context(law_docs, CHAT_CONTEXT_TOKEN_BUDGET // 2) + pack_context(pol_docs, CHAT_CONTEXT_TOKEN_BUDGET // 2)
+        )
         
         hybrid_prompt = f"""
         Role: You are Buddy, a Senior AI Legal & Compliance Consultant.
@@ -245,11 +661,13 @@ class AegisEngine:
         """
         
         try:
-            response = self.model.generate_content(hybrid_prompt, stream=True)
+            response = self.chat_model.generate_content(hybrid_prompt, stream=True, session_id=session_id)
             for chunk in response:
                 if chunk.candidates and chunk.candidates[0].content.parts:
                     yield chunk.text
                 else:
+                    self._mark_error(timings)
                     yield "I'm not quite sure how to respond to that."
         except Exception as e:
+            self._mark_error(timings)
             yield self._format_error_msg(e)
\ No newline at end of file
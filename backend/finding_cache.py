@@ -0,0 +1,44 @@
+import json
+import logging
+
+from backend.engine import GEMINI_MODEL_NAME, PILLAR_PROMPT_VERSION
+from backend.telemetry import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+FINDING_CACHE_TTL = 604800
+
+
+class FindingCache:
+    """
+    Finding-level Redis cache keyed by (law hash, policy hash, pillar, prompt version, model, audit mode).
+    ERROR findings are never stored, so a quota hit on one pillar only re-runs that pillar.
+    """
+
+    def __init__(self, redis_client, prompt_version=PILLAR_PROMPT_VERSION, model_name=GEMINI_MODEL_NAME, ttl=FINDING_CACHE_TTL):
+        self.redis = redis_client
+        self.prompt_version = prompt_version
+        self.model_name = model_name
+        self.ttl = ttl
+
+    def key(self, law_hash, policy_hash, pillar, mode="fanout"):
+        return f"aegis_finding:{law_hash}:{policy_hash}:{pillar}:{self.prompt_version}:{self.model_name}:{mode}"
+
+    async def get_many(self, law_hash, policy_hash, pillars, mode="fanout"):
+        """Returns {pillar: finding} for every pillar that has a cached finding."""
+        try:
+            raw = await self.redis.mget([self.key(law_hash, policy_hash, p, mode) for p in pillars])
+        except Exception as e:
+            logger.error(f"Redis read error on finding cache: {e}")
+            return {}
+        found = {pillar: json.loads(value) for pillar, value in zip(pillars, raw) if value}
+        record_cache_lookup("finding", hits=len(found), misses=len(pillars) - len(found))
+        return found
+
+    async def put(self, law_hash, policy_hash, finding, mode="fanout"):
+        if finding.get("rating") == "ERROR":
+            return
+        try:
+            await self.redis.setex(self.key(law_hash, policy_hash, finding["pillar"], mode), self.ttl, json.dumps(finding))
+        except Exception as e:
+            logger.error(f"Redis write error on finding cache: {e}")
@@ -0,0 +1,233 @@
+import os
+import time
+import queue
+import hashlib
+import threading
+
+from langchain_core.documents import Document
+
+from backend.telemetry import STAGE_SECONDS
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", "4"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+
+def chunk_id(text, occurrence=0):
+    """Content-derived vector ID: re-ingesting the same chunk overwrites instead of duplicating."""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+    return digest if occurrence == 0 else f"{digest}-{occurrence}"
+
+
+def stream_chunks(pages, splitter):
+    """
+    Incrementally splits a stream of page texts. Only the trailing, possibly incomplete
+    chunk is carried over to the next page, so memory stays bounded by one page plus one chunk.
+    """
+    carry = ""
+    for page_text in pages:
+        carry = f"{carry}\n\n{page_text}" if carry else page_text
+        chunks = splitter.split_text(carry)
+        if not chunks:
+            carry = ""
+            continue
+        for chunk in chunks[:-1]:
+            yield chunk
+        carry = chunks[-1]
+    if carry:
+        yield from splitter.split_text(carry)
+
+
+class StageStats:
+    """Item count and busy time for one pipeline stage."""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items, seconds):
+        with self._lock:
+            self.items += items
+            self.seconds += seconds
+        STAGE_SECONDS.labels(stage=self.name).observe(seconds)
+
+    @property
+    def throughput(self):
+        return self.items / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {"items": self.items, "unit": self.unit, "seconds": round(self.seconds, 3), "per_second": round(self.throughput, 2)}
+
+    def __str__(self):
+        return f"{self.name}: {self.items} {self.unit} in {self.seconds:.2f}s ({self.throughput:.1f}/s)"
+
+
+class IngestionPipeline:
+    """
+    parse → split → embed → upsert, with each stage connected by a bounded queue:
+    the caller's thread pulls pages and splits them, one thread embeds fixed-size batches,
+    and UPSERT_CONCURRENCY threads write batches to the vector backend. Vectors start
+    landing while later pages are still being parsed, and at most PIPELINE_QUEUE_SIZE
+    batches are buffered between stages.
+    """
+
+    def __init__(self, embeddings, vector_backend, splitter, namespace,
+                 batch_size=EMBED_BATCH_SIZE, upsert_workers=UPSERT_CONCURRENCY, queue_size=PIPELINE_QUEUE_SIZE):
+        self.embeddings = embeddings
+        self.splitter = splitter
+        self.vector_backend = vector_backend
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.upsert_workers = upsert_workers
+        self.queue_size = queue_size
+        self.stats = {
+            "parse": StageStats("parse", "pages"),
+            "split": StageStats("split", "chunks"),
+            "embed": StageStats("embed", "chunks"),
+            "upsert": StageStats("upsert", "vectors"),
+        }
+        self.reused = 0
+        self._error = None
+        self._failed = threading.Event()
+
+    def _fail(self, exc):
+        if self._error is None:
+            self._error = exc
+        self._failed.set()
+
+    def _put(self, q, item):
+        """Blocking put that gives up once another stage has failed (avoids deadlock on a full queue)."""
+        while not self._failed.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        """Blocking get that returns the end-of-stream marker once another stage has failed."""
+        while not self._failed.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _embed_worker(self, embed_q, upsert_q):
+        try:
+            while True:
+                batch = self._get(embed_q)
+                if batch is _DONE:
+                    break
+                start = time.perf_counter()
+                vectors = self.embeddings.embed_documents([doc.page_content for doc in batch])
+                self.stats["embed"].record(len(batch), time.perf_counter() - start)
+                if not self._put(upsert_q, (batch, vectors)):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in range(self.upsert_workers):
+                self._put(upsert_q, _DONE)
+
+    def _upsert_worker(self, upsert_q):
+        try:
+            while True:
+                item = self._get(upsert_q)
+                if item is _DONE:
+                    return
+                batch, vectors = item
+                start = time.perf_counter()
+                self.vector_backend.upsert(
+                    self.namespace,
+                    ids=[doc.id for doc in batch],
+                    vectors=vectors,
+                    texts=[doc.page_content for doc in batch],
+                    metadatas=[doc.metadata for doc in batch]
+                )
+                self.stats["upsert"].record(len(batch), time.perf_counter() - start)
+        except Exception as e:
+            self._fail(e)
+
+    def _timed_pages(self, pages):
+        iterator = iter(pages)
+        while True:
+            start = time.perf_counter()
+            try:
+                page = next(iterator)
+            except StopIteration:
+                return
+            self.stats["parse"].record(1, time.perf_counter() - start)
+            yield page
+
+    def run(self, pages, filename, existing=None):
+        """
+        Consumes an iterable of page texts and returns every ingested chunk as a Document.
+        `existing` ({chunk ID: metadata}) lists chunks already in the namespace: those are
+        returned with their stored metadata but not embedded or upserted again.
+        """
+        existing = existing or {}
+        embed_q = queue.Queue(maxsize=self.queue_size)
+        upsert_q = queue.Queue(maxsize=self.queue_size)
+
+        embedder = threading.Thread(target=self._embed_worker, args=(embed_q, upsert_q), daemon=True)
+        upserters = [
+            threading.Thread(target=self._upsert_worker, args=(upsert_q,), daemon=True)
+            for _ in range(self.upsert_workers)
+        ]
+        embedder.start()
+        for worker in upserters:
+            worker.start()
+
+        docs, batch, seen = [], [], {}
+        try:
+            chunks = stream_chunks(self._timed_pages(pages), self.splitter)
+            while not self._failed.is_set():
+                parse_before = self.stats["parse"].seconds
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                # Pulling a chunk may pull (and parse) a page; keep that time under "parse"
+                split_seconds = time.perf_counter() - start - (self.stats["parse"].seconds - parse_before)
+                if chunk is None:
+                    break
+                chunk = chunk.strip()
+                if not chunk:
+                    continue
+                self.stats["split"].record(1, split_seconds)
+
+                occurrence = seen.get(chunk, 0)
+                seen[chunk] = occurrence + 1
+                doc_id = chunk_id(chunk, occurrence)
+                if doc_id in existing:
+                    docs.append(Document(page_content=chunk, metadata=existing[doc_id], id=doc_id))
+                    self.reused += 1
+                    continue
+                doc = Document(page_content=chunk, metadata={"source": filename}, id=doc_id)
+                docs.append(doc)
+                batch.append(doc)
+                if len(batch) >= self.batch_size:
+                    self._put(embed_q, batch)
+                    batch = []
+
+            if batch:
+                self._put(embed_q, batch)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(embed_q, _DONE)
+            embedder.join()
+            for worker in upserters:
+                worker.join()
+
+        if self._error is not None:
+            raise self._error
+
+        reused = f" | reused: {self.reused} chunks" if self.reused else ""
+        print(f"📊 [{self.namespace}] " + " | ".join(str(stage) for stage in self.stats.values()) + reused)
+        return docs
@@ -1,65 +1,110 @@
 import os
 import tempfile
-from langchain_core.documents import Document
-from llama_parse import LlamaParse
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from pinecone import Pinecone
-from langchain_pinecone import PineconeVectorStore
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
+from backend.content_cache import CachedEmbeddings, content_cache, load_parsed_pages, store_parsed_pages
+from backend.ingest_pipeline import IngestionPipeline
+from backend.pdf_parser import create_pdf_parser
+from backend.sparse_index import SparseIndex, sparse_index_store
+from backend.vector_store import create_vector_backend
+
 class AegisIngestor:
-    def __init__(self, namespace_name, api_key):
+    def __init__(self, namespace_name, api_key, embeddings=None, vector_backend=None, parser=None, splitter=None):
         """
-        namespace_name will map to the session ID to isolate user data
+        namespace_name will map to the session ID to isolate user data.
+        The optional clients are injected by the shared ResourcePool so a request
+        does not pay for new vector-store/LlamaParse/embedding connections.
         """
         self.namespace = namespace_name
 
-        self.embeddings = GoogleGenerativeAIEmbeddings(
+        self.embeddings = embeddings or GoogleGenerativeAIEmbeddings(
             model="models/gemini-embedding-2", 
             google_api_key=api_key
         )
 
-        self.parser = LlamaParse(
-            api_key=os.getenv("LLAMA_CLOUD_API_KEY"),
-            result_type="markdown",
-            num_workers= True,
-            verbose=True
-        )
+        self.parser = parser or create_pdf_parser()
         
-        self.splitter = RecursiveCharacterTextSplitter(
+        self.splitter = splitter or RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=100
         )
 
-        self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        self.index_name = "aegis-audit-index"
-        self.index = self.pc.Index(self.index_name)
+        self.vector_backend = vector_backend or create_vector_backend(self.embeddings)
+        self.last_stage_stats = {}
+        self.last_diff = {}
+        # Chunk IDs written by the last process_file, for waiting on an eventually consistent index
+        self.last_written = {"upserted": [], "deleted": []}
+
+        # Chunk embeddings are content-addressed, so re-uploaded statutes skip the embedding API
+        self.chunk_embeddings = CachedEmbeddings(
+            self.embeddings, content_cache, getattr(self.embeddings, "model", "embeddings")
+        )
+        self.parser_name = getattr(self.parser, "cache_name", "llamaparse-markdown")
+
+    def _iter_pages(self, file_path):
+        """Yields page texts from the configured parser (local parsers stream page by page)."""
+        if hasattr(self.parser, "iter_pages"):
+            yield from self.parser.iter_pages(file_path)
+            return
+        for doc in self.parser.load_data(file_path):
+            yield doc.text
+
+    def _iter_cached_pages(self, file_path, file_hash):
+        """Serves parsed pages from the content cache by file hash, parsing (and caching) on a miss."""
+        cached_pages = load_parsed_pages(content_cache, file_hash, self.parser_name)
+        if cached_pages is not None:
+            print(f"♻️ [{self.namespace}] Parse cache hit, skipping parser for {file_hash[:12]}")
+            yield from cached_pages
+            return
+
+        pages = []
+        for page in self._iter_pages(file_path):
+            pages.append(page)
+            yield page
+        store_parsed_pages(content_cache, file_hash, self.parser_name, pages)
+
+    def process_file(self, file_path, filename, file_hash=None, incremental=False):
+        """
+        Parses a PDF already on disk and streams its chunks into the isolated vector namespace:
+        pages flow into the splitter, chunks are embedded in fixed-size batches, and batches
+        are upserted concurrently through bounded queues (see IngestionPipeline).
+        When the file's SHA-256 is given, parsed text is reused from the content cache.
+
+        With incremental=True the file replaces the namespace's current document: chunks whose
+        content ID is already stored are kept as they are, only new chunks are embedded and
+        upserted, and chunks missing from the new version are deleted (see last_diff).
+        """
+        previous = sparse_index_store.load(self.namespace) if incremental else None
+        existing = previous.chunk_metadata() if previous else {}
+
+        pages = self._iter_cached_pages(file_path, file_hash) if file_hash else self._iter_pages(file_path)
+        pipeline = IngestionPipeline(self.chunk_embeddings, self.vector_backend, self.splitter, self.namespace)
+        docs = pipeline.run(pages, filename, existing=existing)
+        self.last_stage_stats = {name: stage.as_dict() for name, stage in pipeline.stats.items()}
+
+        removed = set(existing) - {doc.id for doc in docs}
+        if removed:
+            self.vector_backend.delete_ids(self.namespace, list(removed))
+        self.last_diff = {"added": len(docs) - pipeline.reused, "removed": len(removed), "unchanged": pipeline.reused}
+        self.last_written = {"upserted": [doc.id for doc in docs if doc.id not in existing], "deleted": sorted(removed)}
+
+        # Keyword leg of hybrid retrieval: built once here instead of on every query
+        sparse_index_store.save(self.namespace, SparseIndex.from_documents(docs))
+        return self.vector_backend.store(self.namespace)
 
     def process_pdf(self, file_bytes, filename):
             """
-            Processes PDF, parses layout, and pushes directly to isolated Pinecone namespace.
+            Processes in-memory PDF bytes via a temp file. Prefer process_file for uploads
+            that are already spooled to disk.
             """
             with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
                 tmp.write(file_bytes) # Write the raw bytes from FastAPI
                 temp_path = tmp.name
                 
             try:
-
-                parsed_docs = self.parser.load_data(temp_path)
-                raw_text = "\n\n".join([doc.text for doc in parsed_docs])      
-                
-                chunks = self.splitter.split_text(raw_text)
-                cleaned_chunks = [chunk.strip() for chunk in chunks if chunk.strip()]
-                docs = [Document(page_content=chunk, metadata={"source": filename}) for chunk in cleaned_chunks]
-
-                vector_db = PineconeVectorStore.from_documents(
-                    documents=docs,
-                    embedding=self.embeddings,
-                    index_name=self.index_name,
-                    namespace=self.namespace
-                )
-                return vector_db
+                return self.process_file(temp_path, filename)
 
             finally:
                 if os.path.exists(temp_path):
@@ -69,10 +114,14 @@ class AegisIngestor:
         """
         Deletes all vectors for this specific namespace.
         Call this when the user logs out or ends the session.
+        Returns False if the delete failed, so callers such as the idle-session sweeper can retry.
         """ 
         try:
-            self.index.delete(delete_all=True, namespace=self.namespace)
+            self.vector_backend.delete_namespace(self.namespace)
+            sparse_index_store.delete(self.namespace)
             print(f"🧹 Successfully wiped ephemeral data for namespace: {self.namespace}")
+            return True
 
         except Exception as e:
-            print(f"⚠️ Failed to scrub data for {self.namespace}: str{e}")
\ No newline at end of file
+            print(f"⚠️ Failed to scrub data for {self.namespace}: str{e}")
+            return False
\ No newline at end of file
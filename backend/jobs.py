@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import traceback
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_TTL = int(os.getenv("JOB_TTL", "86400"))
+# A running job's record is re-saved every heartbeat; one not updated for a whole lease belongs
+# to a worker that died, and is failed so pollers, followers and resubmits stop waiting on it
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+# Spooled uploads must be visible to whichever worker picks the job up (shared volume across hosts)
+JOB_SPOOL_DIR = os.getenv(
+    "JOB_SPOOL_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".job_spool"))
+)
+
+JOB_QUEUE_KEY = "aegis_jobs:queue"
+TERMINAL_STATES = ("succeeded", "failed")
+
+
+class JobQueue:
+    """
+    Background jobs with polled status. Records, the pending queue and the coalescing keys live
+    in Redis when it is reachable, so any API worker can run or report on any job; otherwise an
+    in-process queue and dict are used. Handlers are registered per kind as
+    `async handler(params, progress)` and return a JSON-serialisable result; `progress(key, state)`
+    records per-stage / per-pillar progress on the job. Running jobs hold a lease renewed by a
+    heartbeat; `get` fails a job whose lease lapsed, which also frees its coalescing key and runs
+    the kind's `on_abandoned(params)` cleanup (the dead worker's handler never reached its own).
+    """
+
+    def __init__(self, workers=JOB_WORKERS, ttl=JOB_TTL, heartbeat=JOB_HEARTBEAT_SECONDS, lease=JOB_LEASE_SECONDS):
+        self.workers = workers
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.lease = lease
+        self.handlers = {}
+        self.cleanups = {}
+        self.redis = None
+        self._records = {}
+        self._dedupe = {}
+        self._local_queue = asyncio.Queue()
+        self._tasks = []
+
+    def register(self, kind, handler, on_abandoned=None):
+        self.handlers[kind] = handler
+        if on_abandoned is not None:
+            self.cleanups[kind] = on_abandoned
+
+    async def start(self, redis_client=None):
+        self.redis = redis_client
+        os.makedirs(JOB_SPOOL_DIR, exist_ok=True)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"🧵 Job workers started: {self.workers} ({'redis' if redis_client else 'in-process'} queue)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _save(self, record):
+        record["updated"] = time.time()
+        if self.redis is not None:
+            await self.redis.setex(f"aegis_job:{record['job_id']}", self.ttl, json.dumps(record))
+        else:
+            self._records[record["job_id"]] = record
+
+    async def get(self, job_id):
+        if self.redis is not None:
+            raw = await self.redis.get(f"aegis_job:{job_id}")
+            record = json.loads(raw) if raw else None
+        else:
+            record = self._records.get(job_id)
+        if record and record["status"] == "running" and time.time() - record["updated"] > self.lease:
+            print(f"⚠️ Job {job_id} lost its worker (no heartbeat for {self.lease}s); marking it failed")
+            record["status"], record["error"] = "failed", "Worker stopped before the job finished."
+            record["finished"] = time.time()
+            await self._finish(record)
+            cleanup = self.cleanups.get(record["kind"])
+            if cleanup is not None:
+                try:
+                    cleanup(record["params"])
+                except Exception as e:
+                    print(f"⚠️ Cleanup of abandoned job {job_id} failed: {e}")
+        return record
+
+    async def wait(self, job_id, poll=1.0):
+        """Blocks until the job is finished (or unknown); returns its record or None."""
+        while True:
+            record = await self.get(job_id)
+            if record is None or record["status"] in TERMINAL_STATES:
+                return record
+            await asyncio.sleep(poll)
+
+    async def _claim_dedupe(self, dedupe_key, job_id):
+        """Returns the id of an identical in-flight job, or None after claiming the key for `job_id`."""
+        if self.redis is not None:
+            key = f"aegis_job_dedupe:{dedupe_key}"
+            if await self.redis.set(key, job_id, nx=True, ex=self.ttl):
+                return None
+            existing_id = await self.redis.get(key)
+        else:
+            existing_id = self._dedupe.setdefault(dedupe_key, job_id)
+            if existing_id == job_id:
+                return None
+
+        # get() fails a job whose lease lapsed, so a dead worker's key is taken over here too
+        existing = await self.get(existing_id) if existing_id else None
+        if existing and existing["status"] not in TERMINAL_STATES:
+            return existing_id
+        # Stale key (job finished, abandoned or expired): take it over
+        if self.redis is not None:
+            await self.redis.set(f"aegis_job_dedupe:{dedupe_key}", job_id, ex=self.ttl)
+        else:
+            self._dedupe[dedupe_key] = job_id
+        return None
+
+    async def _release_dedupe(self, record):
+        dedupe_key = record.get("dedupe_key")
+        if not dedupe_key:
+            return
+        if self.redis is not None:
+            key = f"aegis_job_dedupe:{dedupe_key}"
+            if await self.redis.get(key) == record["job_id"]:
+                await self.redis.delete(key)
+        elif self._dedupe.get(dedupe_key) == record["job_id"]:
+            del self._dedupe[dedupe_key]
+
+    async def submit(self, kind, params, dedupe_key=None):
+        """Queues a job. Returns (record, coalesced); a coalesced submit returns the in-flight job."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}'.")
+        job_id = uuid.uuid4().hex
+        if dedupe_key:
+            existing_id = await self._claim_dedupe(dedupe_key, job_id)
+            if existing_id:
+                return await self.get(existing_id), True
+
+        now = time.time()
+        record = {
+            "job_id": job_id, "kind": kind, "status": "queued", "params": params,
+            "dedupe_key": dedupe_key, "progress": {}, "result": None, "error": None,
+            "created": now, "started": None, "finished": None
+        }
+        await self._save(record)
+        if self.redis is not None:
+            await self.redis.rpush(JOB_QUEUE_KEY, job_id)
+        else:
+            self._local_queue.put_nowait(job_id)
+        return record, False
+
+    async def _next_job_id(self):
+        if self.redis is None:
+            return await self._local_queue.get()
+        popped = await self.redis.blpop(JOB_QUEUE_KEY, timeout=1)
+        return popped[1] if popped else None
+
+    async def _worker(self):
+        while True:
+            try:
+                job_id = await self._next_job_id()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Job queue read failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            if job_id:
+                await self._run(job_id)
+
+    async def _run(self, job_id):
+        record = await self.get(job_id)
+        if record is None:
+            return
+
+        async def progress(key, state):
+            record["progress"][key] = state
+            await self._save(record)
+
+        record["status"], record["started"] = "running", time.time()
+        await self._save(record)
+        heartbeat = asyncio.create_task(self._heartbeat(record))
+        try:
+            record["result"] = await self.handlers[record["kind"]](record["params"], progress)
+            record["status"] = "succeeded"
+        except asyncio.CancelledError:
+            record["status"], record["error"] = "failed", "Worker shut down before the job finished."
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            record["status"], record["error"] = "failed", str(e)
+        finally:
+            heartbeat.cancel()
+            record["finished"] = time.time()
+            await asyncio.shield(self._finish(record))
+        print(f"🧵 Job {job_id} ({record['kind']}) {record['status']} in {record['finished'] - record['started']:.2f}s")
+
+    async def _heartbeat(self, record):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                await self._save(record)
+            except Exception as e:
+                print(f"⚠️ Job heartbeat failed for {record['job_id']}: {e}")
+
+    async def _finish(self, record):
+        await self._save(record)
+        await self._release_dedupe(record)
+
+
+def audit_dedupe_key(session_id, combined_hash, mode):
+    """
+    Coalesces repeated audits of one session only. Sessions that uploaded the same documents
+    still audit their own namespaces, so one user's logout cannot empty another's result.
+    """
+    return f"audit:{session_id}:{combined_hash or '-'}:{mode}"
+
+
+def public_view(record):
+    """Job record as returned by the API (internal params such as spool paths omitted)."""
+    view = {key: value for key, value in record.items() if key not in ("params", "dedupe_key")}
+    view["session_id"] = record["params"].get("session_id")
+    return view
+
+
+job_queue = JobQueue()
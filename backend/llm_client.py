@@ -0,0 +1,341 @@
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+from collections import Counter, deque
+from contextlib import ExitStack, asynccontextmanager, contextmanager, nullcontext
+
+from backend.context_packer import estimate_tokens
+from backend.llm_scheduler import AdmissionTimeout
+from backend.telemetry import IN_FLIGHT, LLM_PROMPT_TOKENS, LLM_SECONDS, LLM_TTFT_SECONDS, span
+
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("LLM_CIRCUIT_COOLDOWN_SECONDS", "60"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+ATTEMPT_LOG_SIZE = int(os.getenv("LLM_ATTEMPT_LOG_SIZE", "2000"))
+# Output allowance added to the prompt estimate when reserving tokens with the scheduler
+LLM_OUTPUT_TOKEN_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKEN_ESTIMATE", "800"))
+
+_RETRY_IN_RE = re.compile(r"retry in\s+([\d.]+)\s*s", re.IGNORECASE)
+_RETRY_DELAY_RE = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE)
+_TRANSIENT_MARKERS = ("500", "502", "503", "504", "internal", "unavailable", "deadline", "timed out", "timeout", "connection reset")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling Gemini while the quota circuit is open."""
+
+
+def is_quota_error(exc):
+    text = f"{type(exc).__name__} {exc}".lower()
+    return "429" in text or "quota" in text or "exhausted" in text
+
+
+def is_transient_error(exc):
+    # Failing fast: the circuit is open, or the scheduler queue is already saturated
+    # (retrying an admission timeout would just wait LLM_QUEUE_TIMEOUT_SECONDS again)
+    if isinstance(exc, (CircuitOpenError, AdmissionTimeout)):
+        return False
+    if is_quota_error(exc) or isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    text = str(exc).lower()
+    return any(marker in text for marker in _TRANSIENT_MARKERS)
+
+
+def retry_after_seconds(exc):
+    """Server-provided retry hint, from an explicit attribute, a Retry-After header or the error text."""
+    hint = getattr(exc, "retry_after", None)
+    if hint is not None:
+        return float(hint)
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    if headers.get("Retry-After", "").replace(".", "", 1).isdigit():
+        return float(headers["Retry-After"])
+    text = str(exc)
+    match = _RETRY_IN_RE.search(text) or _RETRY_DELAY_RE.search(text)
+    return float(match.group(1)) if match else None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Exponential backoff with full jitter; a server hint is honoured as the floor."""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, LLM_BACKOFF_MAX_SECONDS))
+    return delay
+
+
+class CircuitBreaker:
+    """
+    Opens after CIRCUIT_FAILURE_THRESHOLD consecutive quota failures and fails fast until the
+    cooldown (or the server's retry hint, if longer) elapses; then lets one probe call through.
+    """
+
+    def __init__(self, threshold=CIRCUIT_FAILURE_THRESHOLD, cooldown=CIRCUIT_COOLDOWN_SECONDS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if time.time() < self.open_until:
+            return "open"
+        return "half_open" if self.consecutive_failures >= self.threshold else "closed"
+
+    def before_call(self):
+        """Raises while open; returns True when this call is the single half-open probe."""
+        with self._lock:
+            remaining = self.open_until - time.time()
+            if remaining > 0:
+                raise CircuitOpenError(f"Gemini quota exhausted (429); circuit open, retry in {remaining:.0f}s")
+            if self.consecutive_failures >= self.threshold:
+                if self._probing:
+                    raise CircuitOpenError("Gemini quota exhausted (429); circuit half-open, probe in flight")
+                self._probing = True
+                return True
+            return False
+
+    def release_probe(self):
+        """Frees the probe slot of a call that ended without an outcome (cancelled, not admitted)."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._probing = False
+
+    def record_failure(self, exc):
+        with self._lock:
+            self._probing = False
+            if not is_quota_error(exc):
+                return
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.threshold:
+                self.open_until = time.time() + max(self.cooldown, retry_after_seconds(exc) or 0)
+
+
+class ResilientModel:
+    """
+    Drop-in wrapper around a genai.GenerativeModel: retries quota and transient errors with
+    jittered exponential backoff (honouring retry-after hints), shares a circuit breaker across
+    models on the same quota, optionally hedges slow async calls past the observed p95 latency,
+    and records every attempt. Streaming calls are retried only until the first chunk arrives.
+    With a scheduler, every attempt (hedges included) is admitted under `priority`; calls may pass
+    `session_id=` so capacity is shared fairly across sessions. Backoff sleeps hold no slot.
+    """
+
+    def __init__(self, model, name, breaker=None, max_attempts=LLM_MAX_ATTEMPTS, hedge=LLM_HEDGE_ENABLED,
+                 scheduler=None, priority="audit"):
+        self.model = model
+        self.name = name
+        self.scheduler = scheduler
+        self.priority = priority
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.hedge = hedge
+        self.attempts = deque(maxlen=ATTEMPT_LOG_SIZE)
+        self._latencies = deque(maxlen=500)
+        self._lock = threading.Lock()
+
+    def _record(self, attempt, started, outcome, error=None, hedged=False, observe=True):
+        latency = time.time() - started
+        if observe:
+            LLM_SECONDS.labels(model=self.name, outcome=outcome).observe(latency)
+        with self._lock:
+            self.attempts.append({
+                "model": self.name, "attempt": attempt, "latency": round(latency, 3),
+                "outcome": outcome, "error": str(error)[:200] if error else None,
+                "hedged": hedged, "timestamp": started
+            })
+            if outcome == "success":
+                self._latencies.append(latency)
+
+    def _hedge_after(self):
+        with self._lock:
+            if not self.hedge or len(self._latencies) < LLM_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * LLM_HEDGE_PERCENTILE))]
+
+    def _observe_usage(self, response):
+        prompt_tokens = getattr(getattr(response, "usage_metadata", None), "prompt_token_count", None)
+        if prompt_tokens:
+            LLM_PROMPT_TOKENS.labels(model=self.name).observe(prompt_tokens)
+
+    @contextmanager
+    def _call_span(self, attempt, hedged=False, attach=True):
+        with IN_FLIGHT.labels(kind=f"llm_{self.name}").track_inprogress(), span(
+            "gemini.generate_content", attach=attach, model=self.name, attempt=attempt, hedged=hedged
+        ):
+            yield
+
+    def _token_estimate(self, prompt):
+        return estimate_tokens(str(prompt)) + LLM_OUTPUT_TOKEN_ESTIMATE
+
+    def _admit(self, prompt, session_id):
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(self.priority, session_id, self._token_estimate(prompt))
+
+    @asynccontextmanager
+    async def _aadmit(self, prompt, session_id):
+        if self.scheduler is None:
+            yield
+            return
+        async with self.scheduler.aslot(self.priority, session_id, self._token_estimate(prompt)):
+            yield
+
+    def _should_retry(self, exc, attempt):
+        return is_transient_error(exc) and attempt + 1 < self.max_attempts
+
+    def generate_content(self, prompt, stream=False, session_id=None, **kwargs):
+        if stream:
+            return self._stream(prompt, kwargs, session_id)
+
+        for attempt in range(self.max_attempts):
+            self.breaker.before_call()
+            started = time.time()
+            try:
+                with self._admit(prompt, session_id), self._call_span(attempt):
+                    started = time.time()
+                    response = self.model.generate_content(prompt, **kwargs)
+            except Exception as e:
+                self.breaker.record_failure(e)
+                self._record(attempt, started, "error", e)
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(backoff_delay(attempt, retry_after_seconds(e)))
+                continue
+            self.breaker.record_success()
+            self._record(attempt, started, "success")
+            self._observe_usage(response)
+            return response
+
+    def _stream(self, prompt, kwargs, session_id):
+        for attempt in range(self.max_attempts):
+            probe = self.breaker.before_call()
+            # The slot is held for the whole stream, but released before any backoff sleep
+            with ExitStack() as stack:
+                try:
+                    stack.enter_context(self._admit(prompt, session_id))
+                except BaseException:
+                    # e.g. AdmissionTimeout: Gemini was never called, so there is no outcome to record
+                    if probe:
+                        self.breaker.release_probe()
+                    raise
+                stack.enter_context(self._call_span(attempt, attach=False))
+                started = time.time()
+                try:
+                    chunks = iter(self.model.generate_content(prompt, stream=True, **kwargs))
+                    first = next(chunks, None)
+                except Exception as e:
+                    self.breaker.record_failure(e)
+                    self._record(attempt, started, "error", e)
+                    if not self._should_retry(e, attempt):
+                        raise
+                    delay = backoff_delay(attempt, retry_after_seconds(e))
+                else:
+                    self.breaker.record_success()
+                    # The attempt log keeps time-to-first-chunk; the histogram gets the full stream below
+                    self._record(attempt, started, "success", observe=False)
+                    LLM_TTFT_SECONDS.labels(model=self.name).observe(time.time() - started)
+                    last = first
+                    if first is not None:
+                        yield first
+                    for last in chunks:
+                        yield last
+                    LLM_SECONDS.labels(model=self.name, outcome="success").observe(time.time() - started)
+                    # Usage metadata arrives with the final chunk
+                    self._observe_usage(last)
+                    return
+            time.sleep(delay)
+
+    async def _attempt_async(self, prompt, kwargs, session_id, attempt, hedged=False):
+        probe = self.breaker.before_call()
+        started = time.time()
+        try:
+            async with self._aadmit(prompt, session_id):
+                started = time.time()
+                with self._call_span(attempt, hedged):
+                    response = await self.model.generate_content_async(prompt, **kwargs)
+        except asyncio.CancelledError:
+            # A cancelled probe (losing hedge leg, client disconnect) must not wedge the breaker half-open
+            if probe:
+                self.breaker.release_probe()
+            self._record(attempt, started, "cancelled", hedged=hedged)
+            raise
+        except Exception as e:
+            self.breaker.record_failure(e)
+            self._record(attempt, started, "error", e, hedged=hedged)
+            raise
+        except BaseException:
+            if probe:
+                self.breaker.release_probe()
+            raise
+        self.breaker.record_success()
+        self._record(attempt, started, "success", hedged=hedged)
+        self._observe_usage(response)
+        return response
+
+    async def _hedged_attempt(self, prompt, kwargs, session_id, attempt):
+        """Fires a duplicate request if the first is slower than the observed tail latency."""
+        threshold = self._hedge_after()
+        primary = asyncio.create_task(self._attempt_async(prompt, kwargs, session_id, attempt))
+        if threshold is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        if done:
+            return primary.result()
+
+        backup = asyncio.create_task(self._attempt_async(prompt, kwargs, session_id, attempt, hedged=True))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def generate_content_async(self, prompt, session_id=None, **kwargs):
+        for attempt in range(self.max_attempts):
+            try:
+                return await self._hedged_attempt(prompt, kwargs, session_id, attempt)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, retry_after_seconds(e)))
+
+    def stats(self):
+        with self._lock:
+            attempts = list(self.attempts)
+            latencies = sorted(self._latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3) if latencies else None
+
+        return {
+            "model": self.name,
+            "attempts": len(attempts),
+            "outcomes": dict(Counter(a["outcome"] for a in attempts)),
+            "retries": sum(1 for a in attempts if a["attempt"] > 0),
+            "hedged": sum(1 for a in attempts if a["hedged"]),
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_p99": percentile(0.99),
+            "circuit": self.breaker.state,
+        }
@@ -0,0 +1,245 @@
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+
+import redis
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))  # 0 = no token cap
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "120"))
+# Share the TPM window across workers through Redis (fixed one-minute buckets)
+LLM_SCHEDULER_REDIS = os.getenv("LLM_SCHEDULER_REDIS", "false").lower() == "true"
+
+# Lower value is served first: interactive chat ahead of batch audit pillars
+PRIORITIES = {"chat": 0, "audit": 1}
+
+_TPM_WINDOW_SECONDS = 60
+
+# Check-and-reserve in one step so concurrent workers cannot both pass the check and overshoot.
+# A single request larger than the cap is still admitted on an empty window.
+RESERVE_TPM_SCRIPT = """
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+local tokens = tonumber(ARGV[1])
+if used > 0 and used + tokens > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('INCRBY', KEYS[1], tokens)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class AdmissionTimeout(RuntimeError):
+    """Raised when a call waited longer than LLM_QUEUE_TIMEOUT_SECONDS for an LLM slot."""
+
+
+class _Waiter:
+    __slots__ = ("priority", "session_id", "tokens", "enqueued", "event", "loop", "future", "granted")
+
+    def __init__(self, priority, session_id, tokens, loop=None):
+        self.priority = priority
+        self.session_id = session_id
+        self.tokens = tokens
+        self.enqueued = time.time()
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+
+    def wake(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(True))
+        else:
+            self.event.set()
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for Gemini calls. A call holds one of LLM_MAX_CONCURRENCY
+    slots and its estimated tokens count against the per-minute budget. Waiters are served by
+    priority class, then round-robin across sessions so one large audit cannot starve the others.
+    Usable from worker threads (`slot`) and coroutines (`aslot`). With a shared Redis window,
+    `aslot` runs queue operations in a thread so the blocking Redis calls stay off the event loop.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                 queue_timeout=LLM_QUEUE_TIMEOUT_SECONDS, redis_url=None):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        # priority -> OrderedDict(session_id -> deque[_Waiter]); dict order is the round-robin order
+        self._queues = {p: OrderedDict() for p in sorted(set(PRIORITIES.values()))}
+        self._window = deque()  # (timestamp, tokens) inside the last minute
+        self._window_tokens = 0
+        self._waits = {name: deque(maxlen=1000) for name in PRIORITIES}
+        self._admitted = {name: 0 for name in PRIORITIES}
+        self._timeouts = 0
+        self._retry_timer = None
+        self._lock = threading.Lock()
+        self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.5) if redis_url else None
+        self._reserve_script = self._redis.register_script(RESERVE_TPM_SCRIPT) if self._redis is not None else None
+
+    def _local_window_tokens(self, now):
+        while self._window and now - self._window[0][0] >= _TPM_WINDOW_SECONDS:
+            self._window_tokens -= self._window.popleft()[1]
+        return self._window_tokens
+
+    def _reserve_tokens(self, tokens, now):
+        """Reserves `tokens` in the current window; returns False if that would exceed the cap."""
+        if not self.tokens_per_minute:
+            return True
+        if self._redis is not None:
+            key = f"aegis_llm_tpm:{int(now // _TPM_WINDOW_SECONDS)}"
+            try:
+                return bool(self._reserve_script(keys=[key], args=[tokens, self.tokens_per_minute, _TPM_WINDOW_SECONDS * 2]))
+            except redis.RedisError as e:
+                print(f"⚠️ Redis TPM window unavailable, using the local window: {e}")
+        used = self._local_window_tokens(now)
+        # A single request larger than the cap is still admitted on an empty window
+        if used and used + tokens > self.tokens_per_minute:
+            return False
+        self._window.append((now, tokens))
+        self._window_tokens += tokens
+        return True
+
+    def _window_reset_delay(self, now):
+        if self._redis is not None:
+            return _TPM_WINDOW_SECONDS - (now % _TPM_WINDOW_SECONDS) + 0.05
+        return (self._window[0][0] + _TPM_WINDOW_SECONDS - now + 0.05) if self._window else 1.0
+
+    def _next_waiter(self):
+        for priority in self._queues:
+            sessions = self._queues[priority]
+            if sessions:
+                return sessions, next(iter(sessions))
+        return None, None
+
+    def _dispatch_locked(self):
+        now = time.time()
+        while self.in_flight < self.max_concurrency:
+            sessions, session_id = self._next_waiter()
+            if sessions is None:
+                return
+            waiter = sessions[session_id][0]
+            if not self._reserve_tokens(waiter.tokens, now):
+                self._schedule_retry(self._window_reset_delay(now))
+                return
+            sessions[session_id].popleft()
+            # Rotate: this session goes to the back of its priority class
+            queue = sessions.pop(session_id)
+            if queue:
+                sessions[session_id] = queue
+            self._grant_locked(waiter, now)
+            waiter.wake()
+
+    def _grant_locked(self, waiter, now):
+        waiter.granted = True
+        self.in_flight += 1
+        name = next(n for n, p in PRIORITIES.items() if p == waiter.priority)
+        self._admitted[name] += 1
+        self._waits[name].append(now - waiter.enqueued)
+
+    def _schedule_retry(self, delay):
+        if self._retry_timer is None or not self._retry_timer.is_alive():
+            self._retry_timer = threading.Timer(max(delay, 0.05), self._dispatch)
+            self._retry_timer.daemon = True
+            self._retry_timer.start()
+
+    def _dispatch(self):
+        with self._lock:
+            self._dispatch_locked()
+
+    def _enqueue(self, waiter):
+        with self._lock:
+            queues = self._queues[waiter.priority]
+            queues.setdefault(waiter.session_id, deque()).append(waiter)
+            self._dispatch_locked()
+
+    def _abandon(self, waiter, timed_out=True):
+        """Dequeues a waiter that gave up. Returns False if it was granted a slot in the meantime."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            queue = self._queues[waiter.priority].get(waiter.session_id)
+            if queue and waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[waiter.priority][waiter.session_id]
+            self._timeouts += timed_out
+            self._dispatch_locked()
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._dispatch_locked()
+
+    def _waiter(self, priority, session_id, tokens, loop=None):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority '{priority}'. Expected one of {tuple(PRIORITIES)}.")
+        return _Waiter(PRIORITIES[priority], session_id or "anonymous", tokens, loop)
+
+    @contextmanager
+    def slot(self, priority, session_id=None, tokens=0):
+        waiter = self._waiter(priority, session_id, tokens)
+        self._enqueue(waiter)
+        if not waiter.event.wait(self.queue_timeout) and self._abandon(waiter):
+            raise AdmissionTimeout(f"LLM queue timeout after {self.queue_timeout:g}s ({priority})")
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _cancel(self, waiter):
+        if not self._abandon(waiter, timed_out=False):
+            self.release()
+
+    async def _off_loop(self, fn, *args):
+        # Dispatching may reserve tokens in Redis (blocking I/O under the lock); the local window is cheap
+        if self._redis is None:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    @asynccontextmanager
+    async def aslot(self, priority, session_id=None, tokens=0):
+        waiter = self._waiter(priority, session_id, tokens, loop=asyncio.get_running_loop())
+        await self._off_loop(self._enqueue, waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if await self._off_loop(self._abandon, waiter):
+                raise AdmissionTimeout(f"LLM queue timeout after {self.queue_timeout:g}s ({priority})")
+        except asyncio.CancelledError:
+            # Runs to completion in its thread even if this task is cancelled again
+            await self._off_loop(self._cancel, waiter)
+            raise
+        try:
+            yield
+        finally:
+            await self._off_loop(self.release)
+
+    def stats(self):
+        with self._lock:
+            now = time.time()
+            waits = {name: sorted(values) for name, values in self._waits.items()}
+            return {
+                "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency,
+                "queued": {
+                    name: sum(len(q) for q in self._queues[p].values()) for name, p in PRIORITIES.items()
+                },
+                "queued_sessions": {name: len(self._queues[p]) for name, p in PRIORITIES.items()},
+                "admitted": dict(self._admitted),
+                "timeouts": self._timeouts,
+                "wait_p50": {n: round(w[len(w) // 2], 3) if w else None for n, w in waits.items()},
+                "wait_p95": {n: round(w[min(len(w) - 1, int(len(w) * 0.95))], 3) if w else None for n, w in waits.items()},
+                "tokens_per_minute": self.tokens_per_minute,
+                "window_tokens": None if self._redis is not None else self._local_window_tokens(now),
+            }
+
+
+llm_scheduler = LLMScheduler(redis_url=os.getenv("REDIS_URL") if LLM_SCHEDULER_REDIS else None)
@@ -5,25 +5,43 @@ import traceback
 import hashlib
 import json
 import uuid
+import asyncio
+import itertools
+import functools
 import tempfile
-from typing import List
+from typing import List, Literal, Optional
 
 import redis.asyncio as redis_async
 
 from fastapi import FastAPI, Request, HTTPException, File, UploadFile, BackgroundTasks, Depends
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
 from pydantic import BaseModel
-from contextlib import asynccontextmanager
+from contextlib import aclosing, asynccontextmanager
 
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
 from dotenv import load_dotenv
 
 load_dotenv()
-from backend.report_gen import generate_docx_report
-from backend.ingestion import AegisIngestor
-from backend.engine import AegisEngine
+from backend.report_gen import iter_html_report, iter_jsonl_report
+from backend.report_export import report_renderer
+from backend.engine import AegisEngine, AUDIT_PILLARS, DEFAULT_AUDIT_MODE
+from backend.finding_cache import FindingCache
+from backend.semantic_cache import SemanticAnswerCache, replay
+from backend.chat_history import ChatHistoryStore, format_history
+from backend.content_cache import content_cache
+from backend.resources import ResourcePool, get_pool, get_engine
+from backend.sparse_index import sparse_index_store
+from backend.trace_sink import trace_sink
+from backend.llm_scheduler import llm_scheduler
+from backend.telemetry import (
+    CHAT_TTFT_SECONDS, IN_FLIGHT, mark_worker_exited, record_cache_lookup, register_collector, render_metrics
+)
+from backend.jobs import JOB_SPOOL_DIR, TERMINAL_STATES, audit_dedupe_key, job_queue, public_view
+from backend.session_registry import session_registry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -31,40 +49,117 @@ logger = logging.getLogger(__name__)
 REDIS_URL = os.getenv("REDIS_URL")
 
 redis_client = redis_async.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+finding_cache = FindingCache(redis_client)
+# Bound to Redis in the lifespan once it answers a ping; in-process until then
+semantic_cache = SemanticAnswerCache()
+chat_history = ChatHistoryStore()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    redis_ready = False
     if REDIS_URL:
         try:
             await redis_client.ping()
             logger.info("✅ Connected to Redis cache successfully.")
             await FastAPILimiter.init(redis_client)
             logger.info("🛡️ Rate Limiter initialized.")
+            redis_ready = True
+            semantic_cache.redis = redis_client
+            chat_history.redis = redis_client
         except Exception as e:
             logger.warning(f"⚠️ Redis connection failed. Caching/Limiting disabled. Error: {e}")
     else:
         logger.warning("⚠️ REDIS_URL not found in environment. Caching disabled.")
+
+    try:
+        app.state.pool = await asyncio.to_thread(ResourcePool, os.getenv("GEMINI_API_KEY"))
+        await asyncio.to_thread(app.state.pool.warm)
+        logger.info("🔌 Shared engine & client pool initialized.")
+    except Exception as e:
+        app.state.pool = None
+        logger.error(f"❌ Failed to initialize shared client pool: {e}")
+
+    job_queue.register("ingest", _run_ingest_job, on_abandoned=_remove_job_spool)
+    job_queue.register("audit", _run_audit_job)
+    await job_queue.start(redis_client if redis_ready else None)
+    session_registry.start(_reclaim_session, redis_client if redis_ready else None)
     
     yield
+    await session_registry.stop()
+    await job_queue.stop()
+    await asyncio.to_thread(trace_sink.close)
+    report_renderer.shutdown()
+    mark_worker_exited()
     await redis_client.close()
 
 app = FastAPI(title="Aegis-auditor", version="2.0", lifespan=lifespan)
 
+MAX_FILE_SIZE_MB = 10 
+MAX_UPLOAD_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Two PDFs per request at most, plus room for the multipart boundaries and part headers
+MAX_MULTIPART_BYTES = 2 * MAX_UPLOAD_BYTES + 64 * 1024
+PAYLOAD_TOO_LARGE = f"Payload Too Large. Maximum allowed file size is {MAX_FILE_SIZE_MB}MB."
+
+
+class MultipartSizeLimit:
+    """
+    Rejects multipart requests whose declared Content-Length is over the limit before the body
+    is received: FastAPI parses (and spools) every form part before the route runs, so the
+    per-file check in _spool_upload alone would only fire after the whole upload was taken in.
+    Chunked requests carry no Content-Length and are still bounded per file by _spool_upload.
+    """
+
+    def __init__(self, app, max_bytes=MAX_MULTIPART_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            headers = dict(scope["headers"])
+            if headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+                try:
+                    declared = int(headers.get(b"content-length", b"0"))
+                except ValueError:
+                    declared = 0
+                if declared > self.max_bytes:
+                    response = Response(
+                        json.dumps({"detail": PAYLOAD_TOO_LARGE}), status_code=413,
+                        media_type="application/json", headers={"Connection": "close"}
+                    )
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+
 ALLOWED_ORIGINS = [
     "http://localhost:3000", 
     "https://aegis-audit-acr.vercel.app", 
 ]
 
+# Added first so CORS stays outermost and browsers can read the 413
+app.add_middleware(MultipartSizeLimit)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Aegis-TTFT-Ms", "X-Aegis-Cache", "Server-Timing"],
 )
 
 class AuditRequest(BaseModel):
     session_id: str
+    mode: Literal["fanout", "single"] = DEFAULT_AUDIT_MODE
+
+class ExportRequest(BaseModel):
+    session_id: str = "general"
+    # A report the server produced and cached (the audit responses' report_ref), looked up
+    # instead of re-sending the JSON; report_data is still accepted for uncached reports
+    report_ref: Optional[str] = None
+    report_data: Optional[List[dict]] = None
+    mode: Literal["fanout", "single"] = DEFAULT_AUDIT_MODE
+    format: Literal["docx", "html", "jsonl"] = "docx"
 
 class LogoutRequest(BaseModel):
     session_id: str
@@ -72,7 +167,9 @@ class LogoutRequest(BaseModel):
 class ChatRequest(BaseModel):
     session_id: str
     query: str
-    history: List[str]
+    # Deprecated: document sessions keep their history server-side. Still read for general_chat
+    # (shared, so nothing is stored) and to seed sessions from older clients.
+    history: Optional[List[str]] = None
 
 # --- Health Check (For Render & UptimeRobot) ---
 @app.get("/")
@@ -80,146 +177,745 @@ async def health_check():
     """Provides a 200 OK status for UptimeRobot and Render health checks."""
     return {"status": "online", "service": "Aegis-Audit API", "version": "2.0"}
 
+@app.get("/api/v1/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the content-addressed parse and chunk-embedding caches (this worker)."""
+    return {"status": "success", "content_cache": content_cache.stats()}
+
+def _track_in_flight(stream, kind):
+    with IN_FLIGHT.labels(kind=kind).track_inprogress():
+        yield from stream
+
+
+def _collect_runtime_metrics():
+    """Folds the stats kept by the content cache, LLM scheduler and circuit breaker into /metrics."""
+    content = CounterMetricFamily(
+        "aegis_content_cache_requests", "Content-addressed parse/embedding cache lookups.", labels=["kind", "result"]
+    )
+    for kind, stats in content_cache.stats().items():
+        content.add_metric([kind, "hit"], stats["hits"])
+        content.add_metric([kind, "miss"], stats["misses"])
+
+    scheduler = llm_scheduler.stats()
+    queued = GaugeMetricFamily("aegis_llm_queue_depth", "LLM calls waiting for admission by priority.", labels=["priority"])
+    admitted = CounterMetricFamily("aegis_llm_admitted", "LLM calls admitted by the scheduler by priority.", labels=["priority"])
+    for priority, depth in scheduler["queued"].items():
+        queued.add_metric([priority], depth)
+        admitted.add_metric([priority], scheduler["admitted"][priority])
+    timeouts = CounterMetricFamily(
+        "aegis_llm_admission_timeouts", "LLM calls that timed out waiting for admission.", value=scheduler["timeouts"]
+    )
+    slots = GaugeMetricFamily("aegis_llm_slots_in_use", "Scheduler slots currently held by Gemini calls.", value=scheduler["in_flight"])
+
+    metrics = [content, queued, admitted, timeouts, slots]
+    pool = getattr(app.state, "pool", None)
+    if pool is not None:
+        metrics.append(GaugeMetricFamily(
+            "aegis_llm_circuit_open", "1 while the Gemini quota circuit breaker is failing fast.",
+            value=int(pool.engine.llm_breaker.state == "open")
+        ))
+    return metrics
+
+
+register_collector(_collect_runtime_metrics)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint (stage histograms, cache counters and gauges; all workers in multiprocess mode)."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/api/v1/llm/stats")
+async def llm_stats(engine: AegisEngine = Depends(get_engine)):
+    """Per-model attempt counts, retry/hedge totals, latency percentiles and circuit state (this worker)."""
+    return {"status": "success", "llm": engine.llm_stats()}
+
+def _remember_answer(stream, timings, on_complete):
+    """Passes chunks through and hands the full answer to on_complete once the stream finishes cleanly."""
+    chunks = []
+    for chunk in stream:
+        chunks.append(chunk)
+        yield chunk
+    if not timings.get("error"):
+        on_complete("".join(chunks))
+
+
+async def _load_history(request):
+    """Returns (recent verbatim turns, prompt-ready history block) for this chat request."""
+    if request.session_id == "general_chat":
+        turns = (request.history or [])[-chat_history.recent_turns:]
+        return turns, format_history("", turns)
+    state = await chat_history.load(request.session_id)
+    if not state["turns"] and request.history:
+        state["turns"] = request.history[-chat_history.recent_turns:]
+    return state["turns"], format_history(state["summary"], state["turns"])
+
+
+async def _record_exchange(engine, request, turns, query_vector, answer):
+    """After a clean answer: cache it (fresh answers only) and append the exchange to the session history."""
+    if query_vector is not None:
+        await semantic_cache.store(request.session_id, query_vector, request.query, turns, answer)
+    summarize = functools.partial(engine.summarize_history, session_id=request.session_id)
+    await chat_history.append(request.session_id, request.query, answer, summarize)
+
+
+async def _semantic_lookup(engine, request, turns):
+    """Returns (query vector, cached answer); (None, None) when the cache cannot be consulted."""
+    if request.session_id == "general_chat":
+        # Shared by every visitor without documents: never replay one user's answer to another
+        return None, None
+    try:
+        query_vector = await asyncio.to_thread(engine.embed_query, request.query)
+    except Exception as e:
+        logger.warning(f"⚠️ Query embedding failed, skipping semantic cache: {e}")
+        return None, None
+    return query_vector, await semantic_cache.lookup(request.session_id, query_vector, request.query, turns)
+
+
 @app.post("/api/v1/chat", dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def chat_with_docs(request: ChatRequest):
-    """Handles real-time streaming chat."""
+async def chat_with_docs(request: ChatRequest, engine: AegisEngine = Depends(get_engine)):
+    """
+    Handles real-time streaming chat. The first chunk is produced before the response starts so
+    time-to-first-token can be reported in the X-Aegis-TTFT-Ms and Server-Timing headers.
+    Repeat questions in a session are replayed from the semantic answer cache without an LLM call.
+    Document sessions keep their history server-side: recent turns verbatim, older ones summarised.
+    """
     try:
-        engine = AegisEngine(api_key=os.getenv("GEMINI_API_KEY"))
-        
+        started = time.perf_counter()
+        timings = {}
+        if request.session_id != "general_chat":
+            await session_registry.touch(request.session_id)
+        turns, history = await _load_history(request)
+        query_vector, cached_answer = await _semantic_lookup(engine, request, turns)
+        if cached_answer is not None:
+            stream = replay(cached_answer)
+        else:
+            stream = engine.run_query(
+                request.query, request.session_id, history, timings=timings, query_vector=query_vector
+            )
+        if request.session_id != "general_chat":
+            loop = asyncio.get_running_loop()
+            fresh_vector = query_vector if cached_answer is None else None
+            stream = _remember_answer(stream, timings, lambda answer: asyncio.run_coroutine_threadsafe(
+                _record_exchange(engine, request, turns, fresh_vector, answer), loop
+            ))
+        stream = _track_in_flight(stream, "chat")
+        first_chunk = await asyncio.to_thread(next, stream, None)
+        ttft_ms = (time.perf_counter() - started) * 1000
+        CHAT_TTFT_SECONDS.observe(ttft_ms / 1000)
+
+        server_timing = [f"ttft;dur={ttft_ms:.1f}"]
+        if "retrieval_ms" in timings:
+            server_timing.insert(0, f"retrieval;dur={timings['retrieval_ms']:.1f}")
         return StreamingResponse(
-            engine.run_query(request.query, request.session_id, request.history),
-            media_type="text/plain"
+            itertools.chain([] if first_chunk is None else [first_chunk], stream),
+            media_type="text/plain",
+            headers={
+                "X-Aegis-TTFT-Ms": f"{ttft_ms:.1f}",
+                "X-Aegis-Cache": "hit" if cached_answer is not None else "miss",
+                "Server-Timing": ", ".join(server_timing)
+            }
         )
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/v1/export")
-async def export_report(request: Request):
-    """Generates the .docx binary from the audit JSON."""
-    try:
-        data = await request.json()
-        session_id = data.get("session_id") or "general"
-        report_data = data.get("report_data")
-        
-        if not report_data:
-            raise ValueError("No report data provided from the frontend.")
+EXPORT_MEDIA_TYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "html": "text/html; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+}
 
-        metadata = {
-            "law_name": "Target Law Document",
-            "policy_name": "Internal Policy Document"
-        }
 
-        doc_buffer = generate_docx_report(report_data, metadata)
-        
-        return StreamingResponse(
-            doc_buffer,
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            headers={
-                "Content-Disposition": f"attachment; filename=Aegis_Audit_{session_id}.docx"
-            }
-        )
-            
+async def _resolve_export_report(request):
+    """Report to export: the posted JSON, else the cached report for report_ref or the session."""
+    if request.report_data:
+        return request.report_data
+    if REDIS_URL:
+        try:
+            combined_hash = request.report_ref or await redis_client.get(f"session_hash:{request.session_id}")
+            if combined_hash:
+                cached_report = await redis_client.get(_report_cache_key(combined_hash, request.mode))
+                if cached_report:
+                    return json.loads(cached_report)
+        except Exception as e:
+            logger.error(f"Redis read error on export: {e}")
+    raise HTTPException(status_code=404, detail="Report not found. Re-run the audit or send report_data.")
+
+
+@app.post("/api/v1/export")
+async def export_report(request: ExportRequest):
+    """
+    Exports an audit report as .docx (rendered off the event loop and cached by content),
+    or streams it as HTML or JSON lines.
+    """
+    report_data = await _resolve_export_report(request)
+    metadata = {
+        "law_name": "Target Law Document",
+        "policy_name": "Internal Policy Document"
+    }
+    headers = {"Content-Disposition": f"attachment; filename=Aegis_Audit_{request.session_id}.{request.format}"}
+    media_type = EXPORT_MEDIA_TYPES[request.format]
+
+    if request.format == "html":
+        return StreamingResponse(iter_html_report(report_data, metadata), media_type=media_type, headers=headers)
+    if request.format == "jsonl":
+        return StreamingResponse(iter_jsonl_report(report_data, metadata), media_type=media_type, headers=headers)
+    try:
+        document = await report_renderer.render_docx(report_data, metadata)
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Export crashed: {str(e)}")
+    return Response(document, media_type=media_type, headers=headers)
 
 
-@app.post("/api/v1/upload", dependencies=[Depends(RateLimiter(times=3, seconds=60))])
-async def upload_documents(
-    law_file: UploadFile = File(...), 
-    policy_file: UploadFile = File(...)
-):
-    """Ingests documents into Pinecone and generates a caching signature."""
+def _write_chunk(spool, chunk, *hashers):
+    for hasher in hashers:
+        hasher.update(chunk)
+    spool.write(chunk)
+
+
+async def _spool_upload(upload_file, combined_hasher, spool_dir=None):
+    """
+    Streams an UploadFile to a temp file in fixed-size chunks, updating its SHA-256 (and the
+    combined law+policy digest) incrementally and enforcing the size limit as bytes arrive.
+    Hashing and writes run in a worker thread so a large upload never stalls the event loop.
+    Returns (temp_path, sha256_hex, size_bytes); the caller owns the temp file.
+    """
+    # Starlette already knows the part's size once the form is parsed: refuse before copying it
+    if upload_file.size is not None and upload_file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=PAYLOAD_TOO_LARGE)
+
+    hasher = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(suffix=".pdf", dir=spool_dir)
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            while chunk := await upload_file.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=PAYLOAD_TOO_LARGE)
+                await asyncio.to_thread(_write_chunk, spool, chunk, hasher, combined_hasher)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, hasher.hexdigest(), size
+
+
+def _validate_pdf_uploads(law_file, policy_file):
     if not law_file.filename.endswith('.pdf') or not policy_file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
 
-    session_id = f"session_{uuid.uuid4().hex[:8]}"
-    
+
+async def _spool_pair(law_file, policy_file, spooled_paths, spool_dir=None):
+    """Spools law then policy, so the combined digest equals sha256(law_bytes + policy_bytes)."""
+    combined_hasher = hashlib.sha256()
+    law_path, law_hash, law_size = await _spool_upload(law_file, combined_hasher, spool_dir)
+    spooled_paths.append(law_path)
+    policy_path, policy_hash, policy_size = await _spool_upload(policy_file, combined_hasher, spool_dir)
+    spooled_paths.append(policy_path)
+    logger.info(f"Uploaded Law: {law_size / (1024*1024):.2f} MB | Policy: {policy_size / (1024*1024):.2f} MB")
+    return {
+        "law": {"path": law_path, "filename": law_file.filename, "hash": law_hash},
+        "policy": {"path": policy_path, "filename": policy_file.filename, "hash": policy_hash},
+        "combined_hash": combined_hasher.hexdigest()
+    }
+
+
+async def _store_session_hashes(session_id, law_hash, policy_hash, combined_hash):
+    if REDIS_URL:
+        try:
+            await redis_client.setex(f"session_hash:{session_id}", 86400, combined_hash)
+            await redis_client.setex(f"session_docs:{session_id}", 86400, json.dumps({"law_hash": law_hash, "policy_hash": policy_hash}))
+        except Exception as e:
+            logger.error(f"Redis write error on upload: {e}")
+
+
+async def _session_doc_hashes(session_id):
+    """Returns {"law_hash", "policy_hash"} for a session, or None when unknown (or Redis is down)."""
+    if not REDIS_URL:
+        return None
     try:
-        start_time = time.time()
-        
-        law_bytes = await law_file.read()
-        policy_bytes = await policy_file.read()
+        raw_hashes = await redis_client.get(f"session_docs:{session_id}")
+        return json.loads(raw_hashes) if raw_hashes else None
+    except Exception as e:
+        logger.error(f"Redis read error on audit: {e}")
+        return None
+
+
+async def _ingest_documents(pool, session_id, spooled, progress=None):
+    """Records the session's document hashes and ingests both spooled PDFs concurrently."""
+    start_time = time.time()
+    await session_registry.register(session_id)
+    await _store_session_hashes(session_id, spooled["law"]["hash"], spooled["policy"]["hash"], spooled["combined_hash"])
+
+    async def ingest(doc_type, doc):
+        ingestor = pool.ingestor(f"{session_id}_{doc_type}")
+        if progress:
+            await progress(doc_type, {"status": "running"})
+        await asyncio.to_thread(ingestor.process_file, doc["path"], doc["filename"], doc["hash"])
+        if progress:
+            await progress(doc_type, {"status": "done", "stages": ingestor.last_stage_stats})
+
+    with IN_FLIGHT.labels(kind="ingest").track_inprogress():
+        # Let both legs finish before raising: callers delete the spooled PDFs once this returns
+        results = await asyncio.gather(
+            ingest("LAW", spooled["law"]), ingest("POLICY", spooled["policy"]), return_exceptions=True
+        )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    logger.info(f"[{session_id}] Total Ingestion Time: {time.time() - start_time:.2f} seconds")
 
-        MAX_FILE_SIZE_MB = 10 
-        MAX_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
-        
-        if len(law_bytes) > MAX_BYTES or len(policy_bytes) > MAX_BYTES:
-            raise HTTPException(
-                status_code=413, 
-                detail=f"Payload Too Large. Maximum allowed file size is {MAX_FILE_SIZE_MB}MB."
-            )
 
-        logger.info(f"[{session_id}] Uploaded Law: {len(law_bytes) / (1024*1024):.2f} MB | Policy: {len(policy_bytes) / (1024*1024):.2f} MB")
+def _remove_spooled(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
 
-        combined_hash = hashlib.sha256(law_bytes + policy_bytes).hexdigest()
-        if REDIS_URL:
-            try:
-                await redis_client.setex(f"session_hash:{session_id}", 86400, combined_hash)
-            except Exception as e:
-                logger.error(f"Redis write error on upload: {e}")
 
-        law_ingestor = AegisIngestor(namespace_name=f"{session_id}_LAW", api_key=os.getenv("GEMINI_API_KEY"))
-        law_ingestor.process_pdf(law_bytes, law_file.filename)
-        
-        policy_ingestor = AegisIngestor(namespace_name=f"{session_id}_POLICY", api_key=os.getenv("GEMINI_API_KEY"))
-        policy_ingestor.process_pdf(policy_bytes, policy_file.filename)
-        
-        end_time = time.time()
-        logger.info(f"[{session_id}] Total Ingestion Time: {end_time - start_time:.2f} seconds")
+@app.post("/api/v1/upload", dependencies=[Depends(RateLimiter(times=3, seconds=60))])
+async def upload_documents(
+    law_file: UploadFile = File(...), 
+    policy_file: UploadFile = File(...),
+    pool: ResourcePool = Depends(get_pool)
+):
+    """Ingests documents into the vector store and generates a caching signature."""
+    _validate_pdf_uploads(law_file, policy_file)
+
+    session_id = f"session_{uuid.uuid4().hex[:8]}"
+    spooled_paths = []
+    
+    try:
+        spooled = await _spool_pair(law_file, policy_file, spooled_paths)
+        await _ingest_documents(pool, session_id, spooled)
         
         return {
             "status": "success", 
             "message": "Documents indexed successfully.",
             "session_id": session_id 
         }
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc() 
         raise HTTPException(status_code=500, detail=f"Ingestion failed: {str(e)}")
+    finally:
+        _remove_spooled(spooled_paths)
+
+
+def _report_cache_key(combined_hash, mode):
+    # Fan-out reports keep the original key so existing cache entries stay valid
+    return f"aegis_cache:{combined_hash}" if mode == "fanout" else f"aegis_cache:{combined_hash}:{mode}"
+
+
+async def _lookup_cached_report(session_id, mode="fanout"):
+    """Returns (combined_hash, cached_report) for a session; either may be None."""
+    combined_hash = None
+    if REDIS_URL:
+        try:
+            combined_hash = await redis_client.get(f"session_hash:{session_id}")
+            if combined_hash:
+                cached_report = await redis_client.get(_report_cache_key(combined_hash, mode))
+                record_cache_lookup("report", hits=int(bool(cached_report)), misses=int(not cached_report))
+                if cached_report:
+                    logger.info(f"⚡ [CACHE HIT] Bypassing LLM execution for session: {session_id}")
+                    return combined_hash, json.loads(cached_report)
+        except Exception as e:
+            logger.error(f"Redis read error on audit: {e}")
+    return combined_hash, None
+
+
+async def _cache_report(combined_hash, report, mode="fanout"):
+    """Returns the report_ref clients can export by, or None when the report was not cached."""
+    # A report with any ERROR pillar must not mask a retry for 7 days
+    if any(finding.get("rating") == "ERROR" for finding in report):
+        return None
+    if REDIS_URL and combined_hash:
+        try:
+            await redis_client.setex(_report_cache_key(combined_hash, mode), 604800, json.dumps(report))
+            return combined_hash
+        except Exception as e:
+            logger.error(f"Redis write error on audit: {e}")
+    return None
+
+
+async def _audit_findings(session_id, engine, mode="fanout"):
+    """
+    Yields findings for every pillar: cached ones first, then live LLM results
+    for only the pillars missing from the finding cache.
+    """
+    cached = {}
+    doc_hashes = await _session_doc_hashes(session_id)
+    if doc_hashes:
+        cached = await finding_cache.get_many(doc_hashes["law_hash"], doc_hashes["policy_hash"], AUDIT_PILLARS, mode)
+
+    for pillar in AUDIT_PILLARS:
+        if pillar in cached:
+            yield cached[pillar]
+
+    missing = [pillar for pillar in AUDIT_PILLARS if pillar not in cached]
+    if not missing:
+        return
+
+    logger.info(f"⚙️ [CACHE MISS] Running {len(missing)}/{len(AUDIT_PILLARS)} pillar LLM calls for: {session_id}")
+    in_flight = IN_FLIGHT.labels(kind="audit")
+    in_flight.inc()
+    try:
+        async for finding in engine.astream_compliance_audit(session_id, missing, mode):
+            if doc_hashes:
+                await finding_cache.put(doc_hashes["law_hash"], doc_hashes["policy_hash"], finding, mode)
+            yield finding
+    finally:
+        # Also runs on aclose(): consumers close this generator when a client disconnects mid-stream
+        in_flight.dec()
 
 
 @app.post("/api/v1/audit", dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-async def run_audit(request: AuditRequest):
+async def run_audit(request: AuditRequest, engine: AegisEngine = Depends(get_engine)):
     """Executes the Agentic 8-Pillar Gap Analysis with Redis Caching bypass."""
     try:
-        combined_hash = None
-        
-        if REDIS_URL:
-            try:
-                combined_hash = await redis_client.get(f"session_hash:{request.session_id}")
-                if combined_hash:
-                    cached_report = await redis_client.get(f"aegis_cache:{combined_hash}")
-                    if cached_report:
-                        logger.info(f"⚡ [CACHE HIT] Bypassing LLM execution for session: {request.session_id}")
-                        return {"status": "success", "report": json.loads(cached_report), "cached": True}
-            except Exception as e:
-                logger.error(f"Redis read error on audit: {e}")
+        await session_registry.touch(request.session_id)
+        combined_hash, cached_report = await _lookup_cached_report(request.session_id, request.mode)
+        if cached_report is not None:
+            return {"status": "success", "report": cached_report, "cached": True, "report_ref": combined_hash}
 
-        logger.info(f"⚙️ [CACHE MISS] Running full 8-pillar LLM execution for: {request.session_id}")
+        async with aclosing(_audit_findings(request.session_id, engine, request.mode)) as findings:
+            report = [finding async for finding in findings]
         
-        engine = AegisEngine(api_key=os.getenv("GEMINI_API_KEY"))
-        report = engine.run_compliance_audit(request.session_id)
+        report_ref = await _cache_report(combined_hash, report, request.mode)
+
+        return {"status": "success", "report": report, "cached": False, "report_ref": report_ref}
         
-        if REDIS_URL and combined_hash:
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Audit Crash: {str(e)}")
+
+
+@app.post("/api/v1/audit/stream", dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def stream_audit(request: AuditRequest, engine: AegisEngine = Depends(get_engine)):
+    """
+    NDJSON variant of /api/v1/audit: one {"type": "finding"} frame per pillar as soon as it
+    completes, then a {"type": "summary"} frame carrying the full report.
+    """
+    async def frames():
+        try:
+            await session_registry.touch(request.session_id)
+            combined_hash, cached_report = await _lookup_cached_report(request.session_id, request.mode)
+            if cached_report is not None:
+                for finding in cached_report:
+                    yield json.dumps({"type": "finding", "finding": finding}) + "\n"
+                yield json.dumps({"type": "summary", "status": "success", "report": cached_report, "cached": True, "report_ref": combined_hash}) + "\n"
+                return
+
+            report = []
+            async with aclosing(_audit_findings(request.session_id, engine, request.mode)) as findings:
+                async for finding in findings:
+                    report.append(finding)
+                    yield json.dumps({"type": "finding", "finding": finding}) + "\n"
+
+            report_ref = await _cache_report(combined_hash, report, request.mode)
+            yield json.dumps({"type": "summary", "status": "success", "report": report, "cached": False, "report_ref": report_ref}) + "\n"
+
+        except Exception as e:
+            traceback.print_exc()
+            yield json.dumps({"type": "error", "detail": f"Audit Crash: {str(e)}"}) + "\n"
+
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
+
+# --- Revised policy ---
+
+def _revised_combined_hash(law_hash, policy_hash):
+    # The law bytes are not re-sent with a revised policy, so derive the report key from both hashes
+    return hashlib.sha256(f"{law_hash}:{policy_hash}".encode("utf-8")).hexdigest()
+
+
+# Sessions with a policy revision in progress in this worker (Redis holds the cross-worker lock)
+_revisions_in_progress = set()
+REVISION_LOCK_TTL = 900
+
+
+@asynccontextmanager
+async def _revision_lock(session_id):
+    """One policy revision per session at a time, across workers; a concurrent one gets a 409."""
+    busy = HTTPException(status_code=409, detail="A policy revision for this session is already in progress.")
+    if session_id in _revisions_in_progress:
+        raise busy
+    key, token = f"aegis_revise_lock:{session_id}", uuid.uuid4().hex
+    locked = False
+    if REDIS_URL:
+        try:
+            locked = bool(await redis_client.set(key, token, nx=True, ex=REVISION_LOCK_TTL))
+            if not locked:
+                raise busy
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Redis error on revision lock, locking this worker only: {e}")
+    _revisions_in_progress.add(session_id)
+    try:
+        yield
+    finally:
+        _revisions_in_progress.discard(session_id)
+        if locked:
             try:
-                await redis_client.setex(f"aegis_cache:{combined_hash}", 604800, json.dumps(report))
+                if await redis_client.get(key) == token:
+                    await redis_client.delete(key)
             except Exception as e:
-                logger.error(f"Redis write error on audit: {e}")
+                logger.error(f"Redis error releasing revision lock: {e}")
+
+
+async def _reaudit_revised_policy(pool, session_id, policy, mode):
+    """
+    Swaps in a revised policy incrementally and re-audits only the pillars whose retrieved
+    context changed. Previous findings come from the finding cache under the old policy hash;
+    pillar contexts are fingerprinted before and after the swap (see apillar_context_fingerprints).
+    Returns (report, per-pillar delta, chunk diff, report_ref).
+    """
+    engine = pool.engine
+    doc_hashes = await _session_doc_hashes(session_id)
+    previous = {}
+    if doc_hashes:
+        previous = await finding_cache.get_many(doc_hashes["law_hash"], doc_hashes["policy_hash"], AUDIT_PILLARS, mode)
+    old_fingerprints = {}
+    if previous:
+        _, old_fingerprints = await engine.apillar_context_fingerprints(session_id, list(previous))
+
+    ingestor = pool.ingestor(f"{session_id}_POLICY")
+    with IN_FLIGHT.labels(kind="ingest").track_inprogress():
+        await asyncio.to_thread(ingestor.process_file, policy["path"], policy["filename"], policy["hash"], True)
+        # Eventually consistent indexes (Pinecone) may still answer with the old chunks for a while
+        visible = await asyncio.to_thread(
+            pool.vector_backend.wait_until_visible, f"{session_id}_POLICY",
+            ingestor.last_written["upserted"], ingestor.last_written["deleted"]
+        )
+    await semantic_cache.invalidate(session_id)
 
-        return {"status": "success", "report": report, "cached": False}
-        
+    retrieved, fingerprints = await engine.apillar_context_fingerprints(session_id)
+    if visible:
+        changed = [p for p in AUDIT_PILLARS if p not in previous or fingerprints[p] != old_fingerprints.get(p)]
+    else:
+        # Fingerprints may describe the old policy: re-run everything rather than reuse stale findings
+        logger.warning(f"⚠️ [{session_id}] Revised policy not yet visible in the vector index; re-running all pillars")
+        changed = list(AUDIT_PILLARS)
+    findings = {pillar: previous[pillar] for pillar in AUDIT_PILLARS if pillar not in changed}
+    logger.info(f"♻️ [{session_id}] Revised policy: re-running {len(changed)}/{len(AUDIT_PILLARS)} pillars")
+    if changed:
+        with IN_FLIGHT.labels(kind="audit").track_inprogress():
+            async for finding in engine.astream_compliance_audit(session_id, changed, mode, retrieved=retrieved):
+                findings[finding["pillar"]] = finding
+    report = [findings[pillar] for pillar in AUDIT_PILLARS]
+
+    if doc_hashes:
+        law_hash = doc_hashes["law_hash"]
+        combined_hash = _revised_combined_hash(law_hash, policy["hash"])
+        await _store_session_hashes(session_id, law_hash, policy["hash"], combined_hash)
+        for finding in report:
+            await finding_cache.put(law_hash, policy["hash"], finding, mode)
+        report_ref = await _cache_report(combined_hash, report, mode)
+    else:
+        report_ref = None
+
+    delta = {}
+    for pillar in AUDIT_PILLARS:
+        before = previous.get(pillar, {}).get("rating")
+        delta[pillar] = {
+            "status": "reused" if pillar not in changed else "rerun" if before else "new",
+            "previous_rating": before,
+            "rating": findings[pillar].get("rating"),
+            "rating_changed": before is not None and before != findings[pillar].get("rating"),
+        }
+    return report, delta, ingestor.last_diff, report_ref
+
+
+@app.post("/api/v1/sessions/{session_id}/policy", dependencies=[Depends(RateLimiter(times=3, seconds=60))])
+async def upload_revised_policy(
+    session_id: str,
+    policy_file: UploadFile = File(...),
+    mode: Literal["fanout", "single"] = DEFAULT_AUDIT_MODE,
+    pool: ResourcePool = Depends(get_pool)
+):
+    """
+    Replaces an existing session's policy with a revised version: only added chunks are embedded,
+    removed chunks are deleted, and only pillars whose evidence changed go back to the LLM.
+    """
+    if not policy_file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported.")
+    if await asyncio.to_thread(sparse_index_store.load, f"{session_id}_POLICY") is None:
+        raise HTTPException(status_code=404, detail="Session not found. Upload both documents first.")
+
+    await session_registry.touch(session_id)
+    spooled_paths = []
+    try:
+        policy_path, policy_hash, _ = await _spool_upload(policy_file, hashlib.sha256())
+        spooled_paths.append(policy_path)
+        policy = {"path": policy_path, "filename": policy_file.filename, "hash": policy_hash}
+        async with _revision_lock(session_id):
+            report, delta, chunk_diff, report_ref = await _reaudit_revised_policy(pool, session_id, policy, mode)
+        return {
+            "status": "success", "session_id": session_id, "policy_chunks": chunk_diff,
+            "report": report, "delta": delta, "report_ref": report_ref
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Audit Crash: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Policy revision failed: {str(e)}")
+    finally:
+        _remove_spooled(spooled_paths)
+
+
+# --- Background jobs ---
+
+def _remove_job_spool(params):
+    _remove_spooled([params["spooled"]["law"]["path"], params["spooled"]["policy"]["path"]])
+
+
+async def _run_ingest_job(params, progress):
+    pool = app.state.pool
+    if pool is None:
+        raise RuntimeError("Audit engine is unavailable. Check server configuration.")
+    try:
+        if params.get("after"):
+            # Identical upload already in flight: ingest once it finishes, from the parse/embedding caches
+            await progress("waiting_for", params["after"])
+            await job_queue.wait(params["after"])
+        await _ingest_documents(pool, params["session_id"], params["spooled"], progress)
+    finally:
+        _remove_job_spool(params)
+    return {"session_id": params["session_id"]}
+
+
+async def _run_audit_job(params, progress):
+    pool = app.state.pool
+    if pool is None:
+        raise RuntimeError("Audit engine is unavailable. Check server configuration.")
+    session_id, mode = params["session_id"], params["mode"]
+    await session_registry.touch(session_id)
+
+    combined_hash, cached_report = await _lookup_cached_report(session_id, mode)
+    if cached_report is not None:
+        for finding in cached_report:
+            await progress(finding.get("pillar", "?"), finding.get("rating", "done"))
+        return {"report": cached_report, "cached": True, "report_ref": combined_hash}
+
+    for pillar in AUDIT_PILLARS:
+        await progress(pillar, "pending")
+    report = []
+    async with aclosing(_audit_findings(session_id, pool.engine, mode)) as findings:
+        async for finding in findings:
+            report.append(finding)
+            await progress(finding["pillar"], finding.get("rating", "done"))
+
+    report_ref = await _cache_report(combined_hash, report, mode)
+    return {"report": report, "cached": False, "report_ref": report_ref}
+
+
+@app.post("/api/v1/jobs/upload", status_code=202, dependencies=[Depends(RateLimiter(times=3, seconds=60))])
+async def submit_upload_job(
+    law_file: UploadFile = File(...),
+    policy_file: UploadFile = File(...),
+    pool: ResourcePool = Depends(get_pool)
+):
+    """
+    Spools both PDFs and queues their ingestion; poll /api/v1/jobs/{job_id} for progress.
+    While the same pair is already being ingested, this upload still gets its own session (so
+    one user's logout or idle sweep never wipes another's), ingested after the first job
+    from the parse and embedding caches.
+    """
+    _validate_pdf_uploads(law_file, policy_file)
+    spooled_paths = []
+    try:
+        spooled = await _spool_pair(law_file, policy_file, spooled_paths, spool_dir=JOB_SPOOL_DIR)
+        params = {"session_id": f"session_{uuid.uuid4().hex[:8]}", "spooled": spooled}
+        record, coalesced = await job_queue.submit("ingest", params, dedupe_key=f"ingest:{spooled['combined_hash']}")
+        if coalesced:
+            record, _ = await job_queue.submit("ingest", {**params, "after": record["job_id"]})
+    except BaseException:
+        _remove_spooled(spooled_paths)
+        raise
+    return {"status": "accepted", "coalesced": coalesced, **public_view(record)}
+
+
+@app.post("/api/v1/jobs/audit", status_code=202, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def submit_audit_job(request: AuditRequest, pool: ResourcePool = Depends(get_pool)):
+    """Queues the 8-pillar audit; an identical in-flight audit of the same session (documents and mode) is coalesced."""
+    combined_hash = None
+    if REDIS_URL:
+        try:
+            combined_hash = await redis_client.get(f"session_hash:{request.session_id}")
+        except Exception as e:
+            logger.error(f"Redis read error on audit submit: {e}")
+    params = {"session_id": request.session_id, "mode": request.mode}
+    record, coalesced = await job_queue.submit(
+        "audit", params, dedupe_key=audit_dedupe_key(request.session_id, combined_hash, request.mode)
+    )
+    return {"status": "accepted", "coalesced": coalesced, **public_view(record)}
+
+
+@app.get("/api/v1/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Job state plus per-stage (ingest) or per-pillar (audit) progress."""
+    record = await job_queue.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    view = public_view(record)
+    view.pop("result", None)
+    return view
+
+
+@app.get("/api/v1/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    record = await job_queue.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    if record["status"] not in TERMINAL_STATES:
+        raise HTTPException(status_code=409, detail=f"Job is still {record['status']}.")
+    if record["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Job failed: {record['error']}")
+    return {"status": "success", "job_id": job_id, **record["result"]}
+
+
+async def _reclaim_session(session_id):
+    """
+    Idle-session sweeper callback: deletes both namespaces (vectors and sparse index), the
+    semantic cache, chat history and session keys. Returns the number of vectors deleted;
+    raises when a namespace could not be deleted so the sweeper retries it.
+    """
+    pool = app.state.pool
+    if pool is None:
+        raise RuntimeError("Audit engine is unavailable. Check server configuration.")
+    reclaimed = 0
+    for doc_type in ("LAW", "POLICY"):
+        namespace = f"{session_id}_{doc_type}"
+        try:
+            vectors = await asyncio.to_thread(pool.vector_backend.count, namespace)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not count vectors in {namespace}: {e}")
+            vectors = 0
+        if not await asyncio.to_thread(pool.ingestor(namespace).scrub_session_data):
+            raise RuntimeError(f"Failed to delete namespace {namespace}")
+        reclaimed += vectors
+    await semantic_cache.invalidate(session_id)
+    await chat_history.clear(session_id)
+    if REDIS_URL:
+        try:
+            await redis_client.delete(f"session_hash:{session_id}", f"session_docs:{session_id}")
+        except Exception as e:
+            logger.error(f"Redis delete error on session cleanup: {e}")
+    return reclaimed
 
 
 @app.post("/api/v1/logout")
-async def logout(request: LogoutRequest, background_tasks: BackgroundTasks):
-    """Wipes user data from Pinecone instantly."""
-    law_ingestor = AegisIngestor(namespace_name=f"{request.session_id}_LAW", api_key=os.getenv("GEMINI_API_KEY"))
-    policy_ingestor = AegisIngestor(namespace_name=f"{request.session_id}_POLICY", api_key=os.getenv("GEMINI_API_KEY"))
+async def logout(request: LogoutRequest, background_tasks: BackgroundTasks, pool: ResourcePool = Depends(get_pool)):
+    """Wipes user data from the vector store instantly."""
+    await session_registry.forget(request.session_id)
+    await semantic_cache.invalidate(request.session_id)
+    await chat_history.clear(request.session_id)
+    law_ingestor = pool.ingestor(f"{request.session_id}_LAW")
+    policy_ingestor = pool.ingestor(f"{request.session_id}_POLICY")
 
     background_tasks.add_task(law_ingestor.scrub_session_data)
     background_tasks.add_task(policy_ingestor.scrub_session_data)
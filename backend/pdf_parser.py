@@ -0,0 +1,123 @@
+import os
+import re
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from llama_parse import LlamaParse
+
+PDF_PARSER_BACKEND = os.getenv("PDF_PARSER_BACKEND", "llamaparse").lower()
+LOCAL_PARSER_WORKERS = int(os.getenv("LOCAL_PARSER_WORKERS", str(os.cpu_count() or 2)))
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+
+# Pages with fewer extractable characters than this are treated as scanned images
+MIN_TEXT_LAYER_CHARS = 25
+
+_HEADING_RE = re.compile(r"^(?:(?i:section|article|chapter|part|schedule|clause)\s+[\w.()-]+.*|\d+(?:\.\d+)*\.?\s+[A-Z].*|[A-Z][A-Z0-9 ,;:&()'-]{3,})$")
+
+
+def _to_markdown(text):
+    """
+    Reflows pdftotext/tesseract output into the markdown-ish text LlamaParse produces:
+    de-hyphenated, one paragraph per block separated by blank lines, short heading-like
+    lines promoted to `##` headings.
+    """
+    text = text.replace("\f", "\n").replace("\r", "")
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+
+    blocks = []
+    for block in re.split(r"\n\s*\n", text):
+        lines = [line.strip() for line in block.split("\n") if line.strip()]
+        if not lines:
+            continue
+        if len(lines) == 1 and len(lines[0]) <= 90 and _HEADING_RE.match(lines[0]) and not lines[0].endswith("."):
+            blocks.append(f"## {lines[0]}")
+        else:
+            blocks.append(" ".join(lines))
+    return "\n\n".join(blocks)
+
+
+def _page_count(file_path):
+    info = subprocess.run(["pdfinfo", file_path], capture_output=True, text=True, check=True).stdout
+    match = re.search(r"^Pages:\s+(\d+)", info, re.MULTILINE)
+    return int(match.group(1)) if match else 0
+
+
+def _ocr_page(file_path, page_no):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        prefix = os.path.join(tmp_dir, "page")
+        subprocess.run(
+            ["pdftoppm", "-r", str(OCR_DPI), "-f", str(page_no), "-l", str(page_no), "-singlefile", "-png", file_path, prefix],
+            capture_output=True, check=True
+        )
+        return subprocess.run(
+            ["tesseract", f"{prefix}.png", "stdout", "-l", OCR_LANGUAGE],
+            capture_output=True, text=True, check=True
+        ).stdout
+
+
+def _extract_page(args):
+    """Worker: text layer via pdftotext, falling back to OCR only when the page has none."""
+    file_path, page_no = args
+    text = subprocess.run(
+        ["pdftotext", "-f", str(page_no), "-l", str(page_no), "-enc", "UTF-8", file_path, "-"],
+        capture_output=True, text=True, check=True
+    ).stdout
+    used_ocr = False
+    if len(text.strip()) < MIN_TEXT_LAYER_CHARS:
+        text = _ocr_page(file_path, page_no)
+        used_ocr = True
+    return _to_markdown(text), used_ocr
+
+
+class LocalPDFParser:
+    """
+    Offline parser built on poppler-utils and tesseract-ocr (see packages.txt).
+    Pages are extracted in a shared process pool and yielded in page order as they finish.
+    """
+
+    cache_name = "local-poppler-markdown"
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    def __init__(self, workers=LOCAL_PARSER_WORKERS):
+        self.workers = workers
+        missing = [tool for tool in ("pdfinfo", "pdftotext", "pdftoppm", "tesseract") if not shutil.which(tool)]
+        if missing:
+            raise RuntimeError(f"Local PDF parser needs {', '.join(missing)} on PATH (install packages.txt).")
+
+    def _pool(self):
+        with LocalPDFParser._executor_lock:
+            if LocalPDFParser._executor is None:
+                # forkserver: safe to start from a threaded uvicorn worker, cheap per task
+                LocalPDFParser._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver")
+                )
+            return LocalPDFParser._executor
+
+    def iter_pages(self, file_path):
+        page_total = _page_count(file_path)
+        ocr_pages = 0
+        for text, used_ocr in self._pool().map(_extract_page, [(file_path, n) for n in range(1, page_total + 1)]):
+            ocr_pages += used_ocr
+            yield text
+        print(f"📄 Local parse: {page_total} pages ({ocr_pages} via OCR) from {os.path.basename(file_path)}")
+
+
+def create_pdf_parser(backend=PDF_PARSER_BACKEND):
+    """Selects the PDF parser for this deployment via PDF_PARSER_BACKEND (llamaparse | local)."""
+    if backend == "local":
+        return LocalPDFParser()
+    if backend == "llamaparse":
+        return LlamaParse(
+            api_key=os.getenv("LLAMA_CLOUD_API_KEY"),
+            result_type="markdown",
+            num_workers=True,
+            verbose=True
+        )
+    raise ValueError(f"Unknown PDF_PARSER_BACKEND '{backend}'. Expected 'llamaparse' or 'local'.")
@@ -0,0 +1,74 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+import multiprocessing
+import concurrent.futures
+
+from backend.content_cache import content_cache
+from backend.report_gen import render_docx
+from backend.telemetry import record_cache_lookup, timed
+
+REPORT_RENDER_WORKERS = int(os.getenv("REPORT_RENDER_WORKERS", "2"))
+# Bump when the rendered layout changes so stale documents are not served from the cache
+REPORT_RENDER_VERSION = "1"
+
+
+def report_digest(report, metadata, fmt="docx"):
+    canonical = json.dumps({"report": report, "metadata": metadata}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{fmt}:{REPORT_RENDER_VERSION}:{canonical}".encode("utf-8")).hexdigest()
+
+
+class ReportRenderer:
+    """
+    Renders .docx reports in a process pool (python-docx is CPU-bound and holds the GIL) and
+    keeps the bytes in the content cache, keyed by a digest of the report JSON and metadata.
+    Concurrent exports of the same report share one render.
+    """
+
+    def __init__(self, workers=REPORT_RENDER_WORKERS, cache=content_cache):
+        self.workers = workers
+        self.cache = cache
+        self._pool = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that already runs threads (uvicorn, job workers) is unsafe
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    async def render_docx(self, report, metadata):
+        key = report_digest(report, metadata)
+        cached = await asyncio.to_thread(self.cache.get, "report", key)
+        record_cache_lookup("report_render", hits=int(cached is not None), misses=int(cached is None))
+        if cached is not None:
+            return cached
+
+        pending = self._in_flight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._render(key, report, metadata))
+            self._in_flight[key] = pending
+            pending.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _render(self, key, report, metadata):
+        loop = asyncio.get_running_loop()
+        with timed("report_render", format="docx"):
+            data = await loop.run_in_executor(self._executor(), render_docx, report, metadata)
+        await asyncio.to_thread(self.cache.put, "report", key, data)
+        return data
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+report_renderer = ReportRenderer()
@@ -2,6 +2,8 @@ from docx import Document
 from docx.shared import RGBColor, Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 import io
+import html
+import json
 
 def generate_docx_report(audit_results, metadata):
     doc = Document()
@@ -49,4 +51,47 @@ def generate_docx_report(audit_results, metadata):
     buffer = io.BytesIO()
     doc.save(buffer)
     buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return buffer
+
+
+def render_docx(audit_results, metadata):
+    """Bytes of the .docx report; a top-level function so it can run in a worker process."""
+    return generate_docx_report(audit_results, metadata).getvalue()
+
+
+_RATING_COLOURS = {"Critical": "#d32f2f", "High": "#d32f2f", "Medium": "#f57c00"}
+
+
+def _esc(value):
+    return html.escape(str(value))
+
+
+def iter_html_report(audit_results, metadata):
+    """Streams a self-contained HTML report one pillar at a time (no in-memory document)."""
+    yield (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Aegis-Audit Report</title>"
+        "<style>body{font-family:sans-serif;max-width:860px;margin:2em auto;line-height:1.5}"
+        ".meta{font-size:.85em;font-style:italic;color:#555}</style></head><body>"
+        "<h1>Aegis-Audit: Legal Verification Report</h1><h2>1. Executive Summary</h2>"
+        f"<p><b>Reference Law:</b> {_esc(metadata.get('law_name', 'N/A'))}<br>"
+        f"<b>Internal Policy:</b> {_esc(metadata.get('policy_name', 'N/A'))}</p>"
+        "<h2>2. Detailed Findings &amp; Remediation</h2>"
+    )
+    for item in audit_results:
+        rating = item.get('rating', 'Low')
+        colour = _RATING_COLOURS.get(rating, "inherit")
+        yield (
+            f"<section><h3>{_esc(item.get('pillar', 'General Pillar'))}</h3>"
+            f"<p><b style='color:{colour}'>RISK LEVEL: {_esc(rating)}</b></p>"
+            f"<p><b>Finding:</b> {_esc(item.get('finding', 'No specific finding recorded.'))}</p>"
+            f"<p class='meta'>Source: {_esc(item.get('citation', 'Not cited'))} | AI Confidence: {_esc(item.get('confidence', 'N/A'))}</p>"
+            f"<h4>Remediation Plan:</h4><p>{_esc(item.get('remediation', 'No remediation required.'))}</p></section>"
+        )
+    yield "</body></html>\n"
+
+
+def iter_jsonl_report(audit_results, metadata):
+    """Streams the report as JSON lines: one metadata line, then one line per finding."""
+    yield json.dumps({"type": "metadata", **metadata}) + "\n"
+    for item in audit_results:
+        yield json.dumps({"type": "finding", **item}) + "\n"
@@ -0,0 +1,63 @@
+import os
+
+from fastapi import HTTPException, Request
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from backend.engine import AegisEngine, EMBEDDING_MODEL_NAME
+from backend.ingestion import AegisIngestor
+from backend.pdf_parser import create_pdf_parser
+from backend.vector_store import create_vector_backend
+
+
+class ResourcePool:
+    """
+    Process-wide, thread-safe set of long-lived clients (engine, embeddings, vector backend,
+    PDF parser, splitter). Built once in the FastAPI lifespan so connection setup and
+    TLS handshakes are paid per process instead of per request.
+    """
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+
+        self.embeddings = GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL_NAME,
+            google_api_key=self.api_key
+        )
+        self.vector_backend = create_vector_backend(self.embeddings)
+
+        self.parser = create_pdf_parser()
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+
+        self.engine = AegisEngine(
+            api_key=self.api_key,
+            embeddings=self.embeddings,
+            vector_backend=self.vector_backend
+        )
+
+    def ingestor(self, namespace):
+        """Lightweight AegisIngestor bound to the shared clients."""
+        return AegisIngestor(
+            namespace_name=namespace,
+            api_key=self.api_key,
+            embeddings=self.embeddings,
+            vector_backend=self.vector_backend,
+            parser=self.parser,
+            splitter=self.splitter
+        )
+
+    def warm(self):
+        """Opens the vector backend's connections and embeds the pillar queries up front so the first request doesn't pay for it."""
+        self.vector_backend.warm()
+        self.engine.embed_pillar_queries()
+
+
+def get_pool(request: Request) -> ResourcePool:
+    pool = getattr(request.app.state, "pool", None)
+    if pool is None:
+        raise HTTPException(status_code=503, detail="Service is still starting or failed to initialize its clients.")
+    return pool
+
+
+def get_engine(request: Request) -> AegisEngine:
+    return get_pool(request).engine
@@ -0,0 +1,126 @@
+import os
+import re
+import json
+import time
+import base64
+import hashlib
+import logging
+
+import numpy as np
+
+from backend.telemetry import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "64"))
+# History turns that make up the fingerprint of a follow-up question
+FOLLOW_UP_HISTORY_TURNS = 2
+REPLAY_CHUNK_CHARS = 64
+
+# Questions that lean on the previous turns ("what about it?", "and the notice period?")
+_FOLLOW_UP_RE = re.compile(
+    r"^\s*(and|also|but|so|then|what about|how about|why|explain|elaborate|more|continue|same)\b"
+    r"|\b(it|its|this|that|these|those|they|them|their|above|previous|earlier|again)\b",
+    re.IGNORECASE
+)
+
+
+def is_follow_up(query):
+    return bool(_FOLLOW_UP_RE.search(query))
+
+
+def history_fingerprint(query, history):
+    """Only follow-up questions depend on the conversation; standalone ones match across it."""
+    if not history or not is_follow_up(query):
+        return ""
+    recent = json.dumps(list(history)[-FOLLOW_UP_HISTORY_TURNS:])
+    return hashlib.sha256(recent.encode("utf-8")).hexdigest()[:16]
+
+
+def replay(answer, chunk_chars=REPLAY_CHUNK_CHARS):
+    """Re-streams a cached answer in small chunks so clients see the same streaming shape."""
+    for i in range(0, len(answer), chunk_chars):
+        yield answer[i:i + chunk_chars]
+
+
+class SemanticAnswerCache:
+    """
+    Per-session cache of chat answers keyed by query embedding. A lookup hits when a stored
+    question in the same session has cosine similarity >= threshold and the same history
+    fingerprint (see history_fingerprint). Entries live in one Redis list per session
+    (newest first, capped, expiring with the session TTL); without Redis an in-process dict is used.
+    """
+
+    def __init__(self, redis_client=None, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL,
+                 max_entries=SEMANTIC_CACHE_MAX_ENTRIES):
+        self.redis = redis_client
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = {}
+
+    def _key(self, session_id):
+        return f"aegis_semcache:{session_id}"
+
+    async def _entries(self, session_id):
+        if self.redis is not None:
+            try:
+                return [json.loads(raw) for raw in await self.redis.lrange(self._key(session_id), 0, -1)]
+            except Exception as e:
+                logger.error(f"Redis read error on semantic cache: {e}")
+                return []
+        return list(self._local.get(session_id, []))
+
+    async def lookup(self, session_id, query_vector, query, history):
+        """Returns the cached answer for a semantically equivalent question, or None."""
+        fingerprint = history_fingerprint(query, history)
+        now = time.time()
+        entries = [
+            entry for entry in await self._entries(session_id)
+            if entry["history"] == fingerprint and now - entry["created"] <= self.ttl
+        ]
+        if not entries:
+            record_cache_lookup("semantic_answer", hits=0, misses=1)
+            return None
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        matrix = np.stack([np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float32) for entry in entries])
+        scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0) + 1e-12)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            record_cache_lookup("semantic_answer", hits=0, misses=1)
+            return None
+        record_cache_lookup("semantic_answer", hits=1)
+        logger.info(f"⚡ [SEMANTIC HIT] {session_id}: {scores[best]:.3f} vs '{entries[best]['query'][:60]}'")
+        return entries[best]["answer"]
+
+    async def store(self, session_id, query_vector, query, history, answer):
+        entry = {
+            "vector": base64.b64encode(np.asarray(query_vector, dtype=np.float32).tobytes()).decode("ascii"),
+            "query": query,
+            "history": history_fingerprint(query, history),
+            "answer": answer,
+            "created": time.time(),
+        }
+        if self.redis is not None:
+            key = self._key(session_id)
+            try:
+                await self.redis.lpush(key, json.dumps(entry))
+                await self.redis.ltrim(key, 0, self.max_entries - 1)
+                await self.redis.expire(key, self.ttl)
+            except Exception as e:
+                logger.error(f"Redis write error on semantic cache: {e}")
+            return
+        entries = self._local.setdefault(session_id, [])
+        entries.insert(0, entry)
+        del entries[self.max_entries:]
+
+    async def invalidate(self, session_id):
+        self._local.pop(session_id, None)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._key(session_id))
+            except Exception as e:
+                logger.error(f"Redis delete error on semantic cache: {e}")
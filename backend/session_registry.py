@@ -0,0 +1,188 @@
+import os
+import time
+import asyncio
+import traceback
+
+from prometheus_client import Counter
+
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", "86400"))
+SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", "900"))
+SESSION_SWEEP_BATCH = int(os.getenv("SESSION_SWEEP_BATCH", "100"))
+SESSION_DELETE_CONCURRENCY = int(os.getenv("SESSION_DELETE_CONCURRENCY", "4"))
+SESSION_DELETE_ATTEMPTS = int(os.getenv("SESSION_DELETE_ATTEMPTS", "3"))
+# Without Redis each worker only sees the sessions it served itself and would reclaim sessions
+# active on its siblings, so the sweeper stays off unless this is a single-worker deployment
+SESSION_SWEEP_WITHOUT_REDIS = os.getenv("SESSION_SWEEP_WITHOUT_REDIS", "false").lower() == "true"
+
+SESSION_REGISTRY_KEY = "aegis_sessions"
+SWEEP_LOCK_KEY = "aegis_sessions:sweep_lock"
+
+# Removes a session only if it is still idle, so a touch that lands mid-sweep keeps it alive.
+# Returns the removed score (to restore it if the delete fails), or nil if it was touched or forgotten.
+CLAIM_IDLE_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) <= tonumber(ARGV[2]) then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    return score
+end
+return false
+"""
+
+SESSIONS_RECLAIMED = Counter("aegis_sessions_reclaimed", "Idle sessions deleted by the sweeper.")
+VECTORS_RECLAIMED = Counter("aegis_vectors_reclaimed", "Vectors deleted with idle sessions.")
+RECLAIM_FAILURES = Counter("aegis_session_reclaim_failures", "Idle sessions whose delete failed after every retry.")
+
+
+class SessionRegistry:
+    """
+    Last-access time per session (a Redis sorted set, or a dict without Redis). Upload registers
+    a session; chat, audit and policy revision refresh it, but never re-register an unknown or
+    logged-out ID. A background sweeper deletes sessions idle for longer than
+    SESSION_IDLE_TTL through a caller-supplied `async reclaim(session_id) -> vectors deleted`,
+    at most SESSION_DELETE_CONCURRENCY at a time, retrying failures with backoff. A session
+    whose delete keeps failing stays registered and is retried on the next sweep. Each session is
+    claimed (removed only if still idle) right before its delete, so one touched mid-sweep is skipped.
+    With several workers, a Redis lock lets only one of them sweep per interval.
+    """
+
+    def __init__(self, idle_ttl=SESSION_IDLE_TTL, interval=SESSION_SWEEP_INTERVAL, batch=SESSION_SWEEP_BATCH,
+                 concurrency=SESSION_DELETE_CONCURRENCY, attempts=SESSION_DELETE_ATTEMPTS):
+        self.idle_ttl = idle_ttl
+        self.interval = interval
+        self.batch = batch
+        self.concurrency = concurrency
+        self.attempts = attempts
+        self.redis = None
+        self._local = {}
+        self._task = None
+
+    async def register(self, session_id):
+        """Starts tracking a session whose documents were just ingested."""
+        await self._write(session_id, xx=False)
+
+    async def touch(self, session_id):
+        """Refreshes the last-access time of a registered session; unknown IDs are ignored."""
+        await self._write(session_id, xx=True)
+
+    async def _write(self, session_id, xx):
+        now = time.time()
+        if self.redis is None:
+            if not xx or session_id in self._local:
+                self._local[session_id] = now
+            return
+        try:
+            await self.redis.zadd(SESSION_REGISTRY_KEY, {session_id: now}, xx=xx)
+        except Exception as e:
+            print(f"⚠️ Session registry write failed for {session_id}: {e}")
+
+    async def forget(self, session_id):
+        self._local.pop(session_id, None)
+        if self.redis is not None:
+            try:
+                await self.redis.zrem(SESSION_REGISTRY_KEY, session_id)
+            except Exception as e:
+                print(f"⚠️ Session registry delete failed for {session_id}: {e}")
+
+    async def _expired(self, cutoff):
+        if self.redis is not None:
+            return await self.redis.zrangebyscore(SESSION_REGISTRY_KEY, 0, cutoff, start=0, num=self.batch)
+        return sorted((s for s, seen in self._local.items() if seen <= cutoff), key=self._local.get)[:self.batch]
+
+    async def _claim_idle(self, session_id, cutoff):
+        """Unregisters `session_id` if it is still idle; returns its last-access time or None."""
+        if self.redis is None:
+            seen = self._local.get(session_id)
+            if seen is None or seen > cutoff:
+                return None
+            return self._local.pop(session_id)
+        try:
+            score = await self.redis.eval(CLAIM_IDLE_SCRIPT, 1, SESSION_REGISTRY_KEY, session_id, cutoff)
+        except Exception as e:
+            print(f"⚠️ Session registry claim failed for {session_id}: {e}")
+            return None
+        return float(score) if score is not None else None
+
+    async def _restore(self, session_id, seen):
+        """Re-registers a session whose delete failed, unless it was touched in the meantime."""
+        if self.redis is None:
+            self._local.setdefault(session_id, seen)
+            return
+        try:
+            await self.redis.zadd(SESSION_REGISTRY_KEY, {session_id: seen}, nx=True)
+        except Exception as e:
+            print(f"⚠️ Session registry write failed for {session_id}: {e}")
+
+    async def _claim_sweep(self):
+        if self.redis is None:
+            return True
+        try:
+            return bool(await self.redis.set(SWEEP_LOCK_KEY, str(os.getpid()), nx=True, ex=self.interval))
+        except Exception as e:
+            print(f"⚠️ Session sweep lock failed: {e}")
+            return False
+
+    async def _reclaim_with_retry(self, reclaim, session_id):
+        for attempt in range(1, self.attempts + 1):
+            try:
+                return await reclaim(session_id)
+            except Exception as e:
+                if attempt == self.attempts:
+                    print(f"❌ Reclaiming {session_id} failed after {attempt} attempts: {e}")
+                    raise
+                await asyncio.sleep(2 ** attempt)
+
+    async def sweep(self, reclaim, now=None):
+        """Deletes up to one batch of idle sessions; returns {"sessions", "vectors", "failed"}."""
+        cutoff = (now or time.time()) - self.idle_ttl
+        expired = await self._expired(cutoff)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        totals = {"sessions": 0, "vectors": 0, "failed": 0}
+
+        async def one(session_id):
+            async with semaphore:
+                seen = await self._claim_idle(session_id, cutoff)
+                if seen is None:
+                    return
+                try:
+                    vectors = await self._reclaim_with_retry(reclaim, session_id)
+                except Exception:
+                    await self._restore(session_id, seen)
+                    totals["failed"] += 1
+                    RECLAIM_FAILURES.inc()
+                    return
+                totals["sessions"] += 1
+                totals["vectors"] += vectors
+                SESSIONS_RECLAIMED.inc()
+                VECTORS_RECLAIMED.inc(vectors)
+
+        await asyncio.gather(*(one(session_id) for session_id in expired))
+        if expired:
+            print(f"🧹 Session sweep: reclaimed {totals['sessions']} sessions / {totals['vectors']} vectors, {totals['failed']} failed")
+        return totals
+
+    async def _run(self, reclaim):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if await self._claim_sweep():
+                    await self.sweep(reclaim)
+            except Exception:
+                traceback.print_exc()
+
+    def start(self, reclaim, redis_client=None):
+        self.redis = redis_client
+        if redis_client is None and not SESSION_SWEEP_WITHOUT_REDIS:
+            print("⚠️ Session sweeper disabled: it needs Redis to see every worker's sessions "
+                  "(set SESSION_SWEEP_WITHOUT_REDIS=true on a single-worker deployment)")
+            return
+        self._task = asyncio.create_task(self._run(reclaim))
+        print(f"🧹 Session sweeper started: idle TTL {self.idle_ttl}s, every {self.interval}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+session_registry = SessionRegistry()
@@ -0,0 +1,204 @@
+import os
+import re
+import json
+import math
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from typing import List
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from backend.ingest_pipeline import chunk_id
+from backend.telemetry import record_cache_lookup, timed
+
+SPARSE_INDEX_DIR = os.getenv(
+    "SPARSE_INDEX_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".sparse_index"))
+)
+SPARSE_INDEX_CACHE_SIZE = int(os.getenv("SPARSE_INDEX_CACHE_SIZE", "64"))
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class SparseIndex:
+    """
+    Compact BM25 inverted index over every chunk of one namespace.
+    Postings are stored as {term: [[doc_id, tf], ...]} so the index round-trips through JSON.
+    """
+
+    def __init__(self, docs, postings, doc_lens, k1=1.5, b=0.75):
+        self.docs = docs
+        self.postings = postings
+        self.doc_lens = doc_lens
+        self.k1 = k1
+        self.b = b
+        self.avg_len = (sum(doc_lens) / len(doc_lens)) if doc_lens else 0.0
+
+    @classmethod
+    def from_documents(cls, documents):
+        docs, postings, doc_lens = [], {}, []
+        with timed("bm25_build"):
+            for doc_id, doc in enumerate(documents):
+                tokens = tokenize(doc.page_content)
+                for term, tf in Counter(tokens).items():
+                    postings.setdefault(term, []).append([doc_id, tf])
+                doc_lens.append(len(tokens))
+                docs.append({"id": doc.id, "text": doc.page_content, "metadata": doc.metadata})
+        return cls(docs, postings, doc_lens)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def chunk_metadata(self):
+        """
+        {chunk ID: metadata} for every indexed chunk: the namespace's manifest for incremental
+        re-ingestion. Indexes saved before IDs were recorded re-derive them from the text.
+        """
+        manifest, seen = {}, {}
+        for doc in self.docs:
+            doc_id = doc.get("id")
+            if doc_id is None:
+                occurrence = seen.get(doc["text"], 0)
+                seen[doc["text"]] = occurrence + 1
+                doc_id = chunk_id(doc["text"], occurrence)
+            manifest[doc_id] = doc["metadata"]
+        return manifest
+
+    def search(self, query, k=5):
+        """Returns the top-k chunks ranked by Okapi BM25."""
+        n_docs = len(self.docs)
+        if not n_docs:
+            return []
+
+        scores = {}
+        with timed("bm25_query"):
+            for term in set(tokenize(query)):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting:
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lens[doc_id] / (self.avg_len or 1))
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            Document(page_content=self.docs[doc_id]["text"], metadata=self.docs[doc_id]["metadata"])
+            for doc_id, _ in ranked
+        ]
+
+    def to_dict(self):
+        return {"docs": self.docs, "postings": self.postings, "doc_lens": self.doc_lens}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["docs"], data["postings"], data["doc_lens"])
+
+
+class SparseIndexRetriever(BaseRetriever):
+    """Adapts a SparseIndex to the LangChain retriever interface used by EnsembleRetriever."""
+
+    index: SparseIndex
+    k: int = 5
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        return self.index.search(query, k=self.k)
+
+
+def _file_signature(stat):
+    # The inode changes on every save (write-then-rename), so this is exact even on coarse-mtime filesystems
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class SparseIndexStore:
+    """
+    Local file store for per-namespace sparse indexes, fronted by a thread-safe LRU cache
+    so each session's index is read from disk once and then served from memory. A cached index
+    is revalidated against the file on every load (one stat), so a save or delete made by
+    another worker on the same root_dir is picked up on that worker's next query.
+    """
+
+    def __init__(self, root_dir=SPARSE_INDEX_DIR, max_cached=SPARSE_INDEX_CACHE_SIZE):
+        self.root_dir = root_dir
+        self.max_cached = max_cached
+        self._cache = OrderedDict()  # namespace -> (file signature, index)
+        self._lock = threading.Lock()
+
+    def _path(self, namespace):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", namespace)
+        return os.path.join(self.root_dir, f"{safe_name}.json")
+
+    def _remember(self, namespace, signature, index):
+        with self._lock:
+            self._cache[namespace] = (signature, index)
+            self._cache.move_to_end(namespace)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    def _forget(self, namespace):
+        with self._lock:
+            self._cache.pop(namespace, None)
+
+    def save(self, namespace, index):
+        os.makedirs(self.root_dir, exist_ok=True)
+        path = self._path(namespace)
+        # Unique temp name: concurrent saves of one namespace (threads or workers) never share a file
+        f = tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=self.root_dir, prefix=os.path.basename(path), suffix=".tmp", delete=False
+        )
+        try:
+            with f:
+                json.dump(index.to_dict(), f, separators=(",", ":"))
+                f.flush()
+                # Taken before the rename: a later save by another worker must not be cached as ours
+                signature = _file_signature(os.fstat(f.fileno()))
+            os.replace(f.name, path)
+        except BaseException:
+            os.remove(f.name)
+            raise
+        self._remember(namespace, signature, index)
+
+    def load(self, namespace):
+        """Returns the index for a namespace (cached while its file is unchanged), or None if there is none."""
+        path = self._path(namespace)
+        try:
+            signature = _file_signature(os.stat(path))
+        except FileNotFoundError:
+            # Deleted here or by another worker (logout, idle sweep)
+            self._forget(namespace)
+            return None
+
+        with self._lock:
+            cached = self._cache.get(namespace)
+            if cached is not None and cached[0] == signature:
+                self._cache.move_to_end(namespace)
+                record_cache_lookup("sparse_index", hits=1)
+                return cached[1]
+
+        record_cache_lookup("sparse_index", hits=0, misses=1)
+        try:
+            with timed("sparse_load"), open(path, "r", encoding="utf-8") as f:
+                signature = _file_signature(os.fstat(f.fileno()))
+                index = SparseIndex.from_dict(json.load(f))
+        except FileNotFoundError:
+            self._forget(namespace)
+            return None
+        self._remember(namespace, signature, index)
+        return index
+
+    def delete(self, namespace):
+        self._forget(namespace)
+        path = self._path(namespace)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+sparse_index_store = SparseIndexStore()
@@ -0,0 +1,131 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+# Several uvicorn/gunicorn workers: point every worker at the same empty directory (cleared on
+# deploy) so /metrics sums counters and histograms across processes instead of sampling one
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Seconds: covers sub-millisecond BM25 lookups through multi-minute parses
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+_tracer = None
+if OTEL_ENABLED:
+    try:
+        from opentelemetry import trace as otel_trace
+        _tracer = otel_trace.get_tracer("aegis-audit")
+    except ImportError:
+        print("⚠️ OTEL_ENABLED is set but opentelemetry-api is not installed; spans disabled.")
+
+
+def _collect_registered():
+    for collect in _collectors:
+        try:
+            yield from collect()
+        except Exception as e:
+            print(f"⚠️ Metrics collector failed: {e}")
+
+
+class _RuntimeCollector:
+    """Adapts the registered collector callables to prometheus_client's Collector interface."""
+
+    def describe(self):
+        # Names are only known at scrape time; skip the describe-by-collecting done on register
+        return []
+
+    def collect(self):
+        return _collect_registered()
+
+
+_collectors = []
+if not PROMETHEUS_MULTIPROC_DIR:
+    REGISTRY.register(_RuntimeCollector())
+
+
+def register_collector(collector):
+    """
+    `collector()` returns metric families built at scrape time, used to fold in stats objects
+    that already keep their own counters (content cache, LLM scheduler, circuit breaker).
+    These describe the worker that serves the scrape, also in multiprocess mode.
+    """
+    _collectors.append(collector)
+
+
+def render_metrics():
+    """Prometheus text exposition; with PROMETHEUS_MULTIPROC_DIR set, aggregated over all workers."""
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    scrape = CollectorRegistry()
+    multiprocess.MultiProcessCollector(scrape)
+    scrape.register(_RuntimeCollector())
+    return generate_latest(scrape)
+
+
+def mark_worker_exited():
+    """Drops this worker's live gauges from the multiprocess files on shutdown."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+STAGE_SECONDS = Histogram(
+    "aegis_stage_seconds",
+    "Latency per pipeline stage (parse, split, embed, upsert, dense_search, bm25_build, bm25_query, sparse_load, hybrid_retrieval).",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+LLM_TTFT_SECONDS = Histogram("aegis_llm_ttft_seconds", "Time to first streamed chunk per successful Gemini call.", ["model"], buckets=LATENCY_BUCKETS)
+LLM_SECONDS = Histogram("aegis_llm_seconds", "Total Gemini call latency per attempt.", ["model", "outcome"], buckets=LATENCY_BUCKETS)
+CHAT_TTFT_SECONDS = Histogram("aegis_chat_ttft_seconds", "Chat request start to first response chunk (retrieval + LLM start).", buckets=LATENCY_BUCKETS)
+LLM_PROMPT_TOKENS = Histogram("aegis_llm_prompt_tokens", "Prompt tokens reported by Gemini per call.", ["model"], buckets=TOKEN_BUCKETS)
+CACHE_REQUESTS = Counter("aegis_cache_requests", "Cache lookups by cache and result (hit/miss).", ["cache", "result"])
+IN_FLIGHT = Gauge("aegis_in_flight", "Operations currently in progress by kind.", ["kind"], multiprocess_mode="livesum")
+
+
+@contextmanager
+def span(name, attach=True, **attributes):
+    """
+    OpenTelemetry span (no-op unless OTEL_ENABLED); tagged with the current LangSmith run, if any.
+    Use attach=False around generators: a span made current in one thread cannot be detached
+    when the generator is resumed from another (StreamingResponse iterates in a threadpool).
+    """
+    if _tracer is None:
+        yield None
+        return
+    try:
+        from langsmith.run_helpers import get_current_run_tree
+        run_tree = get_current_run_tree()
+    except Exception:
+        run_tree = None
+    if run_tree is not None:
+        attributes["langsmith.run_id"] = str(run_tree.id)
+        attributes["langsmith.trace_id"] = str(run_tree.trace_id)
+    if not attach:
+        detached = _tracer.start_span(name, attributes=attributes)
+        try:
+            yield detached
+        finally:
+            detached.end()
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+@contextmanager
+def timed(stage, **attributes):
+    """Observes the block's duration under aegis_stage_seconds{stage=...} inside a span of the same name."""
+    start = time.perf_counter()
+    with span(f"aegis.{stage}", **attributes):
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def record_cache_lookup(cache, hits, misses=0):
+    if hits:
+        CACHE_REQUESTS.labels(cache=cache, result="hit").inc(hits)
+    if misses:
+        CACHE_REQUESTS.labels(cache=cache, result="miss").inc(misses)
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import queue
+import random
+import threading
+
+EVAL_TRACE_PATH = os.getenv(
+    "EVAL_TRACE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ragas_eval_dataset.jsonl"))
+)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "5"))
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "256"))
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "1.0"))
+TRACE_FSYNC_INTERVAL = float(os.getenv("TRACE_FSYNC_INTERVAL", "5.0"))
+
+_STOP = object()
+
+
+class TraceSink:
+    """
+    Append-only JSONL sink for evaluation traces. Callers only serialise and enqueue; a single
+    background thread drains the queue, writes whole-line batches in one write() each, fsyncs
+    every TRACE_FSYNC_INTERVAL seconds and rotates the file past TRACE_MAX_BYTES
+    (path -> path.1 -> ... path.N). Several uvicorn workers may share the file: every batch is
+    an O_APPEND write, and a worker reopens the path when another one has rotated it.
+    """
+
+    def __init__(self, path=EVAL_TRACE_PATH, sample_rate=TRACE_SAMPLE_RATE, max_bytes=TRACE_MAX_BYTES,
+                 backups=TRACE_BACKUPS, batch_size=TRACE_BATCH_SIZE,
+                 flush_interval=TRACE_FLUSH_INTERVAL, fsync_interval=TRACE_FSYNC_INTERVAL):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.counts = {"emitted": 0, "sampled_out": 0, "written": 0, "rotations": 0, "errors": 0}
+        self._queue = queue.SimpleQueue()
+        self._fd = None
+        self._last_fsync = time.time()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def emit(self, record):
+        """Non-blocking: never touches the file system on the caller's thread."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.counts["sampled_out"] += 1
+            return
+        # json.dumps escapes embedded newlines, so each record stays exactly one line
+        self._queue.put(json.dumps(record) + "\n")
+        self.counts["emitted"] += 1
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-sink", daemon=True)
+                self._thread.start()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _close_fd(self):
+        if self._fd is not None:
+            os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    def _rotate_if_needed(self):
+        try:
+            on_disk = os.stat(self.path)
+        except FileNotFoundError:
+            on_disk = None
+        if on_disk is None or on_disk.st_ino != os.fstat(self._fd).st_ino:
+            # Another worker rotated the file (or it was removed): follow the path
+            self._close_fd()
+            self._open()
+            return
+        if on_disk.st_size < self.max_bytes:
+            return
+        self._close_fd()
+        for n in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{n}"):
+                os.replace(f"{self.path}.{n}", f"{self.path}.{n + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.counts["rotations"] += 1
+        self._open()
+
+    def _write(self, lines):
+        if self._fd is None:
+            self._open()
+        self._rotate_if_needed()
+        os.write(self._fd, "".join(lines).encode("utf-8"))
+        self.counts["written"] += len(lines)
+        if time.time() - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._fd)
+            self._last_fsync = time.time()
+
+    def _run(self):
+        stopping = False
+        while True:
+            try:
+                # Once stopped, keep draining: lines queued behind _STOP are written before exiting
+                item = self._queue.get_nowait() if stopping else self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if stopping:
+                    break
+                continue
+            batch = []
+            while True:
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write(batch)
+                except OSError as e:
+                    self.counts["errors"] += 1
+                    print(f"⚠️ Failed to write {len(batch)} evaluation traces: {e}")
+        try:
+            self._close_fd()
+        except OSError as e:
+            print(f"⚠️ Failed to close evaluation trace file: {e}")
+
+    def close(self, timeout=10):
+        """Flushes everything queued so far and fsyncs; called from the FastAPI lifespan shutdown."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        print(f"✅ Evaluation traces flushed -> {self.path} ({self.counts['written']} written)")
+
+
+trace_sink = TraceSink()
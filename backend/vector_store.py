@@ -0,0 +1,427 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+import numpy as np
+from pinecone import Pinecone
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from langchain_pinecone import PineconeVectorStore
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "aegis-audit-index")
+# Longest wait for a write to become visible to queries before callers fall back to a safe path
+VECTOR_CONSISTENCY_TIMEOUT = float(os.getenv("VECTOR_CONSISTENCY_TIMEOUT", "30"))
+LOCAL_VECTOR_DIR = os.getenv(
+    "LOCAL_VECTOR_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".vector_store"))
+)
+VECTOR_STORE_CACHE_SIZE = int(os.getenv("VECTOR_STORE_CACHE_SIZE", "256"))
+
+
+class VectorBackend(ABC):
+    """
+    Namespace-aware vector storage used by AegisIngestor and AegisEngine.
+    `store(namespace)` hands out a LangChain VectorStore so retrieval code stays backend-agnostic.
+    A backend missing any of the abstract operations fails at construction, not on first use.
+    """
+
+    @abstractmethod
+    def store(self, namespace):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert(self, namespace, ids, vectors, texts, metadatas):
+        """Writes pre-computed embeddings, so ingestion can embed and upsert as separate stages."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_ids(self, namespace, ids):
+        """Removes individual chunks (incremental re-ingestion of a revised document)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_namespace(self, namespace):
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self, namespace):
+        """Number of vectors stored in a namespace (0 if it does not exist)."""
+        raise NotImplementedError
+
+    def wait_until_visible(self, namespace, upserted_ids=(), deleted_ids=(), timeout=VECTOR_CONSISTENCY_TIMEOUT):
+        """
+        Blocks until queries see the given upserts and deletes; returns False on timeout.
+        Backends with read-your-writes semantics need not override this.
+        """
+        return True
+
+    def warm(self):
+        pass
+
+
+class PineconeBackend(VectorBackend):
+    """Serverless Pinecone index, one namespace per session document."""
+
+    def __init__(self, embeddings, index=None, index_name=PINECONE_INDEX_NAME):
+        self.embeddings = embeddings
+        if index is None:
+            index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index(index_name)
+        self.index = index
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def store(self, namespace):
+        """Returns the cached PineconeVectorStore handle for a namespace (LRU-bounded)."""
+        with self._lock:
+            store = self._stores.get(namespace)
+            if store is None:
+                store = PineconeVectorStore(index=self.index, embedding=self.embeddings, namespace=namespace)
+                self._stores[namespace] = store
+                while len(self._stores) > VECTOR_STORE_CACHE_SIZE:
+                    self._stores.popitem(last=False)
+            else:
+                self._stores.move_to_end(namespace)
+            return store
+
+    def upsert(self, namespace, ids, vectors, texts, metadatas):
+        # Same metadata layout PineconeVectorStore writes (chunk text under "text")
+        self.index.upsert(
+            vectors=[
+                {"id": doc_id, "values": list(vector), "metadata": {**metadata, "text": text}}
+                for doc_id, vector, text, metadata in zip(ids, vectors, texts, metadatas)
+            ],
+            namespace=namespace
+        )
+
+    def delete_ids(self, namespace, ids):
+        ids = list(ids)
+        # Pinecone caps a delete-by-ID request at 1000 IDs
+        for start in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[start:start + 1000], namespace=namespace)
+
+    def delete_namespace(self, namespace):
+        with self._lock:
+            self._stores.pop(namespace, None)
+        self.index.delete(delete_all=True, namespace=namespace)
+
+    def wait_until_visible(self, namespace, upserted_ids=(), deleted_ids=(), timeout=VECTOR_CONSISTENCY_TIMEOUT):
+        """Pinecone is eventually consistent: polls fetch-by-ID until the write shows (sampled, fetch caps at 1000 IDs)."""
+        upserted, deleted = list(upserted_ids)[:500], list(deleted_ids)[:500]
+        if not upserted and not deleted:
+            return True
+        deadline = time.time() + timeout
+        while True:
+            fetched = self.index.fetch(ids=upserted + deleted, namespace=namespace)
+            found = set(fetched.get("vectors", {}) if isinstance(fetched, dict) else fetched.vectors)
+            if found.issuperset(upserted) and found.isdisjoint(deleted):
+                return True
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.5)
+
+    def count(self, namespace):
+        stats = self.index.describe_index_stats()
+        namespaces = stats.get("namespaces", {}) if isinstance(stats, dict) else stats.namespaces
+        summary = namespaces.get(namespace)
+        if summary is None:
+            return 0
+        return summary["vector_count"] if isinstance(summary, dict) else summary.vector_count
+
+    def warm(self):
+        self.index.describe_index_stats()
+
+
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+
+def _path_lock(path):
+    """One RLock per namespace directory, shared by every _LocalNamespace opened on it in this process."""
+    with _path_locks_guard:
+        return _path_locks.setdefault(path, threading.RLock())
+
+
+class _LocalNamespace:
+    """
+    On-disk layout of one namespace: `vectors.f32` (row-major float32, L2-normalised),
+    `records.jsonl` (id, text, metadata per row) and `manifest.json` (dim, count).
+    Vectors are memory-mapped for search, so idle namespaces cost no RAM.
+    Writers hold an exclusive flock on `<namespace>.lock` beside the directory and readers a
+    shared one, and the cached rows are revalidated against the manifest, so several workers
+    can share one root_dir.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = _path_lock(path)
+        self._matrix = None
+        self._records = None
+        self._signature = None
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _manifest(self):
+        manifest_path = self._file("manifest.json")
+        if not os.path.exists(manifest_path):
+            return {"dim": 0, "count": 0}
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _manifest_signature(self):
+        # The manifest is renamed into place on every write, so its inode changes with each one
+        try:
+            stat = os.stat(self._file("manifest.json"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _invalidate(self):
+        self._matrix = None
+        self._records = None
+        self._signature = None
+
+    def _stale(self):
+        return self._records is None or self._manifest_signature() != self._signature
+
+    def _read(self):
+        # Caller holds the file lock, so the manifest, vectors and records are from one write
+        self._signature = self._manifest_signature()
+        manifest = self._manifest()
+        if not manifest["count"]:
+            self._matrix, self._records = np.zeros((0, 0), dtype=np.float32), []
+        else:
+            self._matrix = np.memmap(
+                self._file("vectors.f32"), dtype=np.float32, mode="r",
+                shape=(manifest["count"], manifest["dim"])
+            )
+            with open(self._file("records.jsonl"), "r", encoding="utf-8") as f:
+                self._records = [json.loads(line) for line in f]
+
+    def evict(self):
+        """Drops the cached memmap and records; the next load() reads them back from disk."""
+        with self.lock:
+            self._invalidate()
+
+    def load(self):
+        """Returns (memmapped matrix, records), reading from disk only after a write (by any worker)."""
+        with self.lock:
+            if self._stale():
+                with self._file_lock(exclusive=False):
+                    self._read()
+            return self._matrix, self._records
+
+    def _load_for_write(self):
+        # Caller holds the exclusive file lock: another worker may have written since our last read
+        if self._stale():
+            self._read()
+        return self._matrix, self._records
+
+    def _rewrite(self, matrix, records):
+        # Write-then-rename so readers still holding the old memmap never see a truncated file
+        os.makedirs(self.path, exist_ok=True)
+        np.ascontiguousarray(matrix, dtype=np.float32).tofile(self._file("vectors.f32.tmp"))
+        os.replace(self._file("vectors.f32.tmp"), self._file("vectors.f32"))
+        with open(self._file("records.jsonl.tmp"), "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(self._file("records.jsonl.tmp"), self._file("records.jsonl"))
+        self._write_manifest(int(matrix.shape[1]) if len(records) else 0, len(records))
+        self._invalidate()
+
+    def _write_manifest(self, dim, count):
+        # Renamed into place: a concurrent count() or load() never reads a half-written manifest
+        with open(self._file("manifest.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump({"dim": dim, "count": count}, f)
+        os.replace(self._file("manifest.json.tmp"), self._file("manifest.json"))
+
+    def upsert(self, vectors, records):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self.lock, self._file_lock(exclusive=True):
+            matrix, existing = self._load_for_write()
+            existing_ids = {record["id"] for record in existing}
+            if existing and existing_ids & {record["id"] for record in records}:
+                # Replacing rows: rewrite the (small, per-session) namespace in place
+                new_ids = {record["id"] for record in records}
+                keep = [i for i, record in enumerate(existing) if record["id"] not in new_ids]
+                self._rewrite(
+                    np.vstack([np.asarray(matrix)[keep], vectors]),
+                    [existing[i] for i in keep] + records
+                )
+                return
+
+            os.makedirs(self.path, exist_ok=True)
+            with open(self._file("vectors.f32"), "ab") as f:
+                vectors.tofile(f)
+            with open(self._file("records.jsonl"), "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            self._write_manifest(int(vectors.shape[1]), len(existing) + len(records))
+            self._invalidate()
+
+    def count(self):
+        return self._manifest()["count"]
+
+    def delete_ids(self, ids):
+        ids = set(ids)
+        with self.lock, self._file_lock(exclusive=True):
+            matrix, records = self._load_for_write()
+            keep = [i for i, record in enumerate(records) if record["id"] not in ids]
+            if len(keep) != len(records):
+                self._rewrite(np.asarray(matrix)[keep] if keep else np.zeros((0, 0), dtype=np.float32),
+                              [records[i] for i in keep])
+
+    def top_k(self, query_vector, k):
+        matrix, records = self.load()
+        if not records:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = matrix @ query
+        k = min(k, len(records))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(records[i], float(scores[i])) for i in top]
+
+
+class LocalNumpyVectorStore(VectorStore):
+    """LangChain VectorStore view over one local namespace (exact cosine top-k)."""
+
+    def __init__(self, namespace_data, embedding):
+        self._data = namespace_data
+        self._embedding = embedding
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        self._data.upsert(vectors, [
+            {"id": doc_id, "text": text, "metadata": metadata}
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        ])
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        if ids:
+            self._data.delete_ids(ids)
+        return True
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4):
+        return [
+            (Document(page_content=record["text"], metadata=record["metadata"]), score)
+            for record, score in self._data.top_k(embedding, k)
+        ]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Use LocalNumpyBackend.store(namespace) to obtain a namespaced store.")
+
+
+class LocalNumpyBackend(VectorBackend):
+    """
+    In-process, memory-mapped NumPy index with one directory per namespace.
+    Meant for small per-session corpora and for running the pipeline without external services.
+    Open namespaces are kept in an LRU of VECTOR_STORE_CACHE_SIZE; evicted ones release their memmap.
+    """
+
+    def __init__(self, embeddings, root_dir=LOCAL_VECTOR_DIR):
+        self.embeddings = embeddings
+        self.root_dir = root_dir
+        self._namespaces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, namespace):
+        return os.path.join(self.root_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", namespace))
+
+    def _namespace(self, namespace):
+        evicted = []
+        with self._lock:
+            data = self._namespaces.get(namespace)
+            if data is None:
+                data = _LocalNamespace(self._path(namespace))
+                self._namespaces[namespace] = data
+                while len(self._namespaces) > VECTOR_STORE_CACHE_SIZE:
+                    evicted.append(self._namespaces.popitem(last=False)[1])
+            else:
+                self._namespaces.move_to_end(namespace)
+        for old in evicted:
+            old.evict()
+        return data
+
+    def store(self, namespace):
+        return LocalNumpyVectorStore(self._namespace(namespace), self.embeddings)
+
+    def upsert(self, namespace, ids, vectors, texts, metadatas):
+        self._namespace(namespace).upsert(vectors, [
+            {"id": doc_id, "text": text, "metadata": metadata}
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        ])
+
+    def delete_ids(self, namespace, ids):
+        self._namespace(namespace).delete_ids(ids)
+
+    def delete_namespace(self, namespace):
+        with self._lock:
+            data = self._namespaces.pop(namespace, None)
+        data = data or _LocalNamespace(self._path(namespace))
+        with data.lock, data._file_lock(exclusive=True):
+            shutil.rmtree(data.path, ignore_errors=True)
+            data._invalidate()
+
+    def count(self, namespace):
+        return self._namespace(namespace).count()
+
+
+def create_vector_backend(embeddings, index=None, backend=VECTOR_BACKEND):
+    """Selects the vector backend for this deployment via VECTOR_BACKEND (pinecone | local)."""
+    if backend == "local":
+        return LocalNumpyBackend(embeddings)
+    if backend == "pinecone":
+        return PineconeBackend(embeddings, index=index)
+    raise ValueError(f"Unknown VECTOR_BACKEND '{backend}'. Expected 'pinecone' or 'local'.")
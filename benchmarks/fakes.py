@@ -0,0 +1,395 @@
+"""
+Deterministic, configurable-latency stand-ins for Gemini, the embedding API, Pinecone,
+LlamaParse and Redis. Latencies are drawn from a seeded lognormal-ish jitter around the
+configured mean so runs are reproducible; set a mean to 0 to measure pure local overhead.
+"""
+import re
+import json
+import time
+import asyncio
+import fnmatch
+import hashlib
+import random
+import threading
+from types import SimpleNamespace
+
+from backend.engine import AUDIT_PILLARS
+from backend.llm_scheduler import RESERVE_TPM_SCRIPT
+from backend.session_registry import CLAIM_IDLE_SCRIPT
+from backend.vector_store import LocalNumpyBackend, LocalNumpyVectorStore
+
+
+class Latency:
+    """Seeded latency source: `mean` seconds with +/- `jitter` fractional spread."""
+
+    def __init__(self, mean, jitter=0.25, seed=0):
+        self.mean = mean
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, scale=1.0):
+        if self.mean <= 0:
+            return 0.0
+        with self._lock:
+            spread = self._rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.mean * scale * (1 + spread))
+
+    def sleep(self, scale=1.0):
+        time.sleep(self.sample(scale))
+
+    async def asleep(self, scale=1.0):
+        await asyncio.sleep(self.sample(scale))
+
+
+# --- Gemini -----------------------------------------------------------------------------------
+
+_PILLAR_RE = re.compile(r'PILLAR TO ANALYZE: "([^"]+)"')
+_PILLARS_RE = re.compile(r"PILLARS TO ANALYZE: (.+)")
+_RATINGS = ("Critical", "High", "Medium", "Low")
+
+
+def _fake_finding(pillar):
+    rating = _RATINGS[int(hashlib.sha256(pillar.encode()).hexdigest(), 16) % len(_RATINGS)]
+    return {
+        "pillar": pillar,
+        "rating": rating,
+        "finding": f"The policy lacks explicit provisions for {pillar.lower()} required by the law.",
+        "remediation": f"Add a {pillar.lower()} clause mirroring the statutory requirement.",
+        "citation": "Section 4.2"
+    }
+
+
+def _response(text, prompt_tokens):
+    return SimpleNamespace(
+        text=text,
+        candidates=[SimpleNamespace(content=SimpleNamespace(parts=[text]))],
+        usage_metadata=SimpleNamespace(prompt_token_count=prompt_tokens)
+    )
+
+
+class FakeGenerativeModel:
+    """
+    Stands in for genai.GenerativeModel. Structured calls return schema-valid findings (one per
+    pillar named in the prompt); streamed calls yield `stream_chunks` chunks, the first after
+    `ttft` and the rest spread over the remaining latency.
+    """
+
+    def __init__(self, latency=0.8, ttft=0.3, stream_chunks=12, seed=0):
+        self.latency = Latency(latency, seed=seed)
+        self.ttft = Latency(ttft, seed=seed + 1)
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+
+    def _text_for(self, prompt, generation_config):
+        schema = getattr(getattr(generation_config, "response_schema", None), "__name__", None)
+        if schema == "AuditReport":
+            match = _PILLARS_RE.search(prompt)
+            pillars = re.findall(r'"([^"]+)"', match.group(1)) if match else AUDIT_PILLARS
+            return json.dumps({"findings": [_fake_finding(p) for p in pillars]})
+        if schema == "AuditFinding":
+            match = _PILLAR_RE.search(prompt)
+            return json.dumps(_fake_finding(match.group(1) if match else "Unknown"))
+        return "Based on the retrieved clauses, the policy partially satisfies the statute. " * 4
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        self.calls += 1
+        text = self._text_for(prompt, generation_config)
+        tokens = len(prompt) // 4
+        if not stream:
+            self.latency.sleep()
+            return _response(text, tokens)
+        return self._stream(text, tokens)
+
+    def _stream(self, text, tokens):
+        self.ttft.sleep()
+        step = max(1, len(text) // self.stream_chunks)
+        pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        per_chunk = max(0.0, self.latency.mean - self.ttft.mean) / max(1, len(pieces))
+        for n, piece in enumerate(pieces):
+            if n:
+                time.sleep(per_chunk)
+            yield _response(piece, tokens if n == len(pieces) - 1 else None)
+
+    async def generate_content_async(self, prompt, generation_config=None, **kwargs):
+        self.calls += 1
+        await self.latency.asleep()
+        return _response(self._text_for(prompt, generation_config), len(prompt) // 4)
+
+
+# --- Embeddings -------------------------------------------------------------------------------
+
+class FakeEmbeddings:
+    """Hash-seeded unit vectors: identical text always maps to the identical vector."""
+
+    model = "fake-embedding"
+
+    def __init__(self, dim=768, batch_latency=0.15, per_text_latency=0.002, seed=0):
+        self.dim = dim
+        self.batch_latency = Latency(batch_latency, seed=seed)
+        self.per_text_latency = per_text_latency
+        self.calls = 0
+
+    def _vector(self, text):
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+        vector = [rng.gauss(0, 1) for _ in range(self.dim)]
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts, task_type=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.batch_latency.sample() + self.per_text_latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text, **kwargs):
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text, **kwargs):
+        return await asyncio.to_thread(self.embed_query, text)
+
+
+# --- Vector store -----------------------------------------------------------------------------
+
+class _LatentStore(LocalNumpyVectorStore):
+    def __init__(self, namespace_data, embedding, latency):
+        super().__init__(namespace_data, embedding)
+        self._latency = latency
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4):
+        self._latency.sleep()
+        return super().similarity_search_with_score_by_vector(embedding, k)
+
+
+class FakeVectorBackend(LocalNumpyBackend):
+    """The real local NumPy backend plus Pinecone-like network latency on queries and upserts."""
+
+    def __init__(self, embeddings, root_dir, query_latency=0.05, upsert_latency=0.08, seed=0):
+        super().__init__(embeddings, root_dir=root_dir)
+        self.query_latency = Latency(query_latency, seed=seed)
+        self.upsert_latency = Latency(upsert_latency, seed=seed + 1)
+
+    def store(self, namespace):
+        return _LatentStore(self._namespace(namespace), self.embeddings, self.query_latency)
+
+    def upsert(self, namespace, ids, vectors, texts, metadatas):
+        self.upsert_latency.sleep()
+        super().upsert(namespace, ids, vectors, texts, metadatas)
+
+    def warm(self):
+        pass
+
+
+# --- Parser -----------------------------------------------------------------------------------
+
+_CLAUSES = (
+    "The employer shall obtain written consent before processing personal data of an employee.",
+    "Any agreement entered into by a minor or a person of unsound mind is void ab initio.",
+    "Consideration must be lawful and must not be forbidden by law or opposed to public policy.",
+    "Records of all processing activities shall be maintained for a period of not less than five years.",
+    "In the event of a material breach, the aggrieved party may terminate the contract by written notice.",
+    "Either party may terminate this agreement upon thirty days written notice to the other party.",
+    "The courts at the registered office of the company shall have exclusive jurisdiction.",
+    "A data fiduciary shall notify the Board and each affected principal of any personal data breach.",
+)
+
+
+class FakePDFParser:
+    """
+    Streams synthetic statute-like pages. Page text is seeded by the file's bytes, so a different
+    upload produces different text (cold parse and embedding caches) and the same upload repeats.
+    """
+
+    cache_name = "fake-parser"
+
+    def __init__(self, pages=20, page_latency=0.05, seed=0):
+        self.pages = pages
+        self.page_latency = Latency(page_latency, seed=seed)
+
+    def iter_pages(self, file_path):
+        with open(file_path, "rb") as f:
+            rng = random.Random(hashlib.sha256(f.read()).digest())
+        for page_no in range(1, self.pages + 1):
+            self.page_latency.sleep()
+            paragraphs = [f"## Section {page_no}.{n + 1}\n\n" + " ".join(
+                rng.choice(_CLAUSES) + f" (ref {rng.randrange(10 ** 6)})" for _ in range(6)
+            ) for n in range(3)]
+            yield "\n\n".join(paragraphs)
+
+
+def fake_pdf_bytes(seed):
+    """Distinct payload per seed; only FakePDFParser reads it, so it need not be a real PDF."""
+    return b"%PDF-1.7 benchmark " + hashlib.sha256(str(seed).encode()).hexdigest().encode() * 64
+
+
+# --- Redis ------------------------------------------------------------------------------------
+
+class FakeAsyncRedis:
+    """
+    In-memory subset of redis.asyncio used by the API: strings with TTL, lists with
+    LPUSH/LRANGE/BLPOP, sorted sets and the backend's Lua scripts.
+    fakeredis is preferred when installed; this keeps the suite free of extra dependencies.
+    """
+
+    def __init__(self, latency=0.0005, seed=0):
+        self.latency = Latency(latency, seed=seed)
+        self._data = {}
+        self._expiry = {}
+        self._lists = {}
+        self._zsets = {}
+        self._cond = None
+
+    def _live(self, key):
+        expires = self._expiry.get(key)
+        if expires is not None and expires <= time.time():
+            self._data.pop(key, None)
+            self._expiry.pop(key, None)
+        return key in self._data
+
+    async def ping(self):
+        await self.latency.asleep()
+        return True
+
+    async def close(self):
+        pass
+
+    aclose = close
+
+    async def script_load(self, script):
+        return hashlib.sha1(script.encode()).hexdigest()
+
+    async def get(self, key):
+        await self.latency.asleep()
+        return self._data.get(key) if self._live(key) else None
+
+    async def mget(self, keys):
+        await self.latency.asleep()
+        return [self._data.get(key) if self._live(key) else None for key in keys]
+
+    async def set(self, key, value, nx=False, ex=None):
+        await self.latency.asleep()
+        if nx and self._live(key):
+            return None
+        self._data[key] = str(value)
+        if ex:
+            self._expiry[key] = time.time() + ex
+        else:
+            self._expiry.pop(key, None)
+        return True
+
+    async def setex(self, key, ttl, value):
+        return await self.set(key, value, ex=ttl)
+
+    async def delete(self, *keys):
+        await self.latency.asleep()
+        removed = 0
+        for key in keys:
+            removed += self._data.pop(key, None) is not None
+            self._expiry.pop(key, None)
+            removed += self._lists.pop(key, None) is not None
+        return removed
+
+    async def keys(self, pattern="*"):
+        return [key for key in list(self._data) + list(self._lists) if fnmatch.fnmatch(key, pattern) and (key in self._lists or self._live(key))]
+
+    async def rpush(self, key, *values):
+        await self.latency.asleep()
+        self._lists.setdefault(key, []).extend(str(v) for v in values)
+        return len(self._lists[key])
+
+    async def lpush(self, key, *values):
+        await self.latency.asleep()
+        items = self._lists.setdefault(key, [])
+        for value in values:
+            items.insert(0, str(value))
+        return len(items)
+
+    async def lrange(self, key, start, end):
+        await self.latency.asleep()
+        items = self._lists.get(key, [])
+        return items[start:None if end == -1 else end + 1]
+
+    async def ltrim(self, key, start, end):
+        if key in self._lists:
+            self._lists[key] = self._lists[key][start:None if end == -1 else end + 1]
+        return True
+
+    async def expire(self, key, ttl):
+        # List TTLs are not simulated; benchmark runs are far shorter than any configured TTL
+        return key in self._lists or self._live(key)
+
+    async def zadd(self, key, mapping, nx=False, xx=False):
+        await self.latency.asleep()
+        zset = self._zsets.setdefault(key, {})
+        if nx:
+            mapping = {member: score for member, score in mapping.items() if member not in zset}
+        if xx:
+            mapping = {member: score for member, score in mapping.items() if member in zset}
+        zset.update(mapping)
+        return len(mapping)
+
+    async def zscore(self, key, member):
+        await self.latency.asleep()
+        return self._zsets.get(key, {}).get(member)
+
+    def _claim_idle(self, keys, args):
+        zset = self._zsets.get(keys[0], {})
+        score = zset.get(args[0])
+        if score is not None and score <= float(args[1]):
+            del zset[args[0]]
+            return str(score)
+        return None
+
+    def _reserve_tpm(self, keys, args):
+        used = int(self._data.get(keys[0], 0)) if self._live(keys[0]) else 0
+        tokens, cap, ttl = int(args[0]), int(args[1]), int(args[2])
+        if used > 0 and used + tokens > cap:
+            return 0
+        self._data[keys[0]] = str(used + tokens)
+        self._expiry[keys[0]] = time.time() + ttl
+        return 1
+
+    # The Lua scripts the backend runs, by their source; backend.jobs uses plain commands only
+    _SCRIPTS = {
+        CLAIM_IDLE_SCRIPT: ("CLAIM_IDLE_SCRIPT", _claim_idle),
+        RESERVE_TPM_SCRIPT: ("RESERVE_TPM_SCRIPT", _reserve_tpm),
+    }
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        """Only the scripts the backend runs are emulated (no Lua interpreter)."""
+        await self.latency.asleep()
+        if script not in self._SCRIPTS:
+            first_line = next((line.strip() for line in script.splitlines() if line.strip()), "")
+            raise ValueError(
+                f"FakeAsyncRedis has no emulation for Lua script sha1={hashlib.sha1(script.encode()).hexdigest()} "
+                f"({first_line!r}); emulated scripts: {', '.join(name for name, _ in self._SCRIPTS.values())}."
+            )
+        _, run = self._SCRIPTS[script]
+        return run(self, keys_and_args[:numkeys], keys_and_args[numkeys:])
+
+    async def zrem(self, key, *members):
+        zset = self._zsets.get(key, {})
+        return sum(zset.pop(member, None) is not None for member in members)
+
+    async def zrangebyscore(self, key, low, high, start=None, num=None):
+        await self.latency.asleep()
+        members = sorted((score, member) for member, score in self._zsets.get(key, {}).items() if low <= score <= high)
+        members = [member for _, member in members]
+        return members[start or 0:(start or 0) + num] if num is not None else members
+
+    async def blpop(self, key, timeout=0):
+        deadline = time.time() + timeout if timeout else None
+        while True:
+            items = self._lists.get(key)
+            if items:
+                return key, items.pop(0)
+            if deadline is not None and time.time() >= deadline:
+                return None
+            await asyncio.sleep(0.01)
+
+
+def make_fake_redis():
+    try:
+        from fakeredis import aioredis
+        return aioredis.FakeRedis(decode_responses=True)
+    except ImportError:
+        return FakeAsyncRedis()
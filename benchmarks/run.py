@@ -0,0 +1,351 @@
+"""
+Offline benchmark harness: drives ingestion, the audit engine, chat streaming and the FastAPI
+endpoints against the stand-ins in benchmarks/fakes.py, under concurrent load, and reports
+throughput, p50/p95/p99 latency and peak traced memory per scenario.
+
+    python -m benchmarks.run --output benchmarks/results.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.2   # exit 1 on regression
+
+No cloud keys are used; every path runs against local fakes in a throwaway working directory.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+SCENARIOS = ("ingest", "audit", "audit_async", "chat", "api_upload", "api_audit", "api_audit_cached", "api_chat")
+COMPARED_LATENCIES = ("p95", "p99")
+
+
+def _prepare_environment(workdir):
+    """Points every on-disk store at `workdir` and disables outbound tracing; must run before backend imports."""
+    os.environ.update({
+        "GEMINI_API_KEY": "benchmark",
+        "REDIS_URL": "redis://benchmark",
+        "VECTOR_BACKEND": "local",
+        "LOCAL_VECTOR_DIR": os.path.join(workdir, "vectors"),
+        "SPARSE_INDEX_DIR": os.path.join(workdir, "sparse"),
+        "CONTENT_CACHE_PATH": os.path.join(workdir, "content_cache.sqlite3"),
+        "EVAL_TRACE_PATH": os.path.join(workdir, "traces.jsonl"),
+        "JOB_SPOOL_DIR": os.path.join(workdir, "spool"),
+        "LANGCHAIN_TRACING_V2": "false",
+        "LANGSMITH_TRACING": "false",
+    })
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(p * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    return {
+        "p50": round(percentile(ordered, 0.50), 4),
+        "p95": round(percentile(ordered, 0.95), 4),
+        "p99": round(percentile(ordered, 0.99), 4),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def measure(name, operation, iterations, concurrency, track_memory=True):
+    """
+    Runs `operation(i)` `iterations` times on `concurrency` threads. An operation may return a
+    dict of extra per-call samples in seconds (e.g. {"ttft": 0.21}), summarised alongside latency.
+    """
+    latencies, extras, errors = [], {}, []
+
+    def call(i):
+        start = time.perf_counter()
+        extra = operation(i)
+        return time.perf_counter() - start, extra if isinstance(extra, dict) else {}
+
+    if track_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(call, i) for i in range(iterations)]:
+            try:
+                seconds, extra = future.result()
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append(seconds)
+            for key, value in extra.items():
+                extras.setdefault(key, []).append(value)
+    wall = time.perf_counter() - wall_start
+    peak = None
+    if track_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    result = {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "throughput_per_s": round(len(latencies) / wall, 4) if wall else None,
+        "latency": summarize(latencies),
+        "extra": {key: summarize(values) for key, values in extras.items()},
+        "peak_memory_mb": round(peak / (1024 * 1024), 2) if peak is not None else None,
+    }
+    print(f"⏱️ {name:<18} {result['throughput_per_s']:>8}/s  p50={result['latency'].get('p50')}s "
+          f"p95={result['latency'].get('p95')}s p99={result['latency'].get('p99')}s  errors={len(errors)}"
+          + (f"  peak={result['peak_memory_mb']}MB" if peak is not None else ""))
+    if errors:
+        print(f"   first error: {errors[0]}")
+    return result
+
+
+def build_pool_class(args, workdir):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    from backend.engine import AegisEngine
+    from backend.resources import ResourcePool
+    from benchmarks.fakes import FakeEmbeddings, FakeGenerativeModel, FakePDFParser, FakeVectorBackend
+
+    class BenchmarkPool(ResourcePool):
+        """ResourcePool wired to the fakes; the engine keeps its real retry and scheduling layers."""
+
+        def __init__(self, api_key=None):
+            self.api_key = "benchmark"
+            self.embeddings = FakeEmbeddings(batch_latency=args.embed_latency)
+            self.vector_backend = FakeVectorBackend(
+                self.embeddings, root_dir=os.path.join(workdir, "vectors"),
+                query_latency=args.vector_latency, upsert_latency=args.vector_latency
+            )
+            self.parser = FakePDFParser(pages=args.pages, page_latency=args.parse_latency)
+            self.splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+            self.engine = AegisEngine(api_key=self.api_key, embeddings=self.embeddings, vector_backend=self.vector_backend)
+            self.engine.model.model = FakeGenerativeModel(latency=args.llm_latency, ttft=args.llm_ttft)
+            self.engine.chat_model.model = FakeGenerativeModel(latency=args.llm_latency, ttft=args.llm_ttft, seed=1)
+
+    return BenchmarkPool
+
+
+def _ingest_session(pool, session_id, seed):
+    from benchmarks.fakes import fake_pdf_bytes
+    pool.ingestor(f"{session_id}_LAW").process_pdf(fake_pdf_bytes(f"{seed}-law"), "law.pdf")
+    pool.ingestor(f"{session_id}_POLICY").process_pdf(fake_pdf_bytes(f"{seed}-policy"), "policy.pdf")
+
+
+CHAT_QUERIES = (
+    "Does the policy require written consent before processing employee data?",
+    "What notice period applies to termination?",
+    "Which courts have jurisdiction over disputes?",
+    "How long must processing records be retained?",
+)
+
+
+def _stream_timing(chunks):
+    start = time.perf_counter()
+    ttft = None
+    for _ in chunks:
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return {"ttft": ttft if ttft is not None else time.perf_counter() - start}
+
+
+def run_engine_scenarios(pool, args, selected):
+    from benchmarks.fakes import fake_pdf_bytes
+    results = {}
+    run_id = uuid.uuid4().hex[:6]
+
+    if "ingest" in selected:
+        results["ingest"] = measure(
+            "ingest",
+            lambda i: pool.ingestor(f"bench_{run_id}_ingest_{i}_LAW").process_pdf(fake_pdf_bytes(f"{run_id}-ingest-{i}"), "law.pdf"),
+            args.iterations, args.concurrency, not args.no_memory
+        )
+
+    session_id = f"bench_{run_id}_engine"
+    if selected & {"audit", "audit_async", "chat"}:
+        _ingest_session(pool, session_id, f"{run_id}-engine")
+
+    if "audit" in selected:
+        results["audit"] = measure(
+            "audit", lambda i: pool.engine.run_compliance_audit(session_id),
+            args.iterations, args.concurrency, not args.no_memory
+        )
+    if "audit_async" in selected:
+        results["audit_async"] = measure(
+            "audit_async",
+            lambda i: asyncio.run(pool.engine.arun_compliance_audit(session_id, mode=args.audit_mode)),
+            args.iterations, args.concurrency, not args.no_memory
+        )
+    if "chat" in selected:
+        results["chat"] = measure(
+            "chat",
+            lambda i: _stream_timing(pool.engine.run_query(CHAT_QUERIES[i % len(CHAT_QUERIES)], session_id, "")),
+            args.iterations, args.concurrency, not args.no_memory
+        )
+    return results
+
+
+def run_api_scenarios(pool_class, args, selected):
+    from fastapi.testclient import TestClient
+    from fastapi_limiter.depends import RateLimiter
+
+    from backend import main
+    from benchmarks.fakes import fake_pdf_bytes, make_fake_redis
+
+    fake_redis = make_fake_redis()
+    main.redis_client = fake_redis
+    main.finding_cache.redis = fake_redis
+    main.ResourcePool = pool_class
+    # Measure the service, not the per-IP limiter
+    for route in main.app.routes:
+        for dependency in getattr(route, "dependencies", []):
+            if isinstance(dependency.dependency, RateLimiter):
+                main.app.dependency_overrides[dependency.dependency] = lambda: None
+
+    results = {}
+    run_id = uuid.uuid4().hex[:6]
+    with TestClient(main.app) as client:
+        def upload(i):
+            response = client.post("/api/v1/upload", files={
+                "law_file": ("law.pdf", fake_pdf_bytes(f"{run_id}-api-{i}-law"), "application/pdf"),
+                "policy_file": ("policy.pdf", fake_pdf_bytes(f"{run_id}-api-{i}-policy"), "application/pdf"),
+            })
+            response.raise_for_status()
+            return response.json()["session_id"]
+
+        def audit(session_id, mode=args.audit_mode):
+            response = client.post("/api/v1/audit", json={"session_id": session_id, "mode": mode})
+            response.raise_for_status()
+
+        def chat(i, session_id):
+            with client.stream("POST", "/api/v1/chat", json={
+                "session_id": session_id, "query": CHAT_QUERIES[i % len(CHAT_QUERIES)], "history": []
+            }) as response:
+                response.raise_for_status()
+                return _stream_timing(response.iter_bytes())
+
+        sessions = []
+        if "api_upload" in selected:
+            results["api_upload"] = measure(
+                "api_upload", lambda i: sessions.append(upload(i)), args.iterations, args.concurrency, not args.no_memory
+            )
+        if selected & {"api_audit", "api_audit_cached", "api_chat"}:
+            # Distinct documents per session so every api_audit iteration is a cold (uncached) audit
+            while len(sessions) < args.iterations:
+                sessions.append(upload(f"setup-{len(sessions)}"))
+        if "api_audit" in selected:
+            results["api_audit"] = measure(
+                "api_audit", lambda i: audit(sessions[i]), args.iterations, args.concurrency, not args.no_memory
+            )
+        if "api_audit_cached" in selected:
+            audit(sessions[0])
+            results["api_audit_cached"] = measure(
+                "api_audit_cached", lambda i: audit(sessions[0]), args.iterations, args.concurrency, not args.no_memory
+            )
+        if "api_chat" in selected:
+            results["api_chat"] = measure(
+                "api_chat", lambda i: chat(i, sessions[i % len(sessions)]), args.iterations, args.concurrency, not args.no_memory
+            )
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Returns human-readable regressions: latency/memory above, or throughput below, baseline by > tolerance."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for metric in COMPARED_LATENCIES:
+            now, before = current["latency"].get(metric), base["latency"].get(metric)
+            if now is not None and before and now > before * (1 + tolerance):
+                regressions.append(f"{name}: latency {metric} {before}s -> {now}s")
+        for metric, values in current.get("extra", {}).items():
+            now, before = values.get("p95"), base.get("extra", {}).get(metric, {}).get("p95")
+            if now is not None and before and now > before * (1 + tolerance):
+                regressions.append(f"{name}: {metric} p95 {before}s -> {now}s")
+        now, before = current.get("throughput_per_s"), base.get("throughput_per_s")
+        if now is not None and before and now < before * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before}/s -> {now}/s")
+        now, before = current.get("peak_memory_mb"), base.get("peak_memory_mb")
+        if now is not None and before and now > before * (1 + tolerance):
+            regressions.append(f"{name}: peak memory {before}MB -> {now}MB")
+        if current["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: errors {base.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Aegis offline performance benchmarks")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--audit-mode", default="fanout", choices=("fanout", "single"))
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="mean seconds per Gemini call")
+    parser.add_argument("--llm-ttft", type=float, default=0.3, help="mean seconds to the first streamed chunk")
+    parser.add_argument("--embed-latency", type=float, default=0.15, help="mean seconds per embedding batch")
+    parser.add_argument("--vector-latency", type=float, default=0.05, help="mean seconds per vector query/upsert")
+    parser.add_argument("--parse-latency", type=float, default=0.05, help="mean seconds per parsed page")
+    parser.add_argument("--pages", type=int, default=20, help="pages per fake PDF")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows allocation-heavy paths)")
+    parser.add_argument("--output", help="write results JSON here (use as the next --baseline)")
+    parser.add_argument("--baseline", help="results JSON from a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional regression")
+    args = parser.parse_args(argv)
+
+    selected = {name.strip() for name in args.scenarios.split(",") if name.strip()}
+    unknown = selected - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args, selected
+
+
+def main(argv=None):
+    args, selected = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="aegis-bench-")
+    _prepare_environment(workdir)
+
+    pool_class = build_pool_class(args, workdir)
+    scenarios = {}
+    engine_selected = selected & {"ingest", "audit", "audit_async", "chat"}
+    if engine_selected:
+        scenarios.update(run_engine_scenarios(pool_class(), args, engine_selected))
+    api_selected = selected - engine_selected
+    if api_selected:
+        scenarios.update(run_api_scenarios(pool_class, args, api_selected))
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "scenarios": scenarios,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written -> {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"   - {line}")
+            return 1
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
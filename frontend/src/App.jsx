@@ -594,6 +594,7 @@ export default function AegisAudit() {
   const [policyFile, setPolicyFile] = useState(null);
   const [sessionId, setSessionId] = useState(null);
   const [report, setReport] = useState(null);
+  const [reportRef, setReportRef] = useState(null);
   const [view, setView] = useState("chat");
   const [isAuditing, setIsAuditing] = useState(false);
   const [auditDone, setAuditDone] = useState(false);
@@ -630,7 +631,8 @@ export default function AegisAudit() {
         body: JSON.stringify({
           session_id: sessionId || "general_chat",
           query: userMsg,
-          history: messages.map(m => `${m.role}: ${m.content}`)
+          // Document sessions keep their history server-side; only general chat sends recent turns
+          ...(sessionId ? {} : { history: messages.slice(-6).map(m => `${m.role}: ${m.content}`) })
         }),
       });
       if (!response.ok) throw new Error("Backend error");
@@ -680,7 +682,7 @@ export default function AegisAudit() {
         body: JSON.stringify({ session_id: currentSession }),
       });
       const audData = await audRes.json();
-      if (audRes.ok) { setReport(audData.report); setAuditDone(true); }
+      if (audRes.ok) { setReport(audData.report); setReportRef(audData.report_ref || null); setAuditDone(true); }
       else alert(`Audit failed: ${audData.detail}`);
     } catch { alert("Audit execution failed."); }
     setIsAuditing(false);
@@ -702,6 +704,7 @@ export default function AegisAudit() {
     // Reset all state variables to clear the UI
     setSessionId(null);
     setReport(null);
+    setReportRef(null);
     setLawFile(null);
     setPolicyFile(null);
     setAuditDone(false);
@@ -715,15 +718,16 @@ export default function AegisAudit() {
     if (!sessionId || !report) return;
     
     try {
-      const response = await fetch(`${API_BASE_URL}/export`, {
+      const requestExport = (body) => fetch(`${API_BASE_URL}/export`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ 
-          session_id: sessionId,
-          report_data: report 
-        }),
+        body: JSON.stringify({ session_id: sessionId, ...body }),
       });
 
+      // The server keeps cached reports; only re-send the JSON when it has none (e.g. an audit with errors)
+      let response = reportRef ? await requestExport({ report_ref: reportRef }) : null;
+      if (!response || response.status === 404) response = await requestExport({ report_data: report });
+
       if (!response.ok) throw new Error("Failed to generate report");
 
       const blob = await response.blob();
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from backend.jobs import JobQueue, audit_dedupe_key
+
+
+async def _noop(params, progress):
+    return {}
+
+
+def _queue():
+    queue = JobQueue(workers=0, lease=60)
+    queue.register("audit", _noop)
+    return queue
+
+
+def test_audits_of_identical_documents_are_not_shared_across_sessions():
+    queue = _queue()
+
+    async def scenario():
+        first, _ = await queue.submit("audit", {"session_id": "s1"}, dedupe_key=audit_dedupe_key("s1", "hash", "fanout"))
+        other, other_coalesced = await queue.submit(
+            "audit", {"session_id": "s2"}, dedupe_key=audit_dedupe_key("s2", "hash", "fanout")
+        )
+        again, again_coalesced = await queue.submit(
+            "audit", {"session_id": "s1"}, dedupe_key=audit_dedupe_key("s1", "hash", "fanout")
+        )
+        return first, other, other_coalesced, again, again_coalesced
+
+    first, other, other_coalesced, again, again_coalesced = asyncio.run(scenario())
+    assert not other_coalesced and other["job_id"] != first["job_id"]
+    assert other["params"]["session_id"] == "s2"
+    assert again_coalesced and again["job_id"] == first["job_id"]
+
+
+def test_mode_and_documents_are_part_of_the_key():
+    keys = {
+        audit_dedupe_key("s1", "hash", "fanout"), audit_dedupe_key("s1", "hash", "single"),
+        audit_dedupe_key("s1", "revised", "fanout"), audit_dedupe_key("s1", None, "fanout"),
+    }
+    assert len(keys) == 4
+
+
+def test_job_with_a_lapsed_lease_is_failed_cleaned_up_and_resubmittable():
+    queue = _queue()
+    cleaned = []
+    queue.register("ingest", _noop, on_abandoned=cleaned.append)
+
+    async def scenario():
+        record, _ = await queue.submit("ingest", {"spool": "/tmp/x.pdf"}, dedupe_key="ingest:abc")
+        # The worker that picked it up died: running, but no heartbeat for longer than the lease
+        record["status"], record["started"] = "running", time.time() - 600
+        record["updated"] = time.time() - 600
+        abandoned = await queue.get(record["job_id"])
+        retry, coalesced = await queue.submit("ingest", {"spool": "/tmp/y.pdf"}, dedupe_key="ingest:abc")
+        return abandoned, retry, coalesced
+
+    abandoned, retry, coalesced = asyncio.run(scenario())
+    assert abandoned["status"] == "failed"
+    assert cleaned == [{"spool": "/tmp/x.pdf"}]
+    assert not coalesced and retry["job_id"] != abandoned["job_id"]
+
+
+def test_heartbeat_keeps_a_long_job_alive():
+    queue = JobQueue(workers=1, heartbeat=0.05, lease=0.2)
+
+    async def scenario():
+        finished = asyncio.Event()
+
+        async def slow(params, progress):
+            await finished.wait()
+            return {"ok": True}
+
+        queue.register("slow", slow)
+        await queue.start()
+        record, _ = await queue.submit("slow", {})
+        await asyncio.sleep(0.5)  # several leases long
+        during = (await queue.get(record["job_id"]))["status"]
+        finished.set()
+        after = await queue.wait(record["job_id"], poll=0.01)
+        await queue.stop()
+        return during, after["status"]
+
+    assert asyncio.run(scenario()) == ("running", "succeeded")
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.llm_client import CircuitBreaker, CircuitOpenError, ResilientModel
+from backend.llm_scheduler import AdmissionTimeout
+
+
+class QuotaError(Exception):
+    def __init__(self):
+        super().__init__("429 Resource has been exhausted (e.g. check quota).")
+
+
+class ScriptedModel:
+    """Async model that fails with 429 `failures` times, then hangs until `release` is set."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+        self.release = None
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise QuotaError()
+        if self.release is not None:
+            await self.release.wait()
+        return "ok"
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        return iter(["ok"])
+
+
+class TimingOutScheduler:
+    def slot(self, priority, session_id=None, tokens=0):
+        raise AdmissionTimeout("LLM queue timeout after 0s (audit)")
+
+
+def _open_then_cool(breaker):
+    for _ in range(breaker.threshold):
+        breaker.before_call()
+        breaker.record_failure(QuotaError())
+    breaker.open_until = 0.0  # cooldown elapsed: the next call is the half-open probe
+
+
+def test_cancelled_probe_releases_the_breaker():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    model = ScriptedModel()
+    resilient = ResilientModel(model, "gemini", breaker=breaker, max_attempts=1)
+    _open_then_cool(breaker)
+
+    async def scenario():
+        model.release = asyncio.Event()
+        probe = asyncio.create_task(resilient._attempt_async("prompt", {}, None, 0))
+        await asyncio.sleep(0.01)
+        with pytest.raises(CircuitOpenError):
+            await resilient._attempt_async("prompt", {}, None, 0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        model.release.set()
+        return await resilient._attempt_async("prompt", {}, None, 0)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_probe_released_when_stream_admission_times_out():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    resilient = ResilientModel(ScriptedModel(), "gemini", breaker=breaker, max_attempts=1,
+                               scheduler=TimingOutScheduler())
+    _open_then_cool(breaker)
+
+    with pytest.raises(AdmissionTimeout):
+        list(resilient.generate_content("prompt", stream=True))
+    assert breaker.before_call() is True  # the next call may probe again
+
+
+def test_only_one_probe_in_half_open_state():
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    _open_then_cool(breaker)
+    results = []
+
+    def call():
+        try:
+            results.append(breaker.before_call())
+        except CircuitOpenError:
+            results.append("rejected")
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 1 and results.count("rejected") == 7
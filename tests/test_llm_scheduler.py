@@ -0,0 +1,131 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.llm_scheduler import AdmissionTimeout, LLMScheduler
+
+
+class FakeSyncRedis:
+    """The scheduler's only Redis use: the registered TPM reserve script, run with (keys, args)."""
+
+    def __init__(self):
+        self.windows = {}
+        self.threads = set()
+
+    def register_script(self, source):
+        def reserve(keys, args):
+            self.threads.add(threading.current_thread().name)
+            used = self.windows.get(keys[0], 0)
+            if used and used + args[0] > args[1]:
+                return 0
+            self.windows[keys[0]] = used + args[0]
+            return 1
+        return reserve
+
+
+async def _admission_order(scheduler, callers):
+    """Holds the only slot while `callers` queue up, then records the order they are admitted in."""
+    order = []
+    holding = asyncio.Event()
+    release = asyncio.Event()
+
+    async def hold():
+        async with scheduler.aslot("audit", "holder"):
+            holding.set()
+            await release.wait()
+
+    async def call(priority, session_id, label):
+        async with scheduler.aslot(priority, session_id):
+            order.append(label)
+
+    holder = asyncio.create_task(hold())
+    await holding.wait()
+    tasks = []
+    for priority, session_id, label in callers:
+        tasks.append(asyncio.create_task(call(priority, session_id, label)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+def test_chat_is_admitted_before_queued_audit_calls():
+    scheduler = LLMScheduler(max_concurrency=1, queue_timeout=5)
+    order = asyncio.run(_admission_order(scheduler, [
+        ("audit", "s1", "audit-1"), ("audit", "s1", "audit-2"), ("chat", "s2", "chat"),
+    ]))
+    assert order == ["chat", "audit-1", "audit-2"]
+
+
+def test_sessions_take_turns_within_a_priority():
+    scheduler = LLMScheduler(max_concurrency=1, queue_timeout=5)
+    order = asyncio.run(_admission_order(scheduler, [
+        ("audit", "big", "big-1"), ("audit", "big", "big-2"), ("audit", "big", "big-3"), ("audit", "small", "small-1"),
+    ]))
+    assert order == ["big-1", "small-1", "big-2", "big-3"]
+
+
+def test_tokens_per_minute_cap_times_out_the_overflow():
+    scheduler = LLMScheduler(max_concurrency=8, tokens_per_minute=1000, queue_timeout=0.2)
+
+    async def call():
+        async with scheduler.aslot("audit", "s1", tokens=300):
+            await asyncio.sleep(0.01)
+
+    async def run():
+        return await asyncio.gather(*(call() for _ in range(5)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert results.count(None) == 3
+    assert all(isinstance(r, AdmissionTimeout) for r in results if r is not None)
+    stats = scheduler.stats()
+    assert stats["timeouts"] == 2
+    assert stats["in_flight"] == 0
+    assert stats["window_tokens"] == 900
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    scheduler = LLMScheduler(max_concurrency=1, queue_timeout=5)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.aslot("audit", "holder"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(scheduler.aslot("chat", "s1").__aenter__())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        await holder
+        async with scheduler.aslot("chat", "s2"):
+            return scheduler.stats()
+
+    stats = asyncio.run(run())
+    assert stats["in_flight"] == 1
+    assert stats["queued"] == {"chat": 0, "audit": 0}
+    assert scheduler.in_flight == 0
+
+
+def test_shared_window_is_reserved_off_the_event_loop():
+    scheduler = LLMScheduler(max_concurrency=2, tokens_per_minute=1000, queue_timeout=0.3)
+    scheduler._redis = FakeSyncRedis()
+    scheduler._reserve_script = scheduler._redis.register_script("")
+
+    async def call():
+        async with scheduler.aslot("audit", "s1", tokens=300):
+            await asyncio.sleep(0.01)
+
+    async def run():
+        return await asyncio.gather(*(call() for _ in range(4)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert results.count(None) == 3
+    assert scheduler._redis.threads and threading.main_thread().name not in scheduler._redis.threads
+    assert scheduler.in_flight == 0
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from backend.session_registry import SESSION_REGISTRY_KEY, SessionRegistry
+
+
+def _redis():
+    # The benchmark fake emulates the registry's Lua claim script; it needs the full backend installed
+    fakes = pytest.importorskip("benchmarks.fakes")
+    return fakes.FakeAsyncRedis(latency=0)
+
+
+async def _registered(registry, *session_ids, seen=1.0):
+    for session_id in session_ids:
+        await registry.register(session_id)
+    if registry.redis is not None:
+        await registry.redis.zadd(SESSION_REGISTRY_KEY, {s: seen for s in session_ids})
+    else:
+        registry._local.update({s: seen for s in session_ids})
+
+
+async def _members(registry):
+    if registry.redis is not None:
+        return sorted(await registry.redis.zrangebyscore(SESSION_REGISTRY_KEY, 0, float("inf")))
+    return sorted(registry._local)
+
+
+@pytest.fixture(params=["local", "redis"])
+def registry(request):
+    registry = SessionRegistry(idle_ttl=10, attempts=1)
+    if request.param == "redis":
+        registry.redis = _redis()
+    return registry
+
+
+def test_touch_never_registers_unknown_or_logged_out_sessions(registry):
+    async def scenario():
+        await registry.touch("never_uploaded")
+        await registry.register("s1")
+        await registry.forget("s1")
+        await registry.touch("s1")
+        return await _members(registry)
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_sweep_skips_sessions_touched_after_listing(registry):
+    reclaimed = []
+
+    async def reclaim(session_id):
+        reclaimed.append(session_id)
+        return 3
+
+    async def scenario():
+        await _registered(registry, "idle", "active")
+        list_expired = registry._expired
+
+        async def expired_then_touch(cutoff):
+            listed = await list_expired(cutoff)
+            await registry.touch("active")  # a chat request lands mid-sweep
+            return listed
+
+        registry._expired = expired_then_touch
+        totals = await registry.sweep(reclaim)
+        return totals, await _members(registry)
+
+    totals, members = asyncio.run(scenario())
+    assert reclaimed == ["idle"]
+    assert totals == {"sessions": 1, "vectors": 3, "failed": 0}
+    assert members == ["active"]
+
+
+def test_failed_reclaim_stays_registered_for_the_next_sweep(registry):
+    async def reclaim(session_id):
+        raise RuntimeError("vector store unavailable")
+
+    async def scenario():
+        await _registered(registry, "idle")
+        totals = await registry.sweep(reclaim)
+        return totals, await _members(registry)
+
+    totals, members = asyncio.run(scenario())
+    assert totals == {"sessions": 0, "vectors": 0, "failed": 1}
+    assert members == ["idle"]
+
+
+def test_sweeper_does_not_start_without_redis(monkeypatch):
+    monkeypatch.setattr("backend.session_registry.SESSION_SWEEP_WITHOUT_REDIS", False)
+    registry = SessionRegistry()
+
+    async def scenario():
+        registry.start(lambda session_id: None, redis_client=None)
+        return registry._task
+
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,64 @@
+import multiprocessing
+import threading
+
+from langchain_core.documents import Document
+
+from backend.sparse_index import SparseIndex, SparseIndexStore
+
+
+def _index(*texts):
+    return SparseIndex.from_documents([Document(page_content=text, metadata={"page": i}) for i, text in enumerate(texts)])
+
+
+def _texts(index):
+    return [doc["text"] for doc in index.docs]
+
+
+def _save_in_child(root_dir, namespace, texts):
+    SparseIndexStore(root_dir).save(namespace, _index(*texts))
+
+
+def test_unchanged_file_is_served_from_memory(tmp_path):
+    store = SparseIndexStore(str(tmp_path))
+    store.save("s1_POLICY", _index("notice period is 30 days"))
+    assert store.load("s1_POLICY") is store.load("s1_POLICY")
+
+
+def test_save_by_another_worker_invalidates_the_cached_index(tmp_path):
+    worker_a, worker_b = SparseIndexStore(str(tmp_path)), SparseIndexStore(str(tmp_path))
+    worker_a.save("s1_POLICY", _index("notice period is 30 days"))
+    assert _texts(worker_b.load("s1_POLICY")) == ["notice period is 30 days"]
+
+    # Policy revision handled by a separate process sharing the index directory
+    child = multiprocessing.get_context("spawn").Process(
+        target=_save_in_child, args=(str(tmp_path), "s1_POLICY", ["notice period is 60 days", "new clause"])
+    )
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+
+    assert _texts(worker_b.load("s1_POLICY")) == ["notice period is 60 days", "new clause"]
+    assert worker_b.load("s1_POLICY").search("clause", k=1)[0].page_content == "new clause"
+
+
+def test_delete_by_another_worker_is_seen(tmp_path):
+    worker_a, worker_b = SparseIndexStore(str(tmp_path)), SparseIndexStore(str(tmp_path))
+    worker_a.save("s1_LAW", _index("statute text"))
+    assert worker_b.load("s1_LAW") is not None
+
+    worker_a.delete("s1_LAW")
+    assert worker_b.load("s1_LAW") is None
+
+
+def test_concurrent_saves_leave_one_complete_file(tmp_path):
+    store = SparseIndexStore(str(tmp_path))
+    versions = [_index(f"version {i}", "shared clause") for i in range(8)]
+    threads = [threading.Thread(target=store.save, args=("s1_POLICY", index)) for index in versions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [path.name for path in tmp_path.iterdir()] == ["s1_POLICY.json"]
+    reloaded = SparseIndexStore(str(tmp_path)).load("s1_POLICY")
+    assert _texts(reloaded) in [_texts(index) for index in versions]
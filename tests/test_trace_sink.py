@@ -0,0 +1,32 @@
+import json
+
+from backend.trace_sink import _STOP, TraceSink
+
+
+def _lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["n"] for line in f]
+
+
+def test_lines_queued_behind_stop_are_written(tmp_path):
+    sink = TraceSink(path=str(tmp_path / "traces.jsonl"), batch_size=2, flush_interval=0.01)
+    for n in range(3):
+        sink._queue.put(json.dumps({"n": n}) + "\n")
+    sink._queue.put(_STOP)
+    for n in range(3, 8):
+        sink._queue.put(json.dumps({"n": n}) + "\n")
+
+    sink._run()
+
+    assert _lines(sink.path) == list(range(8))
+    assert sink.counts["written"] == 8
+
+
+def test_close_flushes_everything_emitted(tmp_path):
+    sink = TraceSink(path=str(tmp_path / "traces.jsonl"), batch_size=3, flush_interval=0.01)
+    for n in range(20):
+        sink.emit({"n": n})
+
+    sink.close()
+
+    assert _lines(sink.path) == list(range(20))
@@ -0,0 +1,77 @@
+import multiprocessing
+
+import pytest
+
+vector_store = pytest.importorskip("backend.vector_store")
+
+
+def _upsert(backend, namespace, ids, dim=4):
+    vectors = [[float(i + 1)] + [1.0] * (dim - 1) for i in range(len(ids))]
+    backend.upsert(namespace, ids, vectors, [f"text {doc_id}" for doc_id in ids], [{} for _ in ids])
+
+
+def _ids(backend, namespace):
+    _, records = backend._namespace(namespace).load()
+    return [record["id"] for record in records]
+
+
+def _upsert_in_child(root_dir, namespace, prefix, batches):
+    backend = vector_store.LocalNumpyBackend(None, root_dir=root_dir)
+    for batch in range(batches):
+        _upsert(backend, namespace, [f"{prefix}-{batch}-{i}" for i in range(3)])
+
+
+def test_evicted_namespace_reopens_with_the_same_lock(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "VECTOR_STORE_CACHE_SIZE", 1)
+    backend = vector_store.LocalNumpyBackend(None, root_dir=str(tmp_path))
+
+    first = backend._namespace("a")
+    backend._namespace("b")  # evicts "a"
+    reopened = backend._namespace("a")
+
+    assert reopened is not first
+    assert reopened.lock is first.lock
+
+
+def test_write_from_another_backend_is_seen_and_kept(tmp_path):
+    ours = vector_store.LocalNumpyBackend(None, root_dir=str(tmp_path))
+    theirs = vector_store.LocalNumpyBackend(None, root_dir=str(tmp_path))
+
+    _upsert(ours, "ns", ["a", "b"])
+    assert _ids(ours, "ns") == ["a", "b"]
+
+    _upsert(theirs, "ns", ["c"])
+    assert _ids(ours, "ns") == ["a", "b", "c"]
+
+    # A write on a stale cache must not drop rows the other backend added
+    _upsert(ours, "ns", ["b"])
+    assert sorted(_ids(theirs, "ns")) == ["a", "b", "c"]
+    assert ours.count("ns") == 3
+
+
+def test_concurrent_writers_in_two_processes_lose_no_rows(tmp_path):
+    root_dir = str(tmp_path)
+    ctx = multiprocessing.get_context("spawn")
+    children = [ctx.Process(target=_upsert_in_child, args=(root_dir, "ns", prefix, 10)) for prefix in ("x", "y")]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join(60)
+        assert child.exitcode == 0
+
+    backend = vector_store.LocalNumpyBackend(None, root_dir=root_dir)
+    matrix, records = backend._namespace("ns").load()
+    assert len(records) == backend.count("ns") == 60
+    assert matrix.shape == (60, 4)
+    assert len({record["id"] for record in records}) == 60
+
+
+def test_delete_namespace_is_seen_by_another_backend(tmp_path):
+    ours = vector_store.LocalNumpyBackend(None, root_dir=str(tmp_path))
+    theirs = vector_store.LocalNumpyBackend(None, root_dir=str(tmp_path))
+    _upsert(ours, "ns", ["a"])
+    assert _ids(theirs, "ns") == ["a"]
+
+    ours.delete_namespace("ns")
+
+    assert _ids(theirs, "ns") == []